@@ -0,0 +1,44 @@
+# Endpoints/admin.py
+from fastapi import APIRouter, HTTPException, Depends
+from starlette import status
+from starlette.concurrency import run_in_threadpool
+from db.VerifyToken import user_dependency
+from function.token_cache import token_cache
+from function.user_cache import user_cache
+from db.pool_stats import pool_stats
+from function.scheduler import scheduler
+
+router = APIRouter(prefix="/admin", tags=["Admin"])
+
+
+def require_admin(current_user: user_dependency):
+    if current_user.get("userType") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required",
+        )
+    return current_user
+
+
+# Verified-token cache hit/miss counters
+@router.get("/token-cache", dependencies=[Depends(require_admin)])
+async def get_token_cache_stats():
+    return token_cache.stats()
+
+
+# Users read-through cache hit/miss counters
+@router.get("/user-cache", dependencies=[Depends(require_admin)])
+async def get_user_cache_stats():
+    return user_cache.stats()
+
+
+# Live connection pool usage and checkout wait histogram per engine
+@router.get("/db-pool", dependencies=[Depends(require_admin)])
+async def get_db_pool_stats():
+    return {name: stats.snapshot() for name, stats in pool_stats.items()}
+
+
+# Registered maintenance jobs and their most recent runs
+@router.get("/jobs", dependencies=[Depends(require_admin)])
+async def get_jobs(limit: int = 50):
+    return {"jobs": scheduler.status(), "runs": await run_in_threadpool(scheduler.recent_runs, limit)}
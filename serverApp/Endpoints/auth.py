@@ -2,13 +2,16 @@ from datetime import timedelta, datetime
 from fastapi import APIRouter, HTTPException, Depends
 from starlette import status
 from typing import Annotated
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 from jose import jwt, JWTError
-from db.connection import db_dependency
+from db.connection import async_db_dependency
+from function.hashing import password_hasher
+from function.token_cache import token_cache
+from function.user_cache import user_cache
+from function.rate_limit import rate_limiter, limit_by_ip, LOGIN_IP, LOGIN_ACCOUNT, REGISTER_IP
 from models.userModels import Users
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_, select, update
 
 from schemas.schemas import CreateUserRequest, Token, FormData,UpdatePasswordRequest ,UpdatePhoneRequest
 
@@ -24,16 +27,24 @@ router = APIRouter(prefix="/auth", tags=["Authentication"])
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
 
-# Setup password encryption and token generation
-bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Setup token generation (password hashing lives in function.hashing)
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 
+# Query builders shared with db.query_audit, so the audit explains what the endpoints run
+def user_by_email_query(email: str):
+    return select(Users).where(Users.email == email)
+
+
+def phone_taken_query(phone: str, user_id: int):
+    return select(Users).where(Users.phone == phone, Users.id != user_id)
+
+
 # Handle register User
-@router.post("/register", status_code=status.HTTP_201_CREATED)
-async def register_user(db: db_dependency, create_user_request: CreateUserRequest):
+@router.post("/register", status_code=status.HTTP_201_CREATED, dependencies=[Depends(limit_by_ip(REGISTER_IP))])
+async def register_user(db: async_db_dependency, create_user_request: CreateUserRequest):
     try:
-        check_user = db.query(Users).filter(Users.email == create_user_request.email).first()
+        check_user = (await db.execute(user_by_email_query(create_user_request.email))).scalars().first()
         if check_user:
             raise HTTPException(status_code=400, detail="Email is already taken")
 
@@ -43,13 +54,13 @@ async def register_user(db: db_dependency, create_user_request: CreateUserReques
             last_name=create_user_request.last_name,
             email=create_user_request.email,
             userType="admin",
-            password=bcrypt_context.hash(create_user_request.password),
+            password=await password_hasher.hash(create_user_request.password),
         )
 
         # Add to the database and commit
         db.add(create_user_model)
-        db.commit()
-        db.refresh(create_user_model)
+        await db.commit()
+        await db.refresh(create_user_model)
 
         return {
             "id": create_user_model.id,
@@ -59,16 +70,20 @@ async def register_user(db: db_dependency, create_user_request: CreateUserReques
             "userType": create_user_model.userType,
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error occurred: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
 # Login user and create token
-@router.post("/login", response_model=Token)
-async def login_for_access_token(form_data: FormData, db: db_dependency):
-    user = authenticate_user(form_data.email, form_data.password, db)
+@router.post("/login", response_model=Token, dependencies=[Depends(limit_by_ip(LOGIN_IP))])
+async def login_for_access_token(form_data: FormData, db: async_db_dependency):
+    # Guessing one account's password from many IPs is limited here, before any bcrypt work
+    await rate_limiter.check(LOGIN_ACCOUNT, form_data.email.lower())
+    user = await authenticate_user(form_data.email, form_data.password, db)
     if not user:
         print("Authentication failed for user:", form_data.email)
         raise HTTPException(
@@ -98,24 +113,34 @@ async def login_for_access_token(form_data: FormData, db: db_dependency):
     }
 
 
-def authenticate_user(email: str, password: str, db: Session):
-    user = db.query(Users).filter(Users.email == email).first()
-    if not user or not bcrypt_context.verify(password, user.password):
+async def authenticate_user(email: str, password: str, db: AsyncSession):
+    user = (await db.execute(user_by_email_query(email))).scalars().first()
+    if not user or not await password_hasher.verify(password, user.password):
         return False
     return user
 
 
 def create_token(data: dict, expires_delta: timedelta, token_type: str):
     to_encode = data.copy()
-    expire = datetime.utcnow() + expires_delta
-    to_encode.update({"exp": expire, "type": token_type})
+    now = datetime.utcnow()
+    expire = now + expires_delta
+    to_encode.update({"exp": expire, "iat": now, "type": token_type})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
 
 async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        # Repeat requests with the same token skip the signature check
+        payload = token_cache.get(token)
+        if payload is None:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            if await token_cache.is_revoked(payload):
+                raise JWTError("Token has been revoked")
+            token_cache.put(token, payload)
+        elif token_cache.shared is not None and await token_cache.is_revoked(payload):
+            # Revoked by another worker after this one cached the token
+            raise JWTError("Token has been revoked")
         email: str = payload.get("email")
         user_id: str = payload.get("id")
         userType: str = payload.get("userType")
@@ -142,6 +167,8 @@ async def refresh_access_token(request: dict):
             )
             
         payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
+        if await token_cache.is_revoked(payload):
+            raise JWTError("Token has been revoked")
         if payload.get("type") != "refresh":
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -170,13 +197,13 @@ async def refresh_access_token(request: dict):
 # Password update endpoint
 @router.put("/update-password", status_code=status.HTTP_200_OK)
 async def update_password(
-    db: db_dependency,
+    db: async_db_dependency,
     password_data: UpdatePasswordRequest,
     current_user: dict = Depends(get_current_user)
 ):
     try:
         # Get user from database
-        user = db.query(Users).filter(Users.id == current_user["user_id"]).first()
+        user = await db.get(Users, current_user["user_id"])
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -184,7 +211,7 @@ async def update_password(
             )
 
         # Verify current password
-        if not bcrypt_context.verify(password_data.current_password, user.password):
+        if not await password_hasher.verify(password_data.current_password, user.password):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Current password is incorrect"
@@ -198,15 +225,19 @@ async def update_password(
             )
 
         # Check if new password is different from current password
-        if bcrypt_context.verify(password_data.new_password, user.password):
+        if await password_hasher.verify(password_data.new_password, user.password):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="New password cannot be the same as current password"
             )
 
         # Update password
-        user.password = bcrypt_context.hash(password_data.new_password)
-        db.commit()
+        user.password = await password_hasher.hash(password_data.new_password)
+        await db.commit()
+
+        # Kill tokens issued with the old password, including cached ones
+        await token_cache.revoke_user(user.id)
+        await user_cache.invalidate(user.id, user.email)
         
         return {
             "message": "Password updated successfully",
@@ -217,7 +248,7 @@ async def update_password(
         raise
     except Exception as e:
         print(f"Error updating password: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update password"
@@ -226,7 +257,7 @@ async def update_password(
 # Phone number update endpoint
 @router.put("/update-phone", status_code=status.HTTP_200_OK)
 async def update_phone(
-    db: db_dependency,
+    db: async_db_dependency,
     phone_data: UpdatePhoneRequest,
     current_user: dict = Depends(get_current_user)
 ):
@@ -239,10 +270,9 @@ async def update_phone(
             )
 
         # Check if phone number is already taken by another user
-        existing_user = db.query(Users).filter(
-            Users.phone == phone_data.phone,
-            Users.id != current_user["user_id"]
-        ).first()
+        existing_user = (await db.execute(
+            phone_taken_query(phone_data.phone, current_user["user_id"])
+        )).scalars().first()
         
         if existing_user:
             raise HTTPException(
@@ -250,29 +280,29 @@ async def update_phone(
                 detail="Phone number is already registered with another account"
             )
 
-        # Get user and update phone number
-        user = db.query(Users).filter(Users.id == current_user["user_id"]).first()
-        if not user:
+        # Update phone number in place; no row means the account is gone
+        result = await db.execute(
+            update(Users).where(Users.id == current_user["user_id"]).values(phone=phone_data.phone)
+        )
+        if result.rowcount == 0:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found"
             )
-
-        # Update phone number
-        user.phone = phone_data.phone
-        db.commit()
+        await db.commit()
+        await user_cache.invalidate(current_user["user_id"], current_user["email"])
         
         return {
             "message": "Phone number updated successfully",
             "status": "success",
-            "phone": user.phone
+            "phone": phone_data.phone
         }
 
     except HTTPException:
         raise
     except Exception as e:
         print(f"Error updating phone number: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update phone number"
@@ -281,11 +311,12 @@ async def update_phone(
 # Get user profile endpoint
 @router.get("/profile", status_code=status.HTTP_200_OK)
 async def get_user_profile(
-    db: db_dependency,
+    db: async_db_dependency,
     current_user: dict = Depends(get_current_user)
 ):
     try:
-        user = db.query(Users).filter(Users.id == current_user["user_id"]).first()
+        # Served from function.user_cache; the database is only read on a miss
+        user = await user_cache.get_by_id(db, current_user["user_id"])
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -293,12 +324,12 @@ async def get_user_profile(
             )
 
         return {
-            "id": user.id,
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "email": user.email,
-            "phone": user.phone,
-            "userType": user.userType
+            "id": user["id"],
+            "first_name": user["first_name"],
+            "last_name": user["last_name"],
+            "email": user["email"],
+            "phone": user["phone"],
+            "userType": user["userType"]
         }
 
     except HTTPException:
@@ -0,0 +1,99 @@
+# Endpoints/exports.py
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from typing import Literal
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from db.replicas import ReadSessionLocal
+from db.event_counters import EVENT_COUNT
+from models.userModels import Users, UserEventCounts, Customers
+from Endpoints.admin import require_admin
+
+router = APIRouter(prefix="/exports", tags=["Exports"])
+
+# Rows fetched per server-side cursor round trip, and written per output chunk
+EXPORT_BATCH_SIZE = 1000
+
+USER_EXPORT = (
+    select(
+        Users.id, Users.first_name, Users.last_name, Users.email, Users.userType, Users.phone, EVENT_COUNT,
+    )
+    .outerjoin(UserEventCounts, UserEventCounts.user_id == Users.id)
+    .order_by(Users.id)
+)
+
+CUSTOMER_EXPORT = select(
+    Customers.id, Customers.first_name, Customers.last_name, Customers.email, Customers.phone,
+    Customers.city, Customers.country, Customers.company, Customers.notes, Customers.user_id,
+    Customers.created_at, Customers.updated_at,
+).order_by(Customers.id)
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+def _ndjson(columns, rows) -> str:
+    return "".join(json.dumps(dict(zip(columns, map(_plain, row))), ensure_ascii=False) + "\n" for row in rows)
+
+
+def _csv(rows) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([_plain(v) for v in row] for row in rows)
+    return buffer.getvalue()
+
+
+async def stream_export(stmt, format: str, compress: bool):
+    """Yield the query's rows encoded as NDJSON or CSV, one chunk per fetched batch.
+
+    Uses its own session: the request's session is closed before a streamed body is sent.
+    """
+    # wbits=31 writes a gzip container
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def emit(text: str) -> bytes:
+        data = text.encode("utf-8")
+        return compressor.compress(data) if compressor else data
+
+    # Exports are long reads of committed data, so they run on a replica when there is one
+    async with ReadSessionLocal() as db:
+        # Server-side cursor: only EXPORT_BATCH_SIZE rows are held in memory at a time
+        result = await db.stream(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        columns = list(result.keys())
+        if format == "csv":
+            chunk = emit(_csv([columns]))
+            if chunk:
+                yield chunk
+        async for rows in result.partitions():
+            chunk = emit(_csv(rows) if format == "csv" else _ndjson(columns, rows))
+            if chunk:
+                yield chunk
+    if compressor:
+        yield compressor.flush()
+
+
+def export_response(stmt, name: str, format: str, compress: bool) -> StreamingResponse:
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    filename = f"{name}.{format}"
+    if compress:
+        media_type, filename = "application/gzip", filename + ".gz"
+    return StreamingResponse(
+        stream_export(stmt, format, compress),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+# Full users table as NDJSON or CSV, streamed; passwords are never exported
+@router.get("/users", dependencies=[Depends(require_admin)])
+async def export_users(format: Literal["ndjson", "csv"] = "ndjson", gzip: bool = False):
+    return export_response(USER_EXPORT, "users", format, gzip)
+
+
+@router.get("/customers", dependencies=[Depends(require_admin)])
+async def export_customers(format: Literal["ndjson", "csv"] = "ndjson", gzip: bool = False):
+    return export_response(CUSTOMER_EXPORT, "customers", format, gzip)
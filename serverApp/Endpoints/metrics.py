@@ -0,0 +1,23 @@
+# Endpoints/metrics.py
+import hmac
+import os
+from typing import Optional
+from dotenv import load_dotenv
+from fastapi import APIRouter, Header, HTTPException, Response
+from starlette import status
+from function.metrics import metrics
+
+load_dotenv()
+
+# When set, scrapers must send Authorization: Bearer <METRICS_TOKEN>
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+router = APIRouter(tags=["Metrics"])
+
+
+# Prometheus text exposition; under serve.py it covers every worker (see function.metrics)
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics(authorization: Optional[str] = Header(None)):
+    if METRICS_TOKEN and not hmac.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,13 +1,16 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
 from dotenv import load_dotenv
 import random
 import string
-from db.connection import db_dependency
-from models.userModels import Users, OTP
-from function.send_mail import send_new_email
+from db.connection import async_db_dependency
+from Endpoints.auth import user_by_email_query
+from function.outbox import enqueue_email, delivery_token, get_delivery_status, outbox_worker
+from function.otp_store import otp_store, NOT_FOUND, EXPIRED
+from function.user_cache import user_cache
+from function.rate_limit import rate_limiter, limit_by_ip, OTP_IP, OTP_ACCOUNT
 from emailsTemps.custom_email_send import custom_email
+from emailsTemps.otp_email import otp_email_body
 from schemas.schemas import EmailSchema, OtpVerify
-from datetime import datetime, timedelta
 
 # Load environment variables from .env file
 load_dotenv()
@@ -45,9 +48,12 @@ def generate_random_verification_code(length=8):
     ```
     ["login", "email"]
     """,
+    dependencies=[Depends(limit_by_ip(OTP_IP))],
 )
-async def send_email(details: EmailSchema, db: db_dependency):
-    user = db.query(Users).filter(Users.email == details.toEmail).first()
+async def send_email(details: EmailSchema, db: async_db_dependency):
+    # Each send is an email through our relay; cap it per recipient too
+    await rate_limiter.check(OTP_ACCOUNT, details.toEmail.lower())
+    user = await user_cache.get_by_email(db, details.toEmail)
     if not user:
         raise HTTPException(status_code=404, detail="Email Id Not Found")
 
@@ -63,59 +69,30 @@ async def send_email(details: EmailSchema, db: db_dependency):
     
     purpose = details.purpose
     
-    # Remove existing OTPs for the user if any
-    otp_user = db.query(OTP).filter(OTP.account_id == user.id).first()
-    # If record exists, delete it
-    if otp_user:
-        db.delete(otp_user)
-        db.commit()
-    
-    # Create and store the new OTP
-    new_otp = OTP(account_id=user.id, otp_code=otp, verification_code=verification, purpose=purpose)
-    db.add(new_otp)
-    db.commit()
-    db.refresh(new_otp)
+    # Replaces any earlier code for this account
+    await otp_store.issue(db, user["id"], otp, verification, purpose)
 
     heading = "Welcome to Centerpiece Dashboard!"
     sub = otp_subjet[purpose]
     
-    body = f"""
-    <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-        <h2 style="color: #2c3e50; text-align: center;">Centerpiece Dashboard Security Code</h2>
-        
-        <div style="background: #f8f9fa; padding: 20px; border-radius: 10px; text-align: center; margin: 20px 0;">
-            <h1 style="color: #e74c3c; font-size: 32px; letter-spacing: 3px; margin: 0;">
-                {otp}
-            </h1>
-        </div>
-        
-        <p style="color: #7f8c8d; line-height: 1.6;">
-            This is your verification code for <strong>{purpose}</strong> on Centerpiece Dashboard.
-        </p>
-        
-        <div style="background: #fff3cd; padding: 15px; border-radius: 5px; border-left: 4px solid #ffc107;">
-            <p style="color: #856404; margin: 0;">
-                ⚠️ <strong>Security Notice:</strong> Never share this code with anyone. 
-                Our team will never ask for your verification code.
-            </p>
-        </div>
-        
-        <p style="color: #7f8c8d; font-size: 14px; margin-top: 20px;">
-            This code will expire in 10 minutes. If you didn't request this code, 
-            please ignore this email or contact our support team immediately.
-        </p>
-        
-        <div style="border-top: 2px solid #ecf0f1; margin-top: 30px; padding-top: 20px; text-align: center;">
-            <p style="color: #95a5a6; font-size: 12px;">
-                Centerpiece Group Ltd · Financial Management System
-            </p>
-        </div>
-    </div>
-    """
+    body = otp_email_body(otp, purpose)
     
-    msg = custom_email(user.first_name, heading, body)
-    if send_new_email(details.toEmail, sub, msg):
-        return {"message": "Email sent successfully", "verification_Code": verification}
+    msg = custom_email(user["first_name"], heading, body)
+    # Queued in the outbox and sent by a background worker, so the request doesn't wait on SMTP.
+    # With the SQL OTP store the code and the email are committed together.
+    outbox_message = enqueue_email(db, details.toEmail, sub, msg)
+    await db.commit()
+    outbox_worker.wake()
+    return {"message": "Email sent successfully", "verification_Code": verification, "delivery_token": delivery_token(outbox_message.id)}
+
+
+@router.get("/email-status/{token}", summary="Email delivery status")
+async def email_status(token: str, db: async_db_dependency):
+    # Keyed on the signed token from send-otp, so other senders' messages can't be enumerated
+    delivery = await get_delivery_status(db, token)
+    if delivery is None:
+        raise HTTPException(status_code=404, detail="Message not found")
+    return delivery
 
 
 @router.post(
@@ -133,31 +110,28 @@ async def send_email(details: EmailSchema, db: db_dependency):
     ```
     """,
 )
-async def verify_opt(data: OtpVerify, db: db_dependency):
-    user_info = db.query(Users).filter(Users.email == data.email).first()
+async def verify_opt(data: OtpVerify, db: async_db_dependency):
+    user_info = (await db.execute(user_by_email_query(data.email))).scalars().first()
     if not user_info:
         raise HTTPException(status_code=404, detail="Email Id Not Found")
     
     # Make OTP verification case-insensitive
-    valid_otp = db.query(OTP).filter(
-        OTP.otp_code == data.otp_code.upper(),  # Convert input to uppercase for case-insensitive matching
-        OTP.verification_code == data.verification_code,
-        OTP.account_id == user_info.id
-    ).first()
+    result, purpose = await otp_store.verify(db, user_info.id, data.otp_code.upper(), data.verification_code)
     
-    if not valid_otp:
+    if result == NOT_FOUND:
         raise HTTPException(status_code=404, detail="OTP Not found")
     
-    # Check if OTP is expired
-    if datetime.utcnow() - valid_otp.date > timedelta(minutes=10):
+    if result == EXPIRED:
         raise HTTPException(status_code=404, detail="OTP Expired")
         
-    if valid_otp.purpose == "email":
+    if purpose == "email":
         user_info.email_confirm = True
-        db.commit()
-        db.refresh(user_info)
+        await db.commit()
+        await db.refresh(user_info)
         return {"detail": "Successfully Verified"}
     
-    db.delete(valid_otp)
-    db.commit()
+    # Only one request can use a code; a concurrent duplicate finds it gone
+    if not await otp_store.consume(db, user_info.id):
+        raise HTTPException(status_code=404, detail="OTP Not found")
+    await db.commit()
     return {"detail": "Successfully Verified"}
\ No newline at end of file
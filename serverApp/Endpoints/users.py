@@ -1,63 +1,99 @@
 # Endpoints/users.py
-from fastapi import APIRouter, HTTPException, Depends, status
-from typing import List, Optional
-from sqlalchemy.orm import Session
-from db.connection import db_dependency
-from models.userModels import Users
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, status
+from typing import List, Literal, Optional, Union
+from db.connection import async_db_dependency, read_db_dependency
+from models.userModels import Users, UserEventCounts
 from schemas.schemas import (
     UserResponse, 
+    UserPage,
     UpdateUserRequest, 
     CreateTeamLeadRequest,
     UpdateUserTypeRequest
 )
-from models.EventsModel import Event
 from db.VerifyToken import get_current_user
-from passlib.context import CryptContext
-from sqlalchemy import func, or_
+from Endpoints.auth import user_by_email_query
+from function.hashing import password_hasher
+from function.token_cache import token_cache
+from function.user_cache import user_cache
+from function.pagination import encode_cursor, decode_cursor, MAX_PAGE_SIZE
+from db.event_counters import EVENT_COUNT
+from function.bulk_import import BulkUserImport, parse_rows, BULK_USER_TYPES
+from Endpoints.admin import require_admin
+from function.fast_json import fast_json_response
+from function.query_budget import query_budget
+from sqlalchemy import select, or_
 
 router = APIRouter(prefix="/users", tags=["Users"])
-bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Listings select plain columns: no ORM objects to build, and the rows are already
+# in UserResponse's shape, so they are encoded directly (function.fast_json)
+USER_LIST_COLUMNS = (
+    Users.id, Users.first_name, Users.last_name, Users.email, Users.userType, Users.phone, EVENT_COUNT,
+)
+
+
+# Query builders shared with db.query_audit, so the audit explains what the endpoints run
+def user_list_query(user_type: Optional[str] = None):
+    stmt = select(*USER_LIST_COLUMNS).outerjoin(UserEventCounts, UserEventCounts.user_id == Users.id)
+    return stmt if user_type is None else stmt.where(Users.userType == user_type)
+
+
+def offset_page(stmt, skip: int, limit: int):
+    return stmt.offset(skip).limit(limit)
+
+
+def cursor_page(stmt, after_id: int, limit: int):
+    # One extra row is fetched to tell whether another page exists
+    return stmt.where(Users.id > after_id).order_by(Users.id).limit(limit + 1)
+
+
+def contact_clash_query(email: str, phone: str):
+    return select(Users.email, Users.phone).where(or_(Users.email == email, Users.phone == phone)).limit(2)
+
+
+def user_rows(results):
+    return [dict(row._mapping) for row in results]
+
+
+async def list_users(db, stmt, skip: int, limit: int, paginate: str, cursor: Optional[str]):
+    # Offset mode (default) keeps the old plain-list response
+    if paginate == "offset" and cursor is None:
+        results = (await db.execute(offset_page(stmt, skip, limit))).all()
+        return fast_json_response(user_rows(results), List[UserResponse])
+
+    # Cursor mode: seek past the last id seen, so every page costs the same however deep it is
+    after_id = decode_cursor(cursor) if cursor else 0
+    results = (await db.execute(cursor_page(stmt, after_id, limit))).all()
+    has_more = len(results) > limit
+    results = results[:limit]
+    page = {
+        "items": user_rows(results),
+        "next_cursor": encode_cursor(results[-1].id) if has_more else None,
+    }
+    return fast_json_response(page, UserPage)
+
 
 # Get all users
-@router.get("/", response_model=List[UserResponse])
+@router.get("/", response_model=Union[List[UserResponse], UserPage])
 async def get_all_users(
-    db: db_dependency,
+    db: read_db_dependency,
     # current_user: get_current_user,
-    skip: int = 0,
-    limit: int = 100
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    paginate: Literal["offset", "cursor"] = "offset",
+    cursor: Optional[str] = None,
 ):
-    results = (
-        db.query(Users, func.count(Event.id).label("event_count"))
-        .outerjoin(Event, or_(Users.id == Event.team_id, Users.id == Event.sales_id))
-        .group_by(Users.id)
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
-
-    users = []
-    for user, count in results:
-        users.append({
-            "id": user.id,
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "email": user.email,
-            "userType": user.userType,
-            "phone": user.phone,
-            "event_count": count  
-        })
-
-    return users
+    return await list_users(db, user_list_query(), skip, limit, paginate, cursor)
 
 
 # Get user by ID
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user(
     user_id: int,
-    db: db_dependency,
+    db: async_db_dependency,
     # current_user: get_current_user
 ):
-    user = db.query(Users).filter(Users.id == user_id).first()
+    user = await user_cache.get_by_id(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -66,20 +102,21 @@ async def get_user(
 async def update_user(
     user_id: int,
     user_update: UpdateUserRequest,
-    db: db_dependency,
+    db: async_db_dependency,
     # current_user: get_current_user
 ):
-    user = db.query(Users).filter(Users.id == user_id).first()
+    user = await db.get(Users, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     update_data = user_update.model_dump(exclude_unset=True)
+    old_email = user.email
 
     # ✅ Secure password update
     if "password" in update_data:
         raw_password = update_data["password"]
         if raw_password:  # only hash if a new password is provided
-            update_data["password"] = bcrypt_context.hash(raw_password)
+            update_data["password"] = await password_hasher.hash(raw_password)
         else:
             update_data.pop("password")  # prevent setting empty password
 
@@ -87,40 +124,44 @@ async def update_user(
     for field, value in update_data.items():
         setattr(user, field, value)
 
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    await user_cache.invalidate(user_id, old_email, user.email)
+
+    if "password" in update_data:
+        await token_cache.revoke_user(user_id)
     return user
 
 # Delete user
 @router.delete("/{user_id}")
 async def delete_user(
     user_id: int,
-    db: db_dependency,
+    db: async_db_dependency,
     # current_user: get_current_user
 ):
-    user = db.query(Users).filter(Users.id == user_id).first()
+    user = await db.get(Users, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    db.delete(user)
-    db.commit()
+    await db.delete(user)
+    await db.commit()
+    await user_cache.invalidate(user_id, user.email)
+    await token_cache.revoke_user(user_id)
     return {"message": "User deleted successfully"}
 
 # Add team lead (non-admin user)
 @router.post("/team-lead", response_model=UserResponse)
+@query_budget(2)
 async def create_team_lead(
     team_lead_data: CreateTeamLeadRequest,
-    db: db_dependency,
+    db: async_db_dependency,
     # current_user: get_current_user
 ):
-    # Check if email already exists
-    existing_user = db.query(Users).filter(Users.email == team_lead_data.email).first()
-    if existing_user:
+    # Check email and phone in one round-trip; an email clash is reported first
+    clashes = (await db.execute(contact_clash_query(team_lead_data.email, team_lead_data.phone))).all()
+    if any(row.email == team_lead_data.email for row in clashes):
         raise HTTPException(status_code=400, detail="Email already registered")
-    
-    # Check if phone already exists
-    existing_user = db.query(Users).filter(Users.phone == team_lead_data.phone).first()
-    if existing_user:
+    if clashes:
         raise HTTPException(status_code=400, detail="phone already registered")
     
     # Create team lead with userType = "team_lead"
@@ -130,22 +171,22 @@ async def create_team_lead(
         email=team_lead_data.email,
         phone=team_lead_data.phone,
         userType="team_lead",
-        password=bcrypt_context.hash(team_lead_data.password)
+        password=await password_hasher.hash(team_lead_data.password)
     )
     
+    # Every column is set client-side and expire_on_commit is off, so no refresh SELECT is needed
     db.add(team_lead)
-    db.commit()
-    db.refresh(team_lead)
+    await db.commit()
     
     return team_lead
 @router.post("/sales-lead", response_model=UserResponse)
 async def create_team_lead(
     team_lead_data: CreateTeamLeadRequest,
-    db: db_dependency,
+    db: async_db_dependency,
     # current_user: get_current_user
 ):
     # Check if email already exists
-    existing_user = db.query(Users).filter(Users.email == team_lead_data.email).first()
+    existing_user = (await db.execute(user_by_email_query(team_lead_data.email))).scalars().first()
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
@@ -156,22 +197,22 @@ async def create_team_lead(
         email=team_lead_data.email,
         userType="sales",
         phone=team_lead_data.phone,
-        password=bcrypt_context.hash(team_lead_data.password)
+        password=await password_hasher.hash(team_lead_data.password)
     )
     
     db.add(team_lead)
-    db.commit()
-    db.refresh(team_lead)
+    await db.commit()
+    await db.refresh(team_lead)
     
     return team_lead
 @router.post("/super_sales", response_model=UserResponse)
 async def create_super_sales(
     super_sales_data: CreateTeamLeadRequest,
-    db: db_dependency,
+    db: async_db_dependency,
     # current_user: get_current_user
 ):
     # Check if email already exists
-    existing_user = db.query(Users).filter(Users.email == super_sales_data.email).first()
+    existing_user = (await db.execute(user_by_email_query(super_sales_data.email))).scalars().first()
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
@@ -182,23 +223,23 @@ async def create_super_sales(
         email=super_sales_data.email,
         userType="super_sales",
         phone=super_sales_data.phone,
-        password=bcrypt_context.hash(super_sales_data.password)
+        password=await password_hasher.hash(super_sales_data.password)
     )
     
     db.add(team_lead)
-    db.commit()
-    db.refresh(team_lead)
+    await db.commit()
+    await db.refresh(team_lead)
     
     return team_lead
 
 @router.post("/admin-lead", response_model=UserResponse)
 async def create_team_lead(
     team_lead_data: CreateTeamLeadRequest,
-    db: db_dependency,
+    db: async_db_dependency,
     # current_user: get_current_user
 ):
     # Check if email already exists
-    existing_user = db.query(Users).filter(Users.email == team_lead_data.email).first()
+    existing_user = (await db.execute(user_by_email_query(team_lead_data.email))).scalars().first()
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
@@ -209,24 +250,43 @@ async def create_team_lead(
         email=team_lead_data.email,
         phone=team_lead_data.phone,
         userType="desange",
-        password=bcrypt_context.hash(team_lead_data.password)
+        password=await password_hasher.hash(team_lead_data.password)
     )
     
     db.add(team_lead)
-    db.commit()
-    db.refresh(team_lead)
+    await db.commit()
+    await db.refresh(team_lead)
     
     return team_lead
 
+# Bulk import users from CSV (header line first) or NDJSON, one user per line.
+# Columns/keys: first_name, last_name, email, phone, password and optionally userType.
+@router.post("/bulk")
+@query_budget(repeats=None)  # one INSERT per batch by design
+async def bulk_import_users(
+    request: Request,
+    db: async_db_dependency,
+    current_user: dict = Depends(require_admin),
+    user_type: str = "team_lead",
+    format: Optional[Literal["csv", "ndjson"]] = None,
+):
+    if user_type not in BULK_USER_TYPES:
+        raise HTTPException(status_code=400, detail=f"Invalid user type. Must be one of: {list(BULK_USER_TYPES)}")
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "ndjson" if "json" in content_type else "csv"
+    importer = BulkUserImport(db, user_type)
+    return await importer.run(parse_rows(request.stream(), format))
+
 # Update user type
 @router.patch("/{user_id}/user-type", response_model=UserResponse)
 async def update_user_type(
     user_id: int,
     user_type_data: UpdateUserTypeRequest,
-    db: db_dependency,
+    db: async_db_dependency,
     # current_user: get_current_user
 ):
-    user = db.query(Users).filter(Users.id == user_id).first()
+    user = await db.get(Users, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -239,39 +299,20 @@ async def update_user_type(
         )
     
     user.userType = user_type_data.userType
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    await user_cache.invalidate(user_id, user.email)
     
     return user
 
 # Get users by type
-@router.get("/type/{user_type}", response_model=List[UserResponse])
+@router.get("/type/{user_type}", response_model=Union[List[UserResponse], UserPage])
 async def get_users_by_type(
-    db: db_dependency,
+    db: read_db_dependency,
     user_type: str,
-    skip: int = 0,
-    limit: int = 100,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    paginate: Literal["offset", "cursor"] = "offset",
+    cursor: Optional[str] = None,
 ):
-    results = (
-        db.query(Users, func.count(Event.id).label("event_count"))
-        .outerjoin(Event, or_(Users.id == Event.team_id,Users.id == Event.sales_id))
-        .filter(Users.userType == user_type)
-        .group_by(Users.id)
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
-
-    users = []
-    for user, count in results:
-        users.append({
-            "id": user.id,
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "email": user.email,
-            "userType": user.userType,
-            "phone": user.phone,
-            "event_count": count,
-        })
-
-    return users
\ No newline at end of file
+    return await list_users(db, user_list_query(user_type), skip, limit, paginate, cursor)
@@ -0,0 +1,69 @@
+"""
+Render throughput of the email templates.
+
+    python -m benchmarks.email_templates [--seconds 2]
+
+Compares per-send work (substituting into or compiling the full document every time)
+against the precompiled templates used by custom_email.
+"""
+import argparse
+import json
+import time
+from emailsTemps.template_engine import CompiledTemplate, SLOT_RE, templates
+from emailsTemps.custom_email_send import EMAIL_SHELL, custom_email
+from emailsTemps.otp_email import OTP_BODY, otp_email_body
+
+VALUES = {"name": "Jane", "heading": "Welcome to Centerpiece Dashboard!", "year": 2025}
+
+
+def substitute_per_send():
+    body = SLOT_RE.sub(lambda m: {"otp": "A1B2C3", "purpose": "login"}[m.group(1)], OTP_BODY)
+    values = dict(VALUES, msg=body)
+    return SLOT_RE.sub(lambda m: str(values[m.group(1)]), EMAIL_SHELL)
+
+
+def compile_per_send():
+    body = CompiledTemplate("otp", OTP_BODY).render(otp="A1B2C3", purpose="login")
+    return CompiledTemplate("shell", EMAIL_SHELL, raw=("msg",)).render(msg=body, **VALUES)
+
+
+def precompiled():
+    return custom_email("Jane", VALUES["heading"], otp_email_body("A1B2C3", "login"))
+
+
+def precompiled_bytes():
+    body = templates.get("otp_code").render(otp="A1B2C3", purpose="login")
+    return templates.get("email_shell").render_bytes(msg=body, **VALUES)
+
+
+def measure(func, seconds: float):
+    size = len(func())
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(100):
+            func()
+        count += 100
+    elapsed = time.perf_counter() - start
+    return {"renders_per_sec": round(count / elapsed), "bytes_per_render": size, "mb_per_sec": round(count * size / elapsed / 1e6, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+    results = {
+        name: measure(func, args.seconds)
+        for name, func in [
+            ("substitute_per_send", substitute_per_send),
+            ("compile_per_send", compile_per_send),
+            ("precompiled", precompiled),
+            ("precompiled_bytes", precompiled_bytes),
+        ]
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
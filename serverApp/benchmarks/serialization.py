@@ -0,0 +1,80 @@
+"""
+Serialization throughput of the user listing response.
+
+    python -m benchmarks.serialization [--rows 1000] [--seconds 2]
+
+Compares FastAPI's response_model path (validate each row, convert to JSON-able
+Python, json.dumps) against function.fast_json with and without validation.
+"""
+import argparse
+import json
+import time
+from typing import List
+from fastapi.responses import JSONResponse
+from function.fast_json import dumps, fast_json_response, orjson, type_adapter
+from schemas.schemas import UserResponse
+
+
+def make_rows(count: int):
+    return [
+        {
+            "id": i,
+            "first_name": "Jane",
+            "last_name": f"Doe {i}",
+            "email": f"jane.doe{i}@example.com",
+            "userType": "sales",
+            "phone": f"078{i:07d}",
+            "event_count": i % 13,
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def response_model_path(rows):
+    # What FastAPI does for response_model=List[UserResponse] with the default JSONResponse
+    adapter = type_adapter(List[UserResponse])
+    validated = adapter.validate_python(rows)
+    return JSONResponse(adapter.dump_python(validated, mode="json")).body
+
+
+def fast_validated(rows):
+    return fast_json_response(rows, List[UserResponse], validate=True).body
+
+
+def fast_trusted(rows):
+    return fast_json_response(rows, List[UserResponse], validate=False).body
+
+
+def measure(func, rows, seconds: float):
+    size = len(func(rows))
+    count = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        func(rows)
+        count += 1
+    elapsed = time.perf_counter() - start
+    return {"rows_per_sec": round(count * len(rows) / elapsed), "bytes_per_response": size}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+    rows = make_rows(args.rows)
+    assert json.loads(response_model_path(rows)) == json.loads(fast_trusted(rows)) == json.loads(dumps(rows))
+    results = {
+        "encoder": "orjson" if orjson is not None else "json",
+        "response_model": measure(response_model_path, rows, args.seconds),
+        "fast_json_validated": measure(fast_validated, rows, args.seconds),
+        "fast_json_trusted": measure(fast_trusted, rows, args.seconds),
+    }
+    base = results["response_model"]["rows_per_sec"]
+    for name in ("fast_json_validated", "fast_json_trusted"):
+        results[name]["speedup"] = round(results[name]["rows_per_sec"] / base, 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
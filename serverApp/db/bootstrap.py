@@ -0,0 +1,114 @@
+"""
+Schema bootstrap, run once at startup (or by hand) instead of at import time.
+
+    python -m db.bootstrap           # create missing tables and indexes if the models changed
+    python -m db.bootstrap --force   # run create_all even if the fingerprint matches
+"""
+import hashlib
+import importlib
+import sys
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, delete, insert, select, text
+from sqlalchemy.exc import DBAPIError
+from .database import engine
+
+# Every module that declares tables; their Base.metadata objects are collected from here
+MODEL_MODULES = [
+    "models.account",
+    "models.investorModels",
+    "models.userModels",
+    "models.EventsModel",
+    "models.expense",
+    "models.IncomeModel",
+    "models.planning",
+    "models.emailModels",
+    "models.jobModels",
+]
+
+# Kept out of the application metadata so it never changes the fingerprint it stores
+version_metadata = MetaData()
+schema_version = Table(
+    "schema_version",
+    version_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("fingerprint", String(64), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# Arbitrary constant so concurrent workers serialize on one Postgres advisory lock
+BOOTSTRAP_LOCK_ID = 742_001
+
+_bootstrapped = False
+
+
+def load_metadata():
+    """Import the model modules and return their distinct MetaData objects."""
+    metadatas = []
+    for name in MODEL_MODULES:
+        metadata = importlib.import_module(name).Base.metadata
+        if not any(metadata is m for m in metadatas):
+            metadatas.append(metadata)
+    return metadatas
+
+
+def schema_fingerprint(metadatas) -> str:
+    digest = hashlib.sha256()
+    tables = sorted((t for m in metadatas for t in m.tables.values()), key=lambda t: t.fullname)
+    for table in tables:
+        digest.update(f"table:{table.fullname}\n".encode())
+        for column in table.columns:
+            digest.update(
+                f"col:{column.name}:{column.type!r}:{column.nullable}:{column.primary_key}\n".encode()
+            )
+        for index in sorted(table.indexes, key=lambda i: i.name or ""):
+            columns = ",".join(c.name for c in index.columns)
+            digest.update(f"idx:{index.name}:{columns}:{index.unique}\n".encode())
+        for constraint in sorted(table.constraints, key=lambda c: type(c).__name__ + str(c.name)):
+            columns = ",".join(c.name for c in getattr(constraint, "columns", []))
+            digest.update(f"con:{type(constraint).__name__}:{constraint.name}:{columns}\n".encode())
+    return digest.hexdigest()
+
+
+def stored_fingerprint(bind=engine):
+    with bind.connect() as conn:
+        try:
+            return conn.execute(select(schema_version.c.fingerprint).where(schema_version.c.id == 1)).scalar()
+        except DBAPIError:
+            # Fresh database, the version table does not exist yet
+            return None
+
+
+def bootstrap_schema(bind=engine, force: bool = False) -> bool:
+    """Create missing tables and indexes when the models changed. Returns True if create_all ran."""
+    global _bootstrapped
+    if _bootstrapped and not force:
+        return False
+
+    metadatas = load_metadata()
+    fingerprint = schema_fingerprint(metadatas)
+
+    # Fast path: one indexed read, no reflection
+    if not force and stored_fingerprint(bind) == fingerprint:
+        _bootstrapped = True
+        return False
+
+    with bind.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": BOOTSTRAP_LOCK_ID})
+        for metadata in metadatas:
+            metadata.create_all(bind=conn)
+            # create_all only indexes tables it creates; add indexes declared on existing ones
+            for table in metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(bind=conn, checkfirst=True)
+        version_metadata.create_all(bind=conn)
+        conn.execute(delete(schema_version).where(schema_version.c.id == 1))
+        conn.execute(insert(schema_version).values(id=1, fingerprint=fingerprint, applied_at=datetime.utcnow()))
+
+    _bootstrapped = True
+    return True
+
+
+if __name__ == "__main__":
+    ran = bootstrap_schema(force="--force" in sys.argv)
+    print("Schema updated" if ran else "Schema is current")
@@ -1,22 +1,11 @@
-from fastapi import Depends
+from fastapi import Depends, Request
 from sqlalchemy.orm import Session
-from .database import engine, SessionLocal
+from sqlalchemy.ext.asyncio import AsyncSession
+from .database import SessionLocal, AsyncSessionLocal
+from .replicas import ReadSessionLocal
 from typing import Annotated
-from models.userModels import  Base as UserBase
-from models.EventsModel import  Base as EventsBase
-from models.expense import  Base as ExpenseBase
-from models.IncomeModel import  Base as IncomeBase
-from models.planning import Base as PlanningBase
-from models.investorModels import Base as InvBaSe
-from models.account import Base as AccBase
-
-AccBase.metadata.create_all(bind=engine)
-InvBaSe.metadata.create_all(bind=engine)
-UserBase.metadata.create_all(bind=engine)
-EventsBase.metadata.create_all(bind=engine)
-ExpenseBase.metadata.create_all(bind=engine)
-IncomeBase.metadata.create_all(bind=engine)
-PlanningBase.metadata.create_all(bind=engine)
+
+# Tables are created by db.bootstrap.bootstrap_schema() at startup, not on import
 
 
 def get_db():
@@ -27,4 +16,22 @@ def get_db():
         db.close()
 
 
-db_dependency = Annotated[Session, Depends(get_db)]
\ No newline at end of file
+db_dependency = Annotated[Session, Depends(get_db)]
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async_db_dependency = Annotated[AsyncSession, Depends(get_async_db)]
+
+
+# For read-mostly GET handlers: SELECTs may go to a replica (see db.replicas)
+async def get_read_db(request: Request):
+    session_factory = ReadSessionLocal if request.method in ("GET", "HEAD") else AsyncSessionLocal
+    async with session_factory() as db:
+        yield db
+
+
+read_db_dependency = Annotated[AsyncSession, Depends(get_read_db)]
@@ -0,0 +1,159 @@
+"""
+Per-user event counters kept in user_event_counts, so listings don't need the
+OR outer join against events.
+
+An event counts once for its team lead (team_id) and once for its sales person
+(sales_id), unless both are the same user; this matches the old
+outerjoin(Event, or_(Users.id == Event.team_id, Users.id == Event.sales_id)).
+
+    python -m db.event_counters rebuild   # recompute every counter from events
+"""
+import sys
+from collections import defaultdict
+from sqlalchemy import event, delete, func, insert, inspect, select, text, update, or_
+from sqlalchemy.orm import Session
+from models.userModels import Users, UserEventCounts
+from models.EventsModel import Event
+from .database import engine
+
+TEAM, SALES = 0, 1
+
+# Selected next to Users by the listings instead of joining events with an OR
+EVENT_COUNT = (
+    func.coalesce(UserEventCounts.team_event_count, 0) + func.coalesce(UserEventCounts.sales_event_count, 0)
+).label("event_count")
+
+
+def _contribution(team_id, sales_id):
+    parts = []
+    if team_id is not None:
+        parts.append((team_id, TEAM))
+    if sales_id is not None and sales_id != team_id:
+        parts.append((sales_id, SALES))
+    return parts
+
+
+def _previous(state, key):
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(state.obj(), key)
+
+
+def _collect_deltas(session):
+    deltas = defaultdict(lambda: [0, 0])
+
+    def apply(sign, team_id, sales_id):
+        for user_id, column in _contribution(team_id, sales_id):
+            deltas[user_id][column] += sign
+
+    for obj in session.new:
+        if isinstance(obj, Event):
+            apply(1, obj.team_id, obj.sales_id)
+    for obj in session.deleted:
+        if isinstance(obj, Event):
+            state = inspect(obj)
+            apply(-1, _previous(state, "team_id"), _previous(state, "sales_id"))
+    for obj in session.dirty:
+        if isinstance(obj, Event) and obj not in session.deleted:
+            state = inspect(obj)
+            if state.attrs.team_id.history.has_changes() or state.attrs.sales_id.history.has_changes():
+                apply(-1, _previous(state, "team_id"), _previous(state, "sales_id"))
+                apply(1, obj.team_id, obj.sales_id)
+    return {user_id: d for user_id, d in deltas.items() if d[TEAM] or d[SALES]}
+
+
+def apply_deltas(conn, deltas):
+    table = UserEventCounts.__table__
+    dialect = conn.dialect.name
+    for user_id, (team_delta, sales_delta) in sorted(deltas.items()):
+        if dialect in ("postgresql", "sqlite"):
+            if dialect == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert as upsert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as upsert
+            stmt = upsert(table).values(user_id=user_id, team_event_count=team_delta, sales_event_count=sales_delta)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.user_id],
+                set_={
+                    "team_event_count": table.c.team_event_count + team_delta,
+                    "sales_event_count": table.c.sales_event_count + sales_delta,
+                },
+            )
+            conn.execute(stmt)
+        else:
+            result = conn.execute(
+                update(table)
+                .where(table.c.user_id == user_id)
+                .values(
+                    team_event_count=table.c.team_event_count + team_delta,
+                    sales_event_count=table.c.sales_event_count + sales_delta,
+                )
+            )
+            if result.rowcount == 0:
+                conn.execute(insert(table).values(user_id=user_id, team_event_count=team_delta, sales_event_count=sales_delta))
+
+
+# Make the ORM load the old value when team_id/sales_id is assigned on an expired
+# instance, so the previous owner's counter can be decremented
+@event.listens_for(Event.team_id, "set", active_history=True)
+@event.listens_for(Event.sales_id, "set", active_history=True)
+def _keep_old_owner(target, value, oldvalue, initiator):
+    pass
+
+
+@event.listens_for(Session, "before_flush")
+def _load_deleted_owners(session, flush_context, instances):
+    # Deleted rows can't be loaded after the DELETE runs, so read their owners now
+    for obj in session.deleted:
+        if isinstance(obj, Event):
+            obj.team_id, obj.sales_id
+
+
+# after_flush still sees the pre-flush new/dirty/deleted sets and attribute history,
+# and runs inside the same transaction as the event write
+@event.listens_for(Session, "after_flush")
+def _maintain_event_counters(session, flush_context):
+    deltas = _collect_deltas(session)
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+
+def rebuild_event_counters(bind=engine) -> int:
+    """Recompute every counter from the events table. Returns the number of users written."""
+    team = (
+        select(Event.team_id.label("user_id"), func.count(Event.id).label("n"))
+        .where(Event.team_id.isnot(None))
+        .group_by(Event.team_id)
+        .subquery()
+    )
+    sales = (
+        select(Event.sales_id.label("user_id"), func.count(Event.id).label("n"))
+        .where(Event.sales_id.isnot(None), or_(Event.team_id.is_(None), Event.team_id != Event.sales_id))
+        .group_by(Event.sales_id)
+        .subquery()
+    )
+    source = (
+        select(Users.id, func.coalesce(team.c.n, 0), func.coalesce(sales.c.n, 0))
+        .outerjoin(team, team.c.user_id == Users.id)
+        .outerjoin(sales, sales.c.user_id == Users.id)
+    )
+    table = UserEventCounts.__table__
+    with bind.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            # Event writes queue behind the rebuild instead of racing it
+            conn.execute(text("LOCK TABLE user_event_counts IN SHARE ROW EXCLUSIVE MODE"))
+        conn.execute(delete(table))
+        conn.execute(
+            insert(table).from_select(["user_id", "team_event_count", "sales_event_count"], source)
+        )
+        return conn.execute(select(func.count()).select_from(table)).scalar()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        print("usage: python -m db.event_counters rebuild")
+        sys.exit(2)
+    print(f"Rebuilt event counters for {rebuild_event_counters()} users")
@@ -0,0 +1,132 @@
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+# Upper bounds (ms) of the checkout wait histogram buckets
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf"))
+
+
+class PoolStats:
+    """Counters and checkout-wait histogram for one engine's pool."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pool = None
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_count = 0
+        self.wait_sum_ms = 0.0
+        self.wait_buckets = [0] * len(WAIT_BUCKETS_MS)
+        self._lock = threading.Lock()
+
+    def count(self, counter: str):
+        # Pool events fire on whichever thread checks out, so += needs the lock
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def observe_wait(self, seconds: float):
+        ms = seconds * 1000
+        with self._lock:
+            self.wait_count += 1
+            self.wait_sum_ms += ms
+            for i, bound in enumerate(WAIT_BUCKETS_MS):
+                if ms <= bound:
+                    self.wait_buckets[i] += 1
+                    break
+
+    def snapshot(self) -> dict:
+        pool = self.pool
+        live = {}
+        if isinstance(pool, QueuePool):
+            live = {
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,
+            }
+        with self._lock:
+            return {
+                "pool": type(pool).__name__ if pool is not None else None,
+                **live,
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "wait_ms": {
+                    "count": self.wait_count,
+                    "sum": round(self.wait_sum_ms, 3),
+                    "buckets": {
+                        ("+Inf" if bound == float("inf") else str(bound)): count
+                        for bound, count in zip(WAIT_BUCKETS_MS, self.wait_buckets)
+                    },
+                },
+            }
+
+
+pool_stats = {}
+
+
+class _TimedCheckoutMixin:
+    # There is no pool event for "started waiting", so the wait is timed around _do_get
+    def _do_get(self):
+        stats = pool_stats.get(getattr(self, "_stats_name", None))
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            if stats is not None:
+                stats.count("timeouts")
+            raise
+        finally:
+            if stats is not None:
+                stats.observe_wait(time.perf_counter() - start)
+
+    def recreate(self):
+        # engine.dispose() recreates the pool; keep it attached to the same stats
+        new_pool = super().recreate()
+        new_pool._stats_name = getattr(self, "_stats_name", None)
+        stats = pool_stats.get(new_pool._stats_name)
+        if stats is not None:
+            stats.pool = new_pool
+        return new_pool
+
+
+class InstrumentedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrument_pool(name: str, engine):
+    """Attach pool event listeners to an engine (sync or async) and register its stats."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    stats = pool_stats.setdefault(name, PoolStats(name))
+    stats.pool = sync_engine.pool
+    sync_engine.pool._stats_name = name
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        stats.count("connects")
+
+    @event.listens_for(sync_engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.count("checkouts")
+
+    @event.listens_for(sync_engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        stats.count("checkins")
+
+    @event.listens_for(sync_engine, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        stats.count("invalidations")
+
+    return stats
@@ -0,0 +1,280 @@
+"""
+Query-plan audit for the lookups the routers run.
+
+Each entry in AUDIT_QUERIES builds its statement with the query builder the endpoint
+itself uses (Endpoints.users, Endpoints.auth, function.user_cache, ...), with sample
+values, so the audit can't drift from what the endpoints run.
+The audit runs EXPLAIN against DATABASE_URL, flags full table scans on tables over
+--min-rows, and prints index / unique-constraint DDL for the columns involved.
+
+    python -m db.query_audit                  # report against DATABASE_URL
+    python -m db.query_audit --seed 50000     # fill an empty scratch database first
+    python -m db.query_audit --check          # exit 1 on any unexpected scan (CI)
+
+On Postgres the plan comes from EXPLAIN (ANALYZE, FORMAT JSON); on SQLite from
+EXPLAIN QUERY PLAN. When a new endpoint filters on a column, give its query a builder
+next to the endpoint and add an entry here. tests/test_query_audit.py runs --check.
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+from sqlalchemy import insert, inspect, select, text
+from models.userModels import Users, Customers, OTP
+from Endpoints import auth, users
+from function.otp_store import delete_otp_query, latest_otp_query
+from function.outbox import claim_query
+from function.user_cache import user_query
+from .bootstrap import bootstrap_schema
+from .database import engine
+
+AUDIT_MIN_ROWS = int(os.getenv("AUDIT_MIN_ROWS", 1000))
+
+
+class AuditQuery:
+    def __init__(self, endpoint, table, columns, build, unique=False, expect_scan=False):
+        self.endpoint = endpoint
+        self.table = table
+        self.columns = columns  # the filter columns an index should cover, in order
+        self.build = build
+        self.unique = unique  # the app already treats these values as unique
+        self.expect_scan = expect_scan  # full listings read the whole table anyway
+
+
+AUDIT_QUERIES = [
+    AuditQuery(
+        "POST /auth/register, POST /auth/login, POST /auth/verify-otp, "
+        "POST /users/sales-lead, /users/super_sales, /users/admin-lead",
+        "users", ("email",),
+        lambda: auth.user_by_email_query("seed-17@example.com"),
+        unique=True,
+    ),
+    AuditQuery(
+        "POST /auth/send-otp/ (user cache miss)",
+        "users", ("email",),
+        lambda: user_query(Users.email == "seed-17@example.com"),
+        unique=True,
+    ),
+    AuditQuery(
+        "GET /users/{user_id}, GET /auth/profile (user cache miss)",
+        "users", ("id",),
+        lambda: user_query(Users.id == 17),
+    ),
+    AuditQuery(
+        "POST /users/team-lead",
+        "users", ("email",),
+        lambda: users.contact_clash_query("seed-17@example.com", "0780000017"),
+        unique=True,
+    ),
+    AuditQuery(
+        "PUT /auth/update-phone",
+        "users", ("phone",),
+        lambda: auth.phone_taken_query("0780000017", 1),
+        unique=True,
+    ),
+    AuditQuery(
+        "GET /users/type/{user_type}",
+        "users", ("userType",),
+        lambda: users.offset_page(users.user_list_query("admin"), 0, 100),
+    ),
+    AuditQuery(
+        "GET /users/type/{user_type}?paginate=cursor",
+        "users", ("userType",),
+        lambda: users.cursor_page(users.user_list_query("admin"), 100, 100),
+    ),
+    AuditQuery(
+        "GET /users/?paginate=offset",
+        "users", (),
+        lambda: users.offset_page(users.user_list_query(), 0, 100),
+        expect_scan=True,
+    ),
+    AuditQuery(
+        "GET /users/?paginate=cursor",
+        "users", ("id",),
+        lambda: users.cursor_page(users.user_list_query(), 100, 100),
+    ),
+    AuditQuery(
+        "POST /auth/send-otp/, POST /auth/verify-otp (OTP_STORE=sql)",
+        "sent_otps", ("account_id",),
+        lambda: delete_otp_query(17),
+    ),
+    AuditQuery(
+        "POST /auth/verify-otp (OTP_STORE=sql)",
+        "sent_otps", ("account_id",),
+        lambda: latest_otp_query(17),
+    ),
+    AuditQuery(
+        # The customers router isn't in this tree; this mirrors its lookup by owner
+        "customers by owner",
+        "customers", ("user_id",),
+        lambda: select(Customers).where(Customers.user_id == 17),
+    ),
+    AuditQuery(
+        "email outbox worker claim",
+        "email_outbox", ("status", "next_attempt_at"),
+        lambda: claim_query(datetime.utcnow()),
+    ),
+]
+
+
+def _explain(conn, stmt):
+    """Return [(table, scanned_rows)] for every full scan in the plan, plus the raw plan."""
+    compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    sql = str(compiled)
+
+    if conn.dialect.name == "postgresql":
+        plan = conn.exec_driver_sql("EXPLAIN (ANALYZE, FORMAT JSON) " + sql, params).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        scans = []
+
+        def walk(node):
+            if node.get("Node Type") == "Seq Scan":
+                rows = (node.get("Actual Rows", 0) + node.get("Rows Removed by Filter", 0)) * node.get("Actual Loops", 1)
+                scans.append((node.get("Relation Name"), rows))
+            for child in node.get("Plans", []):
+                walk(child)
+
+        walk(plan[0]["Plan"])
+        return scans, plan
+
+    rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + sql, params).all()
+    scans = []
+    for row in rows:
+        detail = row[-1]
+        # "SCAN users" is a full scan; "SEARCH users USING INDEX ..." is a lookup
+        if detail.startswith("SCAN ") and "COVERING INDEX" not in detail:
+            scans.append((detail.split()[1], None))
+    return scans, [row[-1] for row in rows]
+
+
+def _row_counts(conn, tables):
+    return {table: conn.execute(text(f'SELECT count(*) FROM "{table}"')).scalar() for table in tables}
+
+
+def _leading_indexes(conn, table):
+    """Column tuples of existing indexes and unique constraints on a table."""
+    inspector = inspect(conn)
+    indexed = [tuple(i["column_names"]) for i in inspector.get_indexes(table)]
+    indexed += [tuple(u["column_names"]) for u in inspector.get_unique_constraints(table)]
+    pk = inspector.get_pk_constraint(table).get("constrained_columns") or []
+    if pk:
+        indexed.append(tuple(pk))
+    return indexed
+
+
+def suggested_ddl(query, dialect_name):
+    columns = ", ".join(f'"{c}"' if c != c.lower() else c for c in query.columns)
+    name = f"ix_{query.table}_{'_'.join(c.lower() for c in query.columns)}"
+    concurrently = "CONCURRENTLY " if dialect_name == "postgresql" else ""
+    ddl = [f"CREATE INDEX {concurrently}{name} ON {query.table} ({columns});"]
+    if query.unique:
+        ddl.append(
+            f"-- find duplicates first: SELECT {columns}, count(*) FROM {query.table} GROUP BY {columns} HAVING count(*) > 1;"
+        )
+        unique_name = f"uq_{query.table}_{'_'.join(c.lower() for c in query.columns)}"
+        if dialect_name == "postgresql":
+            ddl.append(f"ALTER TABLE {query.table} ADD CONSTRAINT {unique_name} UNIQUE ({columns});")
+        else:
+            ddl.append(f"CREATE UNIQUE INDEX {unique_name} ON {query.table} ({columns});")
+    return ddl
+
+
+def audit(bind=engine, min_rows: int = AUDIT_MIN_ROWS, verbose: bool = False):
+    """Explain every AUDIT_QUERIES entry. Returns a list of finding dicts."""
+    findings = []
+    with bind.connect() as conn:
+        counts = _row_counts(conn, {q.table for q in AUDIT_QUERIES})
+        for query in AUDIT_QUERIES:
+            scans, plan = _explain(conn, query.build())
+            conn.rollback()  # EXPLAIN ANALYZE runs the query; leave nothing open between entries
+            indexed = _leading_indexes(conn, query.table)
+            covered = not query.columns or any(ix[:len(query.columns)] == query.columns for ix in indexed)
+            flagged = [
+                (table, rows) for table, rows in scans
+                if (rows if rows is not None else counts.get(table, 0)) >= min_rows
+            ]
+            problem = bool(flagged) and not query.expect_scan
+            findings.append({
+                "endpoint": query.endpoint,
+                "table": query.table,
+                "columns": list(query.columns),
+                "rows": counts.get(query.table, 0),
+                "seq_scans": flagged,
+                "indexed": covered,
+                "problem": problem or not covered,
+                "ddl": [] if covered else suggested_ddl(query, conn.dialect.name),
+                "plan": plan if verbose else None,
+            })
+    return findings
+
+
+def seed(bind=engine, rows: int = 50_000):
+    """Fill empty users, customers and sent_otps tables with synthetic rows for planning."""
+    bootstrap_schema(bind)
+    now = datetime.utcnow()
+    user_types = ["admin", "team_lead", "sales", "super_sales"]
+    with bind.begin() as conn:
+        existing = _row_counts(conn, ["users", "customers", "sent_otps"])
+        if any(existing.values()):
+            print(f"Refusing to seed a database that already has data: {existing}")
+            return False
+        for start in range(0, rows, 5000):
+            batch = range(start + 1, min(start + 5000, rows) + 1)
+            conn.execute(insert(Users), [
+                {"id": i, "first_name": "Seed", "last_name": str(i), "email": f"seed-{i}@example.com",
+                 "userType": user_types[i % len(user_types)], "phone": f"078{i:07d}", "password": ""}
+                for i in batch
+            ])
+            conn.execute(insert(Customers), [
+                {"first_name": "Customer", "last_name": str(i), "email": f"customer-{i}@example.com",
+                 "user_id": i % 500 + 1, "created_at": now, "updated_at": now}
+                for i in batch
+            ])
+            conn.execute(insert(OTP), [
+                {"account_id": i, "otp_code": "ABC123", "verification_code": f"v{i:07d}",
+                 "purpose": "login", "date": now - timedelta(minutes=i % 60)}
+                for i in batch
+            ])
+        conn.execute(text("ANALYZE"))
+    return True
+
+
+def print_report(findings):
+    for finding in findings:
+        status = "FAIL" if finding["problem"] else "ok  "
+        columns = ", ".join(finding["columns"]) or "-"
+        print(f"[{status}] {finding['table']}({columns}) rows={finding['rows']}  {finding['endpoint']}")
+        for table, rows in finding["seq_scans"]:
+            print(f"         full scan on {table}" + (f" ({rows} rows read)" if rows is not None else ""))
+        for line in finding["ddl"]:
+            print(f"         {line}")
+        if finding["plan"] is not None:
+            print("         plan: " + json.dumps(finding["plan"], default=str)[:2000])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Audit endpoint query plans for missing indexes")
+    parser.add_argument("--seed", type=int, default=0, help="seed an empty database with this many rows per table")
+    parser.add_argument("--min-rows", type=int, default=AUDIT_MIN_ROWS, help="ignore scans of smaller tables")
+    parser.add_argument("--check", action="store_true", help="exit 1 if any query is flagged")
+    parser.add_argument("--json", action="store_true", help="print findings as JSON")
+    parser.add_argument("--verbose", action="store_true", help="include the raw plans")
+    args = parser.parse_args(argv)
+
+    if args.seed:
+        seed(rows=args.seed)
+    results = audit(min_rows=args.min_rows, verbose=args.verbose)
+    if args.json:
+        print(json.dumps(results, indent=2, default=str))
+    else:
+        print_report(results)
+    return 1 if args.check and any(f["problem"] for f in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
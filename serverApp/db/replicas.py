@@ -0,0 +1,63 @@
+"""
+Optional read replicas for GET handlers.
+
+    DATABASE_REPLICA_URLS=postgresql://app@replica1/app,postgresql://app@replica2/app
+
+Sessions from ReadSessionLocal (read_db_dependency in db.connection) send SELECTs
+to a random replica until the session writes; from then on every statement goes to
+the primary, so a request always reads its own writes. Without replicas they are
+ordinary primary sessions.
+
+Replicas lag the primary. Don't read through them into anything that outlives the
+request (function.user_cache fills from the primary for this reason).
+"""
+import os
+import random
+from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from .database import async_engine, pool_options, to_async_url
+from .pool_stats import InstrumentedAsyncQueuePool, instrument_pool
+from function.metrics import metrics
+
+load_dotenv()
+
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+
+replica_engines = []
+for number, url in enumerate(DATABASE_REPLICA_URLS):
+    replica_url = to_async_url(url)
+    replica = create_async_engine(replica_url, **pool_options(replica_url, InstrumentedAsyncQueuePool))
+    instrument_pool(f"replica_{number}", replica)
+    replica_engines.append(replica)
+
+# reason: read (SELECT on a replica), write (the statement that made the session sticky), sticky
+routed_statements = metrics.counter(
+    "db_routed_statements_total", "Statements run by read sessions, by target", ("target", "reason")
+)
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if not replica_engines:
+            return super().get_bind(mapper, clause=clause, **kw)
+        if self.info.get("wrote"):
+            routed_statements.inc("primary", "sticky")
+            return super().get_bind(mapper, clause=clause, **kw)
+        if clause is not None and getattr(clause, "is_select", False) and not self._flushing:
+            number = random.randrange(len(replica_engines))
+            routed_statements.inc(f"replica_{number}", "read")
+            return replica_engines[number].sync_engine
+        # A flush, DML, text() or a bare connection() request: assume it writes
+        self.info["wrote"] = True
+        routed_statements.inc("primary", "write")
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
+ReadSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    sync_session_class=RoutingSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
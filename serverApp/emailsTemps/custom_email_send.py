@@ -1,56 +1,55 @@
 from datetime import datetime
+from emailsTemps.template_engine import templates
 
-def custom_email(name, heading, msg):
-    return f"""
+# Shared shell for every notification email; compiled (CSS inlined) once at import
+EMAIL_SHELL = """
 <!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Centerpiece Dashboard</title>
-    <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.5.2/css/all.min.css">
     <style>
-        @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600&display=swap');
-        body {{
+        body {
             font-family: 'Inter', Arial, sans-serif;
             background-color: #f1f5f9;
             margin: 0;
             padding: 0;
-        }}
-        .container {{
+        }
+        .container {
             max-width: 600px;
             margin: 40px auto;
             background: #ffffff;
             border-radius: 12px;
             overflow: hidden;
             box-shadow: 0 4px 6px -1px rgba(0, 0, 0, 0.1);
-        }}
-        .header {{
+        }
+        .header {
             background: white;
             padding: 24px;
             text-align: center;
-        }}
-        .header img {{
+        }
+        .header img {
             max-width: 200px;
             height: auto;
-        }}
-        .content {{
+        }
+        .content {
             padding: 40px 32px;
             color: #334155;
-        }}
-        .content h1 {{
+        }
+        .content h1 {
             font-size: 24px;
             font-weight: 600;
             color: #1e293b;
             margin-top: 0;
-        }}
-        .content p {{
+        }
+        .content p {
             font-size: 15px;
             line-height: 1.6;
             margin: 16px 0;
             color: #475569;
-        }}
-        .btn-primary {{
+        }
+        .btn-primary {
             background: linear-gradient(135deg, #f8ae1f 0%, #e69c00 100%);
             color: #1e293b !important;
             padding: 12px 28px;
@@ -61,41 +60,41 @@ def custom_email(name, heading, msg):
             margin: 20px 0;
             border: none;
             cursor: pointer;
-        }}
-        .btn-primary:hover {{
+        }
+        .btn-primary:hover {
             background: linear-gradient(135deg, #e69c00 0%, #cc8a00 100%);
-        }}
-        .footer {{
+        }
+        .footer {
             text-align: center;
             padding: 24px;
             font-size: 13px;
             color: #64748b;
             background: #f8fafc;
             border-top: 1px solid #e2e8f0;
-        }}
-        .footer a {{
+        }
+        .footer a {
             color: #f8ae1f;
             text-decoration: none;
             margin: 0 6px;
             font-weight: 500;
-        }}
-        .footer a:hover {{
+        }
+        .footer a:hover {
             color: #e69c00;
             text-decoration: underline;
-        }}
-        .highlight {{
+        }
+        .highlight {
             color: #f8ae1f;
             font-weight: 600;
-        }}
-        .security-note {{
+        }
+        .security-note {
             background: #fffbeb;
             border: 1px solid #fef3c7;
             border-radius: 8px;
             padding: 16px;
             margin: 20px 0;
             border-left: 4px solid #f8ae1f;
-        }}
-        .otp-code {{
+        }
+        .otp-code {
             background: #1e293b;
             color: #f8ae1f;
             padding: 16px;
@@ -106,7 +105,7 @@ def custom_email(name, heading, msg):
             letter-spacing: 4px;
             margin: 20px 0;
             font-family: 'Courier New', monospace;
-        }}
+        }
     </style>
 </head>
 <body>
@@ -118,12 +117,12 @@ def custom_email(name, heading, msg):
 
         <!-- Content -->
         <div class="content">
-            <h1>{heading}</h1>
-            <p>Dear <span class="highlight">{name}</span>,</p>
-            <div>{msg}</div>
+            <h1>{{ heading }}</h1>
+            <p>Dear <span class="highlight">{{ name }}</span>,</p>
+            <div>{{ msg }}</div>
             
             <div class="security-note">
-                <i class="fas fa-shield-alt" style="color: #f8ae1f; margin-right: 8px;"></i>
+                <span style="margin-right: 8px;">&#128737;</span>
                 <strong>Security Notice:</strong> For your protection, never share this code with anyone. 
                 Our team will never ask for your verification code.
             </div>
@@ -136,7 +135,7 @@ def custom_email(name, heading, msg):
 
         <!-- Footer -->
         <div class="footer">
-            <p>&copy; {datetime.now().year} <span class="highlight">Centerpiece Group Ltd</span>. All rights reserved.</p>
+            <p>&copy; {{ year }} <span class="highlight">Centerpiece Group Ltd</span>. All rights reserved.</p>
             <p>
                 <a href="https://centerpieceltd.com">Our Website</a> • 
                 <a href="https://centerpieceltd.com/">Privacy Policy</a> • 
@@ -147,4 +146,10 @@ def custom_email(name, heading, msg):
     </div>
 </body>
 </html>
-"""
\ No newline at end of file
+"""
+
+templates.register("email_shell", EMAIL_SHELL, raw=("msg",))
+
+
+def custom_email(name, heading, msg):
+    return templates.render("email_shell", name=name, heading=heading, msg=msg, year=datetime.now().year)
@@ -0,0 +1,42 @@
+from emailsTemps.template_engine import templates
+
+# Body of the OTP email, rendered inside the shared shell from custom_email_send
+OTP_BODY = """
+    <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+        <h2 style="color: #2c3e50; text-align: center;">Centerpiece Dashboard Security Code</h2>
+        
+        <div style="background: #f8f9fa; padding: 20px; border-radius: 10px; text-align: center; margin: 20px 0;">
+            <h1 style="color: #e74c3c; font-size: 32px; letter-spacing: 3px; margin: 0;">
+                {{ otp }}
+            </h1>
+        </div>
+        
+        <p style="color: #7f8c8d; line-height: 1.6;">
+            This is your verification code for <strong>{{ purpose }}</strong> on Centerpiece Dashboard.
+        </p>
+        
+        <div style="background: #fff3cd; padding: 15px; border-radius: 5px; border-left: 4px solid #ffc107;">
+            <p style="color: #856404; margin: 0;">
+                ⚠️ <strong>Security Notice:</strong> Never share this code with anyone. 
+                Our team will never ask for your verification code.
+            </p>
+        </div>
+        
+        <p style="color: #7f8c8d; font-size: 14px; margin-top: 20px;">
+            This code will expire in 10 minutes. If you didn't request this code, 
+            please ignore this email or contact our support team immediately.
+        </p>
+        
+        <div style="border-top: 2px solid #ecf0f1; margin-top: 30px; padding-top: 20px; text-align: center;">
+            <p style="color: #95a5a6; font-size: 12px;">
+                Centerpiece Group Ltd · Financial Management System
+            </p>
+        </div>
+    </div>
+"""
+
+templates.register("otp_code", OTP_BODY)
+
+
+def otp_email_body(otp, purpose):
+    return templates.render("otp_code", otp=otp, purpose=purpose)
@@ -0,0 +1,191 @@
+"""
+Email templates compiled once at startup.
+
+Templates use {{ name }} slots. Compiling a template inlines its <style> rules into
+style attributes (mail clients drop most <style> blocks), drops remote stylesheets,
+and splits the markup into pre-encoded static chunks so a render only joins the
+chunks with the escaped slot values.
+"""
+import html
+import re
+from html.parser import HTMLParser
+
+SLOT_RE = re.compile(r"\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}")
+STYLE_RE = re.compile(r"<style[^>]*>(.*?)</style>", re.S | re.I)
+REMOTE_LINK_RE = re.compile(r"<link[^>]+rel=[\"']stylesheet[\"'][^>]*>\s*", re.I)
+RULE_RE = re.compile(r"([^{}]+)\{([^{}]*)\}")
+SIMPLE_SELECTOR_RE = re.compile(r"^([a-z][a-z0-9]*)?(?:\.([A-Za-z0-9_-]+))?$")
+
+
+def _parse_simple(selector: str):
+    match = SIMPLE_SELECTOR_RE.match(selector)
+    if not match or not any(match.groups()):
+        return None
+    return match.group(1), match.group(2)
+
+
+def _parse_css(css: str):
+    """Split CSS into inlinable rules and the leftovers that must stay in a <style> block."""
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    # Remote @import (web fonts) is dropped: it costs a fetch per open and most clients block it
+    css = re.sub(r"@import[^;]+;", "", css)
+    rules, leftover = [], []
+    for order, (selectors, body) in enumerate(RULE_RE.findall(css)):
+        declarations = [d.strip() for d in body.split(";") if d.strip()]
+        for selector in selectors.split(","):
+            selector = selector.strip()
+            parts = [_parse_simple(p) for p in selector.split()]
+            if not parts or None in parts:
+                # Pseudo-classes, media queries etc. can't be inlined
+                leftover.append(f"{selector} {{ {'; '.join(declarations)}; }}")
+                continue
+            specificity = sum((10 if cls else 0) + (1 if tag else 0) for tag, cls in parts)
+            rules.append((specificity, order, parts, declarations))
+            if len(parts) > 1:
+                # Also kept as a rule so it still reaches markup inserted through raw slots
+                leftover.append(f"{selector} {{ {'; '.join(declarations)}; }}")
+    rules.sort(key=lambda r: (r[0], r[1]))
+    return rules, leftover
+
+
+def _matches(element, parts, ancestors):
+    def simple(el, part):
+        tag, cls = part
+        return (tag is None or el[0] == tag) and (cls is None or cls in el[1])
+
+    if not simple(element, parts[-1]):
+        return False
+    remaining = list(parts[:-1])
+    for ancestor in reversed(ancestors):
+        if not remaining:
+            break
+        if simple(ancestor, remaining[-1]):
+            remaining.pop()
+    return not remaining
+
+
+def _attr(value: str) -> str:
+    return html.escape(value, quote=False).replace('"', "&quot;")
+
+
+class _Inliner(HTMLParser):
+    VOID = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+    def __init__(self, rules):
+        super().__init__(convert_charrefs=False)
+        self.rules = rules
+        self.out = []
+        self.stack = []
+
+    def handle_starttag(self, tag, attrs, self_closing=False):
+        element = (tag, set(dict(attrs).get("class", "").split()))
+        declarations = []
+        for _, _, parts, decls in self.rules:
+            if _matches(element, parts, self.stack):
+                declarations.extend(decls)
+        if not declarations:
+            self.out.append(self.get_starttag_text())
+        else:
+            existing = dict(attrs).get("style")
+            if existing:
+                declarations.append(existing.strip().rstrip(";"))
+            rendered = []
+            for name, value in attrs:
+                if name == "style":
+                    continue
+                rendered.append(name if value is None else f'{name}="{_attr(value)}"')
+            rendered.append(f'style="{_attr("; ".join(declarations))}"')
+            self.out.append(f"<{tag} {' '.join(rendered)}{' /' if self_closing else ''}>")
+        if tag not in self.VOID and not self_closing:
+            self.stack.append(element)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, self_closing=True)
+
+    def handle_endtag(self, tag):
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                del self.stack[i:]
+                break
+        self.out.append(f"</{tag}>")
+
+    def handle_data(self, data):
+        self.out.append(data)
+
+    def handle_entityref(self, name):
+        self.out.append(f"&{name};")
+
+    def handle_charref(self, name):
+        self.out.append(f"&#{name};")
+
+    def handle_comment(self, data):
+        self.out.append(f"<!--{data}-->")
+
+    def handle_decl(self, decl):
+        self.out.append(f"<!{decl}>")
+
+
+def inline_css(source: str) -> str:
+    css = "\n".join(STYLE_RE.findall(source))
+    rules, leftover = _parse_css(css)
+    source = REMOTE_LINK_RE.sub("", source)
+    residual = f"<style>\n{chr(10).join(leftover)}\n</style>" if leftover else ""
+    source = STYLE_RE.sub("", source)
+    if residual:
+        source = re.sub(r"</head>", residual + "\n</head>", source, count=1, flags=re.I)
+    inliner = _Inliner(rules)
+    inliner.feed(source)
+    inliner.close()
+    return "".join(inliner.out)
+
+
+class CompiledTemplate:
+    def __init__(self, name: str, source: str, raw=(), inline: bool = True):
+        self.name = name
+        self.raw = set(raw)  # slots inserted as trusted HTML instead of escaped text
+        compiled = inline_css(source) if inline else source
+        pieces = SLOT_RE.split(compiled)
+        # Pieces alternate static, slot, static, ...; static bytes are encoded once
+        self.text_chunks = pieces[0::2]
+        self.chunks = [p.encode("utf-8") for p in self.text_chunks]
+        self.slots = pieces[1::2]
+        self.static_size = sum(len(c) for c in self.chunks)
+
+    def _values(self, values):
+        for slot in self.slots:
+            value = values.get(slot, "")
+            value = "" if value is None else str(value)
+            yield value if slot in self.raw else html.escape(value)
+
+    def render_bytes(self, **values) -> bytes:
+        out = [self.chunks[0]]
+        for chunk, value in zip(self.chunks[1:], self._values(values)):
+            out.append(value.encode("utf-8"))
+            out.append(chunk)
+        return b"".join(out)
+
+    def render(self, **values) -> str:
+        out = [self.text_chunks[0]]
+        for chunk, value in zip(self.text_chunks[1:], self._values(values)):
+            out.append(value)
+            out.append(chunk)
+        return "".join(out)
+
+
+class TemplateRegistry:
+    def __init__(self):
+        self._templates = {}
+
+    def register(self, name: str, source: str, raw=(), inline: bool = True) -> CompiledTemplate:
+        template = CompiledTemplate(name, source, raw=raw, inline=inline)
+        self._templates[name] = template
+        return template
+
+    def get(self, name: str) -> CompiledTemplate:
+        return self._templates[name]
+
+    def render(self, template_name: str, /, **values) -> str:
+        return self._templates[template_name].render(**values)
+
+
+templates = TemplateRegistry()
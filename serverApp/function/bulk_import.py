@@ -0,0 +1,197 @@
+"""
+Bulk user import used by POST /users/bulk.
+
+Rows are parsed from the request stream as they arrive (CSV with a header line, or
+NDJSON) and handled in batches: one query checks the whole batch's emails and phones,
+passwords are hashed across the hasher pool, and the batch goes in as one multi-row
+INSERT ... RETURNING. Every input row gets an entry in the report. An upload longer
+than BULK_IMPORT_MAX_ROWS is cut off there: the rows before it are imported, the
+rest is not read, and the report's truncated_at says where it stopped.
+"""
+import codecs
+import csv
+import json
+import os
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import insert, or_, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from dotenv import load_dotenv
+from models.userModels import Users
+from schemas.schemas import CreateTeamLeadRequest
+from function.hashing import password_hasher
+
+load_dotenv()
+
+BULK_IMPORT_BATCH = int(os.getenv("BULK_IMPORT_BATCH", 500))
+BULK_IMPORT_MAX_ROWS = int(os.getenv("BULK_IMPORT_MAX_ROWS", 10000))
+# The types the single-user creation endpoints hand out
+BULK_USER_TYPES = ("team_lead", "sales", "super_sales", "desange")
+
+
+async def _lines(stream):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    pending = ""
+    async for chunk in stream:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def parse_rows(stream, fmt: str):
+    """Yield (row_number, dict) or (row_number, error message) per data row."""
+    number = 0
+    header = None
+    async for line in _lines(stream):
+        if not line.strip():
+            continue
+        if fmt == "ndjson":
+            number += 1
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield number, f"Invalid JSON: {e}"
+                continue
+            yield number, row if isinstance(row, dict) else "Expected a JSON object"
+        else:
+            # One record per line; quoted fields can't span lines
+            values = next(csv.reader([line]))
+            if header is None:
+                header = [name.strip() for name in values]
+                continue
+            number += 1
+            if len(values) != len(header):
+                yield number, f"Expected {len(header)} columns, got {len(values)}"
+                continue
+            yield number, dict(zip(header, values))
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in error.errors())
+
+
+class BulkUserImport:
+    def __init__(self, db: AsyncSession, default_type: str):
+        self.db = db
+        self.default_type = default_type
+        self.report = []
+        self.created = 0
+        self._emails = set()
+        self._phones = set()
+
+    def _fail(self, number, email, error):
+        self.report.append({"row": number, "status": "error", "email": email, "error": error})
+
+    async def run(self, rows) -> dict:
+        batch = []
+        truncated_at = None
+        async for number, row in rows:
+            # Earlier batches are already committed, so the import stops here rather than failing
+            # as a whole; the rest of the upload is not read
+            if number > BULK_IMPORT_MAX_ROWS:
+                truncated_at = BULK_IMPORT_MAX_ROWS
+                break
+            batch.append((number, row))
+            if len(batch) >= BULK_IMPORT_BATCH:
+                await self._import(batch)
+                batch = []
+        if batch:
+            await self._import(batch)
+        self.report.sort(key=lambda entry: entry["row"])
+        return {
+            "created": self.created,
+            "failed": len(self.report) - self.created,
+            "truncated_at": truncated_at,
+            "rows": self.report,
+        }
+
+    def _validate(self, batch):
+        valid = []
+        for number, row in batch:
+            if isinstance(row, str):
+                self._fail(number, None, row)
+                continue
+            row = {k: (v.strip() if isinstance(v, str) else v) for k, v in row.items()}
+            user_type = row.pop("userType", None) or self.default_type
+            if user_type not in BULK_USER_TYPES:
+                self._fail(number, row.get("email"), f"Invalid user type. Must be one of: {list(BULK_USER_TYPES)}")
+                continue
+            try:
+                data = CreateTeamLeadRequest(**row)
+            except ValidationError as e:
+                self._fail(number, row.get("email"), _validation_message(e))
+                continue
+            phone = data.phone or None
+            if data.email in self._emails:
+                self._fail(number, data.email, "Email appears earlier in this import")
+                continue
+            if phone and phone in self._phones:
+                self._fail(number, data.email, "phone appears earlier in this import")
+                continue
+            self._emails.add(data.email)
+            if phone:
+                self._phones.add(phone)
+            valid.append((number, data, phone, user_type))
+        return valid
+
+    async def _import(self, batch):
+        valid = self._validate(batch)
+        if not valid:
+            return
+        pending = valid  # rows that fail with the batch if it can't be saved
+        try:
+            # One set-based lookup for the whole batch instead of two queries per user
+            emails = [data.email for _, data, _, _ in valid]
+            phones = [phone for _, _, phone, _ in valid if phone]
+            condition = Users.email.in_(emails)
+            if phones:
+                condition = or_(condition, Users.phone.in_(phones))
+            existing = (await self.db.execute(select(Users.email, Users.phone).where(condition))).all()
+            taken_emails = {email for email, _ in existing}
+            taken_phones = {phone for _, phone in existing if phone}
+
+            accepted = []
+            for number, data, phone, user_type in valid:
+                if data.email in taken_emails:
+                    self._fail(number, data.email, "Email already registered")
+                elif phone and phone in taken_phones:
+                    self._fail(number, data.email, "phone already registered")
+                else:
+                    accepted.append((number, data, phone, user_type))
+            pending = accepted
+            if not accepted:
+                return
+
+            hashes = await password_hasher.hash_many(data.password for _, data, _, _ in accepted)
+            values = [
+                {
+                    "first_name": data.first_name,
+                    "last_name": data.last_name,
+                    "email": data.email,
+                    "phone": phone,
+                    "userType": user_type,
+                    "password": hashed,
+                }
+                for (_, data, phone, user_type), hashed in zip(accepted, hashes)
+            ]
+            # Sent as multi-row INSERT ... RETURNING; ids come back in parameter order
+            stmt = insert(Users).returning(Users.id, sort_by_parameter_order=True)
+            ids = (await self.db.execute(stmt, values)).scalars().all()
+            await self.db.commit()
+        except (HTTPException, SQLAlchemyError) as e:
+            # A busy hasher (503) or a conflicting concurrent insert loses this batch only:
+            # earlier batches stay committed and the report says which rows exist
+            await self.db.rollback()
+            error = e.detail if isinstance(e, HTTPException) else f"Batch could not be saved ({type(e).__name__})"
+            for number, data, _, _ in pending:
+                self._fail(number, data.email, f"{error}; this row was not imported")
+            return
+
+        for (number, data, _, _), user_id in zip(accepted, ids):
+            self.report.append({"row": number, "status": "created", "email": data.email, "id": user_id})
+        self.created += len(accepted)
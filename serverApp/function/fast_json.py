@@ -0,0 +1,59 @@
+"""
+Fast JSON responses for endpoints that return many rows.
+
+Returning FastJSONResponse from an endpoint skips FastAPI's response_model pass
+(validate, convert to JSON-able Python, then json.dumps) and encodes the rows once
+with orjson. response_model is still declared on the route for the OpenAPI schema.
+Set FAST_JSON_VALIDATE=true to validate payloads against it anyway (cached
+TypeAdapters), e.g. while developing.
+"""
+import json
+import os
+from functools import lru_cache
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+from dotenv import load_dotenv
+from function import timing
+
+try:
+    import orjson
+except ImportError:  # optional; falls back to the stdlib encoder
+    orjson = None
+
+load_dotenv()
+
+FAST_JSON_VALIDATE = os.getenv("FAST_JSON_VALIDATE", "false").lower() in ("1", "true", "yes")
+
+
+@lru_cache(maxsize=None)
+def type_adapter(tp) -> TypeAdapter:
+    # Building an adapter compiles a validator; do it once per type
+    return TypeAdapter(tp)
+
+
+def dumps(content) -> bytes:
+    with timing.timed("serialize"):
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def fast_json_response(content, model=None, validate: bool = FAST_JSON_VALIDATE) -> Response:
+    """Encode trusted rows (plain dicts/lists from the database) directly.
+
+    With validate, the content goes through the cached TypeAdapter for model first
+    and pydantic writes the JSON itself.
+    """
+    if validate and model is not None:
+        adapter = type_adapter(model)
+        with timing.timed("serialize"):
+            body = adapter.dump_json(adapter.validate_python(content))
+        return Response(body, media_type="application/json")
+    return FastJSONResponse(content)
@@ -2,11 +2,12 @@ import uuid
 import requests
 import os
 from dotenv import load_dotenv
+from function.metrics import external_call
 
 load_dotenv()
 
 MOMO_SUBSCRIPTION_KEY = os.getenv("MOMO_SUBSCRIPTION_KEY")
-MOMO_BASE_URL = "https://sandbox.momodeveloper.mtn.com"
+MOMO_BASE_URL = os.getenv("MOMO_BASE_URL", "https://sandbox.momodeveloper.mtn.com")
 
 
 def create_api_user(callback_host: str = "https://example.com") -> str:
@@ -24,8 +25,9 @@ def create_api_user(callback_host: str = "https://example.com") -> str:
         "providerCallbackHost": callback_host
     }
 
-    response = requests.post(url, json=payload, headers=headers)
-    response.raise_for_status()
+    with external_call("momo", "create_api_user"):
+        response = requests.post(url, json=payload, headers=headers)
+        response.raise_for_status()
 
     return user_id
 
@@ -39,8 +41,9 @@ def generate_api_key(user_id: str) -> str:
         "Ocp-Apim-Subscription-Key": MOMO_SUBSCRIPTION_KEY,
     }
 
-    response = requests.post(url, headers=headers)
-    response.raise_for_status()
+    with external_call("momo", "generate_api_key"):
+        response = requests.post(url, headers=headers)
+        response.raise_for_status()
     return response.json()["apiKey"]
 
 
@@ -0,0 +1,96 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi import HTTPException
+from starlette import status
+from passlib.context import CryptContext
+from dotenv import load_dotenv
+from function import timing
+
+load_dotenv()
+
+# "thread" works everywhere (bcrypt releases the GIL); "process" spreads hashing across cores
+PASSWORD_HASH_POOL = os.getenv("PASSWORD_HASH_POOL", "thread")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 2))
+# Max hash/verify jobs queued or running before new ones are rejected with 503
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 64))
+
+bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+# Module-level so they can be pickled into a process pool
+def _hash(password: str) -> str:
+    return bcrypt_context.hash(password)
+
+
+def _verify(password: str, hashed: str) -> bool:
+    return bcrypt_context.verify(password, hashed)
+
+
+def _hash_many(passwords):
+    return [bcrypt_context.hash(p) for p in passwords]
+
+
+class PasswordHasher:
+    """Runs bcrypt off the event loop on a bounded worker pool."""
+
+    def __init__(self, pool: str = PASSWORD_HASH_POOL, workers: int = PASSWORD_HASH_WORKERS,
+                 max_queue: int = PASSWORD_HASH_MAX_QUEUE):
+        self.pool = pool
+        self.workers = workers
+        self.max_queue = max_queue
+        self.pending = 0
+        self._executor = None
+
+    @property
+    def executor(self):
+        # Created lazily so importing this module never forks processes
+        if self._executor is None:
+            if self.pool == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, func, *args):
+        if self.pending >= self.max_queue:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please try again shortly",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            with timing.timed("hash"):
+                return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def hash_many(self, passwords, chunk_size: int = 8) -> list:
+        """Hash a batch in small chunks, at most one per worker but one at a time,
+        so logins queued meanwhile wait for one chunk rather than the whole batch."""
+        passwords = list(passwords)
+        chunks = [passwords[i:i + chunk_size] for i in range(0, len(passwords), chunk_size)]
+        parallel = max(1, self.workers - 1)
+        hashes = []
+        for i in range(0, len(chunks), parallel):
+            wave = await asyncio.gather(*(self._run(_hash_many, chunk) for chunk in chunks[i:i + parallel]))
+            for chunk in wave:
+                hashes.extend(chunk)
+        return hashes
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        if not hashed:
+            return False
+        return await self._run(_verify, password, hashed)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher()
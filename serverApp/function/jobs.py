@@ -0,0 +1,83 @@
+"""
+Built-in maintenance jobs, registered on function.scheduler.scheduler.
+
+    python -m function.jobs               # list jobs
+    python -m function.jobs run <name>    # run one now, if its lease is free
+"""
+import os
+import sys
+from datetime import datetime, timedelta
+from sqlalchemy import delete, select, text
+from dotenv import load_dotenv
+from db.database import engine
+from db.event_counters import rebuild_event_counters
+from models.userModels import OTP
+from models.emailModels import EmailOutbox
+from models.jobModels import JobRun
+from function.otp_store import OTP_TTL
+from function.scheduler import scheduler
+
+load_dotenv()
+
+OTP_PURGE_MINUTES = int(os.getenv("OTP_PURGE_MINUTES", 10))
+OTP_PURGE_BATCH = int(os.getenv("OTP_PURGE_BATCH", 5000))
+EVENT_COUNTERS_REFRESH_HOURS = int(os.getenv("EVENT_COUNTERS_REFRESH_HOURS", 24))
+CLEANUP_HOURS = int(os.getenv("CLEANUP_HOURS", 24))
+OUTBOX_RETENTION_DAYS = int(os.getenv("OUTBOX_RETENTION_DAYS", 14))
+JOB_RUN_RETENTION_DAYS = int(os.getenv("JOB_RUN_RETENTION_DAYS", 30))
+
+
+def _delete_in_batches(model, condition, batch_size: int) -> int:
+    """Delete matching rows a batch at a time so no single transaction holds many locks."""
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            ids = select(model.id).where(condition).limit(batch_size).scalar_subquery()
+            deleted = conn.execute(delete(model).where(model.id.in_(ids))).rowcount
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+@scheduler.job("purge_expired_otps", minutes=OTP_PURGE_MINUTES)
+def purge_expired_otps():
+    # Only sent_otps needs this; the kv OTP store expires codes itself
+    cutoff = datetime.utcnow() - timedelta(seconds=OTP_TTL)
+    return _delete_in_batches(OTP, OTP.date < cutoff, OTP_PURGE_BATCH)
+
+
+@scheduler.job("refresh_event_counters", hours=EVENT_COUNTERS_REFRESH_HOURS)
+def refresh_event_counters():
+    # The after_flush hook keeps counters current; this repairs drift from raw SQL writes
+    return rebuild_event_counters()
+
+
+@scheduler.job("cleanup", hours=CLEANUP_HOURS)
+def cleanup():
+    now = datetime.utcnow()
+    rows = _delete_in_batches(
+        EmailOutbox,
+        (EmailOutbox.status == "sent") & (EmailOutbox.sent_at < now - timedelta(days=OUTBOX_RETENTION_DAYS)),
+        OTP_PURGE_BATCH,
+    )
+    rows += _delete_in_batches(
+        JobRun, JobRun.started_at < now - timedelta(days=JOB_RUN_RETENTION_DAYS), OTP_PURGE_BATCH
+    )
+    # Reclaim space and refresh planner statistics for the tables that churn most
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("VACUUM (ANALYZE) sent_otps, email_outbox, job_runs, user_event_counts"))
+        elif conn.dialect.name == "sqlite":
+            conn.execute(text("PRAGMA optimize"))
+    return rows
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "run" and sys.argv[2] in scheduler.jobs:
+        result = scheduler.run(sys.argv[2])
+        print(result if result is not None else "Not run: the job is running elsewhere or ran within its interval")
+    else:
+        for name, job in scheduler.jobs.items():
+            print(f"{name}: every {job.trigger_args}")
+        if sys.argv[1:]:
+            sys.exit(2)
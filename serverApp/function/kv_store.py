@@ -0,0 +1,328 @@
+"""
+Small key/value stores with per-key TTL, shared by the idempotency layer and other
+in-memory state.
+
+    ShardedTTLStore  in-process, lock-striped dicts (per worker)
+    RedisTTLStore    speaks the Redis protocol (RESP) to Redis or to the local stand-in below
+
+Run a local stand-in that any RedisTTLStore can talk to:
+
+    python -m function.kv_store --port 6380
+    python -m function.kv_store --unix /tmp/centerpiece-state.sock
+"""
+import argparse
+import asyncio
+import os
+import threading
+import time
+import zlib
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Default backend for every store that doesn't set its own URL: memory://, redis://host:port/db, unix:///path
+STATE_STORE_URL = os.getenv("STATE_STORE_URL", "memory://")
+
+
+class KVStoreError(Exception):
+    pass
+
+
+class ShardedTTLStore:
+    """In-process store; keys are spread over shards so unrelated keys don't share a lock."""
+
+    def __init__(self, shards: int = 16, sweep_every: int = 1024):
+        self._shards = [({}, threading.Lock()) for _ in range(shards)]
+        self._sweep_every = sweep_every
+        self._writes = [0] * shards
+
+    def _shard(self, key: str):
+        index = zlib.crc32(key.encode()) % len(self._shards)
+        return index, self._shards[index]
+
+    @staticmethod
+    def _live(entry, now):
+        return entry is not None and (entry[1] is None or entry[1] > now)
+
+    def _sweep(self, data, now):
+        for key in [k for k, (_, expires_at) in data.items() if expires_at is not None and expires_at <= now]:
+            del data[key]
+
+    def get_sync(self, key: str):
+        _, (data, lock) = self._shard(key)
+        now = time.monotonic()
+        with lock:
+            entry = data.get(key)
+            if not self._live(entry, now):
+                data.pop(key, None)
+                return None
+            return entry[0]
+
+    def set_sync(self, key: str, value: bytes, ttl: float = None, nx: bool = False) -> bool:
+        index, (data, lock) = self._shard(key)
+        now = time.monotonic()
+        with lock:
+            if nx and self._live(data.get(key), now):
+                return False
+            data[key] = (value, now + ttl if ttl else None)
+            self._writes[index] += 1
+            if self._writes[index] % self._sweep_every == 0:
+                self._sweep(data, now)
+            return True
+
+    def incr_sync(self, key: str, amount: int = 1, ttl: float = None) -> int:
+        """Add to an integer counter; ttl only applies when this call creates it."""
+        index, (data, lock) = self._shard(key)
+        now = time.monotonic()
+        with lock:
+            entry = data.get(key)
+            if self._live(entry, now):
+                value, expires_at = int(entry[0]) + amount, entry[1]
+            else:
+                value, expires_at = amount, now + ttl if ttl else None
+                self._writes[index] += 1
+                if self._writes[index] % self._sweep_every == 0:
+                    self._sweep(data, now)
+            data[key] = (str(value).encode(), expires_at)
+            return value
+
+    def expire_sync(self, key: str, ttl: float) -> bool:
+        _, (data, lock) = self._shard(key)
+        now = time.monotonic()
+        with lock:
+            entry = data.get(key)
+            if not self._live(entry, now):
+                return False
+            data[key] = (entry[0], now + ttl)
+            return True
+
+    def delete_sync(self, *keys: str) -> int:
+        removed = 0
+        for key in keys:
+            _, (data, lock) = self._shard(key)
+            with lock:
+                removed += data.pop(key, None) is not None
+        return removed
+
+    async def get(self, key: str):
+        return self.get_sync(key)
+
+    async def set(self, key: str, value: bytes, ttl: float = None, nx: bool = False) -> bool:
+        return self.set_sync(key, value, ttl, nx)
+
+    async def incr(self, key: str, amount: int = 1, ttl: float = None) -> int:
+        return self.incr_sync(key, amount, ttl)
+
+    async def delete(self, *keys: str) -> int:
+        return self.delete_sync(*keys)
+
+    async def close(self):
+        pass
+
+
+def _encode_command(*args) -> bytes:
+    out = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode()
+        out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(out)
+
+
+async def _read_reply(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionResetError("Connection closed by peer")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload.decode()
+    if kind == b"-":
+        raise KVStoreError(payload.decode())
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        length = int(payload)
+        if length < 0:
+            return None
+        return [await _read_reply(reader) for _ in range(length)]
+    raise KVStoreError(f"Unexpected reply {line!r}")
+
+
+class RedisTTLStore:
+    """Minimal asyncio RESP client; enough for GET/SET/DEL with expiry and INCRBY counters."""
+
+    def __init__(self, url: str, pool_size: int = 8, timeout: float = 2.0):
+        parsed = urlparse(url)
+        self.url = url
+        self.unix_path = parsed.path if parsed.scheme == "unix" else None
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0) if parsed.scheme != "unix" else 0
+        self.timeout = timeout
+        self._pool_size = pool_size
+        self._idle = []
+        self._available = None
+
+    async def _connect(self):
+        if self.unix_path:
+            reader, writer = await asyncio.open_unix_connection(self.unix_path)
+        else:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            writer.write(_encode_command("AUTH", self.password))
+            await _read_reply(reader)
+        if self.db:
+            writer.write(_encode_command("SELECT", self.db))
+            await _read_reply(reader)
+        return reader, writer
+
+    async def execute(self, *args):
+        if self._available is None:
+            self._available = asyncio.Semaphore(self._pool_size)
+        async with self._available:
+            conn = self._idle.pop() if self._idle else None
+            try:
+                if conn is None:
+                    conn = await asyncio.wait_for(self._connect(), self.timeout)
+                reader, writer = conn
+                writer.write(_encode_command(*args))
+                reply = await asyncio.wait_for(_read_reply(reader), self.timeout)
+            except KVStoreError:
+                # Error reply; the connection itself is still usable
+                if conn is not None:
+                    self._idle.append(conn)
+                raise
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                if conn is not None:
+                    conn[1].close()
+                raise KVStoreError(f"State store unavailable: {e}") from e
+            self._idle.append(conn)
+            return reply
+
+    async def get(self, key: str):
+        return await self.execute("GET", key)
+
+    async def set(self, key: str, value: bytes, ttl: float = None, nx: bool = False) -> bool:
+        args = ["SET", key, value]
+        if ttl:
+            args += ["PX", max(int(ttl * 1000), 1)]
+        if nx:
+            args.append("NX")
+        return await self.execute(*args) == "OK"
+
+    async def incr(self, key: str, amount: int = 1, ttl: float = None) -> int:
+        value = await self.execute("INCRBY", key, amount)
+        # Not atomic with the INCRBY: callers put a time window in the key, so a
+        # counter that missed its expiry is never reused, only left for cleanup
+        if ttl and value == amount:
+            await self.execute("PEXPIRE", key, max(int(ttl * 1000), 1))
+        return value
+
+    async def delete(self, *keys: str) -> int:
+        return await self.execute("DEL", *keys)
+
+    async def close(self):
+        while self._idle:
+            self._idle.pop()[1].close()
+
+
+def create_store(url: str = None):
+    url = url or STATE_STORE_URL
+    if url.startswith("memory://"):
+        return ShardedTTLStore()
+    if url.startswith(("redis://", "unix://")):
+        return RedisTTLStore(url)
+    raise ValueError(f"Unsupported state store URL: {url}")
+
+
+class StandInServer:
+    """Serves a ShardedTTLStore over the Redis protocol (the subset RedisTTLStore uses)."""
+
+    def __init__(self, store: ShardedTTLStore = None):
+        self.store = store or ShardedTTLStore()
+
+    def handle(self, args):
+        command = args[0].decode().upper()
+        store = self.store
+        if command == "PING":
+            return "+PONG"
+        if command in ("SELECT", "AUTH"):
+            return "+OK"
+        if command == "GET":
+            return store.get_sync(args[1].decode())
+        if command == "SET":
+            key, value, ttl, nx = args[1].decode(), args[2], None, False
+            options = [a.decode().upper() for a in args[3:]]
+            i = 0
+            while i < len(options):
+                if options[i] == "PX":
+                    ttl = int(options[i + 1]) / 1000
+                    i += 1
+                elif options[i] == "EX":
+                    ttl = int(options[i + 1])
+                    i += 1
+                elif options[i] == "NX":
+                    nx = True
+                i += 1
+            return "+OK" if store.set_sync(key, value, ttl, nx) else None
+        if command in ("INCR", "INCRBY"):
+            amount = int(args[2]) if command == "INCRBY" else 1
+            return store.incr_sync(args[1].decode(), amount)
+        if command == "PEXPIRE":
+            return store.expire_sync(args[1].decode(), int(args[2]) / 1000)
+        if command == "DEL":
+            return store.delete_sync(*(a.decode() for a in args[1:]))
+        return KVStoreError(f"ERR unknown command '{command}'")
+
+    @staticmethod
+    def encode(reply) -> bytes:
+        if reply is None:
+            return b"$-1\r\n"
+        if isinstance(reply, KVStoreError):
+            return b"-%s\r\n" % str(reply).encode()
+        if isinstance(reply, str):
+            return reply.encode() + b"\r\n"
+        if isinstance(reply, bool) or isinstance(reply, int):
+            return b":%d\r\n" % int(reply)
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+
+    async def _client(self, reader, writer):
+        try:
+            while True:
+                args = await _read_reply(reader)
+                writer.write(self.encode(self.handle(args)))
+                await writer.drain()
+        except (KVStoreError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 6380, unix_path: str = None):
+        if unix_path:
+            if os.path.exists(unix_path):
+                os.unlink(unix_path)
+            return await asyncio.start_unix_server(self._client, path=unix_path)
+        return await asyncio.start_server(self._client, host, port)
+
+
+async def _serve(args):
+    server = await StandInServer().start(args.host, args.port, args.unix)
+    print(f"State store listening on {args.unix or f'{args.host}:{args.port}'}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Redis-protocol stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6380)
+    parser.add_argument("--unix", default=None)
+    asyncio.run(_serve(parser.parse_args()))
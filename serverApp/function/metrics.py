@@ -0,0 +1,334 @@
+"""
+In-process metrics rendered in the Prometheus text format by GET /metrics.
+
+With a single process (uvicorn main:app) the values are that process's. With
+METRICS_MULTIPROC_DIR (serve.py sets it) every worker writes a snapshot of its values
+there every METRICS_FLUSH_INTERVAL seconds, and whichever worker answers a scrape adds
+the others' snapshots to its own: counters and histograms are summed over every worker
+the launcher has run (so totals never go backwards when one is replaced), gauges over
+the live ones. Another worker's share is up to METRICS_FLUSH_INTERVAL seconds old.
+"""
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from db.pool_stats import pool_stats, WAIT_BUCKETS_MS
+from function import timing
+
+load_dotenv()
+
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 5))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def set(self, *labels, value: float):
+        # For values mirrored from counters kept elsewhere (see the pool collector)
+        with self._lock:
+            self._values[labels] = value
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield self.name, _labels(self.label_names, labels), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            entry[-2] += value
+            entry[-1] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(entry)) for labels, entry in self._values.items()]
+        names = self.label_names + ("le",)
+        for labels, entry in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                yield f"{self.name}_bucket", _labels(names, labels + (_number(bound),)), cumulative
+            yield f"{self.name}_sum", _labels(self.label_names, labels), entry[-2]
+            yield f"{self.name}_count", _labels(self.label_names, labels), entry[-1]
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsRegistry:
+    def __init__(self, multiproc_dir: str = METRICS_MULTIPROC_DIR):
+        self._metrics = []
+        self._collectors = []
+        self.multiproc_dir = multiproc_dir
+        self._exporter = None
+        self._stop_export = threading.Event()
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def collector(self, func):
+        """Register a function called on every scrape, to refresh gauges from live state."""
+        self._collectors.append(func)
+        return func
+
+    def snapshot(self) -> dict:
+        """This process's samples: {metric name: [[sample name, labels, value], ...]}."""
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception as e:
+                print(f"Metrics collector {collect.__name__} failed: {e}")
+        return {metric.name: [list(sample) for sample in metric.samples()] for metric in self._metrics}
+
+    def render(self) -> str:
+        values = self.snapshot()
+        if self.multiproc_dir:
+            values = self._add_other_workers(values)
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in values.get(metric.name, ()):
+                lines.append(f"{name}{labels} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _add_other_workers(self, values: dict) -> dict:
+        kinds = {metric.name: metric.kind for metric in self._metrics}
+        totals = {}  # metric name -> {(sample name, labels): value}, in first-seen order
+
+        def add(metric_name, samples):
+            series = totals.setdefault(metric_name, {})
+            for name, labels, value in samples:
+                series[(name, labels)] = series.get((name, labels), 0) + value
+
+        for metric_name, samples in values.items():
+            add(metric_name, samples)
+        for path in glob.glob(os.path.join(self.multiproc_dir, "*.json")):
+            pid = int(os.path.basename(path)[:-len(".json")])
+            if pid == os.getpid():
+                continue
+            try:
+                with open(path) as f:
+                    other = json.load(f)
+            except (OSError, ValueError):
+                continue
+            alive = _alive(pid)
+            for metric_name, samples in other.items():
+                # A replaced worker's counts stay in the totals; its gauges went with it
+                if metric_name in kinds and (alive or kinds[metric_name] != "gauge"):
+                    add(metric_name, samples)
+        return {
+            metric_name: [(name, labels, value) for (name, labels), value in series.items()]
+            for metric_name, series in totals.items()
+        }
+
+    def export(self):
+        """Write this process's snapshot to multiproc_dir for the other workers to add in."""
+        path = os.path.join(self.multiproc_dir, f"{os.getpid()}.json")
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(f"{path}.tmp", path)
+
+    def start_export(self):
+        """Export every METRICS_FLUSH_INTERVAL seconds from a daemon thread (no-op without multiproc_dir)."""
+        if not self.multiproc_dir or self._exporter is not None:
+            return
+        self._stop_export.clear()
+
+        def run():
+            while not self._stop_export.wait(METRICS_FLUSH_INTERVAL):
+                try:
+                    self.export()
+                except OSError as e:
+                    print(f"Metrics export failed: {e}")
+
+        self._exporter = threading.Thread(target=run, name="metrics-export", daemon=True)
+        self._exporter.start()
+
+    def stop_export(self):
+        if self._exporter is None:
+            return
+        self._stop_export.set()
+        self._exporter.join()
+        self._exporter = None
+        # A final export, so a worker that stops cleanly leaves its complete counts behind
+        try:
+            self.export()
+        except OSError as e:
+            print(f"Metrics export failed: {e}")
+
+
+metrics = MetricsRegistry()
+
+# HTTP, recorded by middleware.metrics
+http_requests = metrics.counter("http_requests_total", "Requests by route template and status", ("method", "route", "status"))
+http_latency = metrics.histogram("http_request_duration_seconds", "Request latency by route template", ("method", "route"))
+http_in_flight = metrics.gauge("http_requests_in_flight", "Requests currently being handled")
+http_db_statements = metrics.histogram(
+    "http_request_db_statements", "SQL statements executed per request", ("method", "route"), COUNT_BUCKETS
+)
+http_db_time = metrics.histogram("http_request_db_seconds", "Time spent in SQL per request", ("method", "route"))
+
+# SQL, recorded by function.timing's cursor events
+db_statements = metrics.counter("db_statements_total", "SQL statements executed", ("operation",))
+db_statement_latency = metrics.histogram("db_statement_duration_seconds", "SQL statement latency", ("operation",))
+
+# External calls
+smtp_sends = metrics.counter("smtp_sends_total", "SMTP messages sent", ("result",))
+smtp_latency = metrics.histogram("smtp_send_duration_seconds", "SMTP send latency")
+external_calls = metrics.counter("external_calls_total", "Calls to external APIs", ("service", "operation", "result"))
+external_latency = metrics.histogram("external_call_duration_seconds", "External API latency", ("service", "operation"))
+
+# Rate limiting, recorded by function.rate_limit
+rate_limit_rejections = metrics.counter("rate_limit_rejections_total", "Requests rejected with 429", ("rule",))
+
+
+@contextmanager
+def external_call(service: str, operation: str):
+    """Count and time a call to an outside service: with external_call("momo", "create_api_user"): ..."""
+    start = time.perf_counter()
+    result = "error"
+    try:
+        yield
+        result = "ok"
+    finally:
+        external_latency.observe(time.perf_counter() - start, service, operation)
+        external_calls.inc(service, operation, result)
+
+
+def observe_statement(statement: str, seconds: float):
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    if operation not in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH"):
+        operation = "OTHER"
+    db_statements.inc(operation)
+    db_statement_latency.observe(seconds, operation)
+
+
+timing.statement_observers.append(observe_statement)
+
+
+# Connection pools, mirrored from db.pool_stats on each scrape
+pool_size = metrics.gauge("db_pool_size", "Configured pool size", ("pool",))
+pool_checked_out = metrics.gauge("db_pool_checked_out", "Connections currently checked out", ("pool",))
+pool_overflow = metrics.gauge("db_pool_overflow", "Overflow connections currently open", ("pool",))
+pool_checkouts = metrics.counter("db_pool_checkouts_total", "Connection checkouts", ("pool",))
+pool_timeouts = metrics.counter("db_pool_timeouts_total", "Checkouts that timed out waiting", ("pool",))
+pool_invalidations = metrics.counter("db_pool_invalidations_total", "Connections invalidated", ("pool",))
+
+
+class _PoolWaitHistogram:
+    kind = "histogram"
+    name = "db_pool_checkout_wait_seconds"
+    help = "Time spent waiting for a pooled connection"
+
+    def samples(self):
+        for pool_name, stats in list(pool_stats.items()):
+            wait = stats.snapshot()["wait_ms"]
+            cumulative = 0
+            for bound, count in zip(WAIT_BUCKETS_MS, wait["buckets"].values()):
+                cumulative += count
+                le = _number(bound if bound == float("inf") else bound / 1000)
+                yield f"{self.name}_bucket", _labels(("pool", "le"), (pool_name, le)), cumulative
+            yield f"{self.name}_sum", _labels(("pool",), (pool_name,)), wait["sum"] / 1000
+            yield f"{self.name}_count", _labels(("pool",), (pool_name,)), wait["count"]
+
+
+metrics.register(_PoolWaitHistogram())
+
+
+@metrics.collector
+def _collect_pools():
+    for name, stats in list(pool_stats.items()):
+        snapshot = stats.snapshot()
+        if "size" in snapshot:
+            pool_size.set(name, value=snapshot["size"])
+            pool_checked_out.set(name, value=snapshot["checked_out"])
+            pool_overflow.set(name, value=snapshot["overflow"])
+        pool_checkouts.set(name, value=snapshot["checkouts"])
+        pool_timeouts.set(name, value=snapshot["timeouts"])
+        pool_invalidations.set(name, value=snapshot["invalidations"])
@@ -0,0 +1,104 @@
+"""
+Where issued OTP codes live between /auth/send-otp/ and /auth/verify-otp.
+
+    OTP_STORE=sql            sent_otps table (default; durable, works across workers)
+    OTP_STORE=kv             the state store at OTP_STORE_URL / STATE_STORE_URL:
+                             memory:// (one process), redis://... or unix://... (shared)
+
+Each account has at most one live code: issuing replaces the previous one, and a
+code expires OTP_TTL seconds after it was issued.
+"""
+import hmac
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from dotenv import load_dotenv
+from models.userModels import OTP
+from function.kv_store import create_store
+
+load_dotenv()
+
+OTP_STORE = os.getenv("OTP_STORE", "sql")
+OTP_STORE_URL = os.getenv("OTP_STORE_URL")  # falls back to STATE_STORE_URL
+OTP_TTL = int(os.getenv("OTP_TTL", 600))
+
+# verify() results
+VALID, NOT_FOUND, EXPIRED = "valid", "not_found", "expired"
+
+
+def _same(a: str, b: str) -> bool:
+    return hmac.compare_digest((a or "").encode(), (b or "").encode())
+
+
+# Query builders shared with db.query_audit
+def delete_otp_query(account_id: int):
+    return delete(OTP).where(OTP.account_id == account_id)
+
+
+def latest_otp_query(account_id: int):
+    return select(OTP).where(OTP.account_id == account_id).order_by(OTP.id.desc()).limit(1)
+
+
+class SQLOTPStore:
+    """Codes in sent_otps. Writes join the caller's transaction; the caller commits."""
+
+    async def issue(self, db: AsyncSession, account_id: int, otp_code: str, verification_code: str, purpose: str):
+        await db.execute(delete_otp_query(account_id))
+        db.add(OTP(account_id=account_id, otp_code=otp_code, verification_code=verification_code, purpose=purpose))
+
+    async def verify(self, db: AsyncSession, account_id: int, otp_code: str, verification_code: str):
+        """Return (VALID | NOT_FOUND | EXPIRED, purpose)."""
+        row = (await db.execute(latest_otp_query(account_id))).scalars().first()
+        if row is None or not (_same(row.otp_code, otp_code) and _same(row.verification_code, verification_code)):
+            return NOT_FOUND, None
+        if datetime.utcnow() - row.date > timedelta(seconds=OTP_TTL):
+            return EXPIRED, row.purpose
+        return VALID, row.purpose
+
+    async def consume(self, db: AsyncSession, account_id: int) -> bool:
+        """Remove the account's code. False if another request already used it."""
+        result = await db.execute(delete_otp_query(account_id))
+        return result.rowcount > 0
+
+
+class KVOTPStore:
+    """Codes in a TTL key/value store: one SET to issue, one GET to verify, one DEL to consume."""
+
+    def __init__(self, store):
+        self.store = store
+
+    @staticmethod
+    def _key(account_id: int) -> str:
+        return f"otp:{account_id}"
+
+    async def issue(self, db, account_id: int, otp_code: str, verification_code: str, purpose: str):
+        record = {"otp": otp_code, "code": verification_code, "purpose": purpose, "issued": time.time()}
+        # A plain SET overwrites, so replacing the previous code is a single atomic step
+        await self.store.set(self._key(account_id), json.dumps(record).encode(), ttl=OTP_TTL)
+
+    async def verify(self, db, account_id: int, otp_code: str, verification_code: str):
+        raw = await self.store.get(self._key(account_id))
+        if raw is None:
+            return NOT_FOUND, None
+        record = json.loads(raw)
+        if not (_same(record["otp"], otp_code) and _same(record["code"], verification_code)):
+            return NOT_FOUND, None
+        return VALID, record["purpose"]
+
+    async def consume(self, db, account_id: int) -> bool:
+        return await self.store.delete(self._key(account_id)) > 0
+
+
+def create_otp_store(kind: str = None):
+    kind = kind or OTP_STORE
+    if kind == "sql":
+        return SQLOTPStore()
+    if kind == "kv":
+        return KVOTPStore(create_store(OTP_STORE_URL))
+    raise ValueError(f"Unsupported OTP_STORE: {kind}")
+
+
+otp_store = create_otp_store()
@@ -0,0 +1,188 @@
+import asyncio
+import hashlib
+import hmac
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from dotenv import load_dotenv
+from db.database import AsyncSessionLocal
+from models.emailModels import EmailOutbox
+from function.send_mail import smtp_pool
+
+load_dotenv()
+
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", 2))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 20))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 5))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 5))
+OUTBOX_RETRY_BASE = int(os.getenv("OUTBOX_RETRY_BASE", 30))  # seconds, doubled after each failed attempt
+OUTBOX_LEASE = int(os.getenv("OUTBOX_LEASE", 120))  # a claimed batch is retried if not settled within this
+SECRET_KEY = os.getenv("SECRET_KEY")
+
+
+def enqueue_email(db: AsyncSession, to_email: str, subject: str, body: str) -> EmailOutbox:
+    """Add a message to the outbox; it is durable once the caller commits."""
+    message = EmailOutbox(
+        to_email=to_email,
+        subject=subject,
+        body=body,
+        status="pending",
+        attempts=0,
+        next_attempt_at=datetime.utcnow(),
+    )
+    db.add(message)
+    return message
+
+
+def _deliver(batch):
+    """Send a batch over one pooled SMTP session. Runs in a worker thread."""
+    results = []
+    server = None
+    for message_id, to_email, subject, body in batch:
+        try:
+            if server is None:
+                server = smtp_pool.acquire()
+            smtp_pool.send(server, to_email, subject, body)
+            results.append((message_id, None))
+        except Exception as e:
+            # Start the next message on a fresh session in case this one is broken
+            if server is not None:
+                smtp_pool.release(server, broken=True)
+                server = None
+            results.append((message_id, str(e) or type(e).__name__))
+    if server is not None:
+        smtp_pool.release(server)
+    return results
+
+
+def claim_query(now: datetime, limit: int = OUTBOX_BATCH_SIZE):
+    # "sending" rows whose lease ran out belong to a worker that died mid-batch
+    return (
+        select(EmailOutbox)
+        .where(EmailOutbox.status.in_(("pending", "sending")), EmailOutbox.next_attempt_at <= now)
+        .order_by(EmailOutbox.id)
+        .limit(limit)
+    )
+
+
+class OutboxWorker:
+    """Background tasks that drain email_outbox in batches."""
+
+    def __init__(self, workers: int = OUTBOX_WORKERS):
+        self.workers = workers
+        self._tasks = []
+        self._wake = None
+        self._claim_lock = None
+
+    def wake(self):
+        # Called after an enqueue commits so the message goes out without waiting for the next poll
+        if self._wake is not None:
+            self._wake.set()
+
+    def start(self):
+        self._wake = asyncio.Event()
+        self._claim_lock = asyncio.Lock()
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await asyncio.to_thread(smtp_pool.close_all)
+
+    async def _run(self):
+        while True:
+            try:
+                lease, batch = await self._claim()
+                if batch:
+                    results = await asyncio.to_thread(_deliver, batch)
+                    await self._settle(results, lease)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Email outbox error: {e}")
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), OUTBOX_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim(self):
+        now = datetime.utcnow()
+        async with self._claim_lock, AsyncSessionLocal() as db:
+            stmt = claim_query(now)
+            if db.bind.dialect.name == "postgresql":
+                stmt = stmt.with_for_update(skip_locked=True)
+            lease = now + timedelta(seconds=OUTBOX_LEASE)
+            batch = []
+            for row in (await db.execute(stmt)).scalars().all():
+                # A message whose worker keeps dying mid-send would otherwise be retried forever
+                if row.status == "sending" and row.attempts >= OUTBOX_MAX_ATTEMPTS:
+                    row.status = "failed"
+                    row.last_error = row.last_error or "Lease expired while sending"
+                    continue
+                row.status = "sending"
+                row.attempts += 1
+                row.next_attempt_at = lease
+                batch.append((row.id, row.to_email, row.subject, row.body))
+            await db.commit()
+            return lease, batch
+
+    async def _settle(self, results, lease: datetime):
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            attempts = dict((await db.execute(
+                select(EmailOutbox.id, EmailOutbox.attempts).where(EmailOutbox.id.in_([r[0] for r in results]))
+            )).all())
+            for message_id, error in results:
+                if error is None:
+                    values = {"status": "sent", "sent_at": now, "last_error": None}
+                elif attempts.get(message_id, 0) >= OUTBOX_MAX_ATTEMPTS:
+                    values = {"status": "failed", "last_error": error}
+                else:
+                    delay = OUTBOX_RETRY_BASE * 2 ** (attempts.get(message_id, 1) - 1)
+                    values = {"status": "pending", "last_error": error, "next_attempt_at": now + timedelta(seconds=delay)}
+                # Only while our lease holds: once it ran out another worker may have claimed the row
+                settled = await db.execute(
+                    update(EmailOutbox)
+                    .where(
+                        EmailOutbox.id == message_id,
+                        EmailOutbox.status == "sending",
+                        EmailOutbox.next_attempt_at == lease,
+                    )
+                    .values(**values)
+                )
+                if settled.rowcount == 0:
+                    print(f"Email outbox lease on message {message_id} expired before it was settled")
+            await db.commit()
+
+
+outbox_worker = OutboxWorker()
+
+
+def _sign(message_id: int) -> str:
+    return hmac.new(SECRET_KEY.encode(), f"outbox:{message_id}".encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def delivery_token(message_id: int) -> str:
+    """Handle for get_delivery_status; ids are sequential, so they are signed rather than exposed."""
+    return f"{message_id}.{_sign(message_id)}"
+
+
+async def get_delivery_status(db: AsyncSession, token: str):
+    message_id, _, signature = token.partition(".")
+    if not message_id.isdigit() or not hmac.compare_digest(signature, _sign(int(message_id))):
+        return None
+    message = await db.get(EmailOutbox, int(message_id))
+    if message is None:
+        return None
+    return {
+        "status": message.status,
+        "attempts": message.attempts,
+        "last_error": message.last_error,
+        "created_at": message.created_at,
+        "sent_at": message.sent_at,
+    }
@@ -0,0 +1,29 @@
+import base64
+import json
+import os
+from fastapi import HTTPException
+from starlette import status
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Upper bound for `limit` on the paginated listings
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 1000))
+
+
+def encode_cursor(last_id: int) -> str:
+    """Opaque cursor pointing just after the row with id last_id."""
+    raw = json.dumps({"v": 1, "id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded))
+        last_id = data["id"]
+        if data.get("v") != 1 or not isinstance(last_id, int):
+            raise ValueError(cursor)
+        return last_id
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor")
@@ -0,0 +1,103 @@
+"""
+Per-request SQL budgets and N+1 detection.
+
+Every statement a request runs is counted by its parameterized shape (the SQL text
+with placeholders). When the request finishes, middleware.query_budget checks:
+
+  - the total against the route's budget, declared with @query_budget(n)
+  - each shape against QUERY_REPEAT_LIMIT: the same SELECT run again and again
+    is almost always a loop issuing one query per row (N+1)
+
+The check runs after the response has been sent and skips error responses.
+QUERY_BUDGET_MODE=raise is for tests only: the exception can't change a response
+that is already out, but TestClient re-raises it and fails the test. warn (default)
+only logs the route; off disables the counting.
+"""
+import os
+import re
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+from dotenv import load_dotenv
+from function import timing
+
+load_dotenv()
+
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "warn")
+# Routes without @query_budget(n) get this budget; 0 means no limit
+QUERY_BUDGET_DEFAULT = int(os.getenv("QUERY_BUDGET_DEFAULT", 0))
+QUERY_REPEAT_LIMIT = int(os.getenv("QUERY_REPEAT_LIMIT", 10))
+
+# A comma-separated run of bind placeholders (IN lists, VALUES rows) in any driver's paramstyle
+_PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s|\$\d+)"
+_PLACEHOLDER_LIST = re.compile(rf"{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})+")
+_NUMBERED = re.compile(r"\$\d+")
+_SPACES = re.compile(r"\s+")
+
+_shapes = ContextVar("query_shapes", default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(statements: Optional[int] = None, repeats: Optional[int] = QUERY_REPEAT_LIMIT):
+    """
+    Declare how many SQL statements a route may run (None: QUERY_BUDGET_DEFAULT) and
+    how often one shape may repeat (None: unchecked, for routes that batch on purpose).
+
+        @router.post("/team-lead")
+        @query_budget(2)
+        async def create_team_lead(...): ...
+    """
+    def decorate(func):
+        func.__query_budget__ = (statements, repeats)
+        return func
+    return decorate
+
+
+def shape(statement: str) -> str:
+    # IN (?, ?, ?) and IN (?, ?) are the same query
+    statement = _PLACEHOLDER_LIST.sub("?", statement)
+    statement = _NUMBERED.sub("?", statement)
+    return _SPACES.sub(" ", statement).strip()
+
+
+def begin() -> Counter:
+    shapes = Counter()
+    _shapes.set(shapes)
+    return shapes
+
+
+def _record(statement: str, seconds: float):
+    shapes = _shapes.get()
+    if shapes is not None:
+        shapes[shape(statement)] += 1
+
+
+def check(endpoint, shapes: Counter) -> list:
+    """Return the budget violations for one finished request."""
+    statements, repeats = getattr(endpoint, "__query_budget__", (None, QUERY_REPEAT_LIMIT))
+    if statements is None:
+        statements = QUERY_BUDGET_DEFAULT or None
+    problems = []
+    total = sum(shapes.values())
+    if statements is not None and total > statements:
+        problems.append(f"ran {total} statements, budget is {statements}")
+    if repeats is not None:
+        for sql, count in shapes.most_common():
+            if count <= repeats:
+                break
+            problems.append(f"ran the same statement {count} times (possible N+1): {sql[:200]}")
+    return problems
+
+
+def report(method: str, route: str, problems: list):
+    message = f"Query budget exceeded by {method} {route}: " + "; ".join(problems)
+    if QUERY_BUDGET_MODE == "raise":
+        raise QueryBudgetExceeded(message)
+    print(message)
+
+
+if QUERY_BUDGET_MODE != "off":
+    timing.statement_observers.append(_record)
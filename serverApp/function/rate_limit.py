@@ -0,0 +1,142 @@
+"""
+Per-IP and per-account rate limits for the expensive auth routes (bcrypt, SMTP).
+
+Each rule is a token bucket: `burst` requests at once, refilled at `per_minute`.
+Override one with RATE_LIMIT_<NAME>=<per_minute>/<burst>, e.g. RATE_LIMIT_LOGIN_IP=60/20.
+
+    RATE_LIMIT_STORE_URL=memory://   exact buckets in this worker (default, via STATE_STORE_URL)
+    RATE_LIMIT_STORE_URL=redis://... shared by every worker: `burst` requests per
+                                     burst/per_minute window (a fixed-window approximation,
+                                     since INCR is all the shared store can do atomically)
+
+Checks run before any hashing or mail work, so a rejected request costs a dict
+update (or one INCR) and a 429.
+"""
+import os
+import threading
+import time
+import zlib
+from fastapi import HTTPException, Request
+from starlette import status
+from dotenv import load_dotenv
+from function.kv_store import KVStoreError, STATE_STORE_URL, create_store
+from function.metrics import rate_limit_rejections
+
+load_dotenv()
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_STORE_URL = os.getenv("RATE_LIMIT_STORE_URL") or STATE_STORE_URL
+# Number of proxies in front of the app that append to X-Forwarded-For (0: use the peer address).
+# The client can put anything in the header, so only the entries our own proxies appended count.
+RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", 0))
+
+
+class RateLimit:
+    def __init__(self, name: str, per_minute: float, burst: int):
+        override = os.getenv(f"RATE_LIMIT_{name.upper()}")
+        if override:
+            per_minute, _, burst = override.partition("/")
+        self.name = name
+        self.rate = float(per_minute) / 60  # tokens per second
+        self.burst = int(burst)
+
+
+LOGIN_IP = RateLimit("login_ip", per_minute=30, burst=10)
+LOGIN_ACCOUNT = RateLimit("login_account", per_minute=10, burst=5)
+REGISTER_IP = RateLimit("register_ip", per_minute=10, burst=5)
+OTP_IP = RateLimit("otp_ip", per_minute=10, burst=5)
+OTP_ACCOUNT = RateLimit("otp_account", per_minute=3, burst=3)
+
+
+class ShardedBuckets:
+    """Token buckets in lock-striped dicts; buckets that have refilled are swept away."""
+
+    def __init__(self, shards: int = 16, sweep_every: int = 1024):
+        self._shards = [({}, threading.Lock()) for _ in range(shards)]
+        self._sweep_every = sweep_every
+        self._takes = [0] * shards
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """0 if a token was taken, else seconds until one is available."""
+        index = zlib.crc32(key.encode()) % len(self._shards)
+        data, lock = self._shards[index]
+        now = time.monotonic()
+        with lock:
+            tokens, stamp, _ = data.get(key, (burst, now, now))
+            tokens = min(burst, tokens + (now - stamp) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            data[key] = (tokens, now, now + (burst - tokens) / rate)
+            self._takes[index] += 1
+            if self._takes[index] % self._sweep_every == 0:
+                for stale in [k for k, (_, _, full_at) in data.items() if full_at <= now]:
+                    del data[stale]
+            return wait
+
+
+class SharedWindows:
+    """`burst` requests per burst/rate seconds, counted in the shared store."""
+
+    def __init__(self, store):
+        self.store = store
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        window = burst / rate
+        now = time.time()
+        index = int(now // window)
+        try:
+            count = await self.store.incr(f"rl:{key}:{index}", 1, ttl=window + 1)
+        except (KVStoreError, OSError) as e:
+            # Fail open: an unreachable store must not lock everyone out
+            print(f"Rate limit store unavailable: {e}")
+            return 0.0
+        if count <= burst:
+            return 0.0
+        return (index + 1) * window - now
+
+
+class RateLimiter:
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def check(self, rule: RateLimit, subject):
+        """Raise 429 when `subject` (an IP, an email) has no tokens left for `rule`."""
+        if not RATE_LIMIT_ENABLED or subject is None:
+            return
+        wait = await self.backend.take(f"{rule.name}:{subject}", rule.rate, rule.burst)
+        if wait > 0:
+            rate_limit_rejections.inc(rule.name)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, please try again later",
+                headers={"Retry-After": str(max(1, round(wait)))},
+            )
+
+
+def create_rate_limiter(url: str = RATE_LIMIT_STORE_URL) -> RateLimiter:
+    if url.startswith("memory://"):
+        return RateLimiter(ShardedBuckets())
+    return RateLimiter(SharedWindows(create_store(url)))
+
+
+rate_limiter = create_rate_limiter()
+
+
+def client_ip(request: Request):
+    if RATE_LIMIT_TRUSTED_PROXIES > 0:
+        # Each proxy appends the address it received from, so the client is the entry
+        # added by the outermost of ours, counting from the right
+        entries = [entry.strip() for entry in request.headers.get("x-forwarded-for", "").split(",") if entry.strip()]
+        if entries:
+            return entries[max(0, len(entries) - RATE_LIMIT_TRUSTED_PROXIES)]
+    return request.client.host if request.client else None
+
+
+def limit_by_ip(rule: RateLimit):
+    """Route dependency: @router.post("/login", dependencies=[Depends(limit_by_ip(LOGIN_IP))])"""
+    async def dependency(request: Request):
+        await rate_limiter.check(rule, client_ip(request))
+    return dependency
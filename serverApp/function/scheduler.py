@@ -0,0 +1,149 @@
+"""
+Registry for periodic maintenance jobs, run by an APScheduler BackgroundScheduler.
+
+Every worker process starts the scheduler, but a job only runs in the worker that
+takes its row in job_leases. A finished run keeps the lease until the job is next
+due, so N workers with staggered timers still run each job once per interval.
+Each run is recorded in job_runs with its duration and the row count the job returns.
+"""
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy import insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from dotenv import load_dotenv
+from db.database import engine
+from models.jobModels import JobLease, JobRun
+
+load_dotenv()
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() in ("1", "true", "yes")
+# Minimum lease while a job runs. The lease is the longer of this and the job's interval,
+# so a crashed holder blocks the job for at most max(interval, JOB_LEASE_SECONDS)
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", 900))
+
+
+class ScheduledJob:
+    def __init__(self, name, func, trigger_args):
+        self.name = name
+        self.func = func
+        self.trigger_args = trigger_args
+        self.interval = timedelta(**trigger_args)
+
+
+class JobScheduler:
+    def __init__(self, bind=engine):
+        self.bind = bind
+        self.jobs = {}
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._scheduler = None
+
+    def job(self, name: str, **interval):
+        """Register a function to run on an interval, e.g. @scheduler.job("x", minutes=10).
+
+        The function takes no arguments and may return the number of rows it touched.
+        """
+        def decorator(func):
+            self.jobs[name] = ScheduledJob(name, func, interval)
+            return func
+        return decorator
+
+    def start(self):
+        if not SCHEDULER_ENABLED or self._scheduler is not None:
+            return
+        # Forked workers inherit the parent's owner id; give each process its own
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._scheduler = BackgroundScheduler(timezone="UTC")
+        for job in self.jobs.values():
+            self._scheduler.add_job(
+                self.run, "interval", args=[job.name], id=job.name,
+                max_instances=1, coalesce=True, **job.trigger_args,
+            )
+        self._scheduler.start()
+
+    def shutdown(self):
+        if self._scheduler is not None:
+            self._scheduler.shutdown(wait=False)
+            self._scheduler = None
+
+    def _acquire(self, job: ScheduledJob) -> bool:
+        name = job.name
+        now = datetime.utcnow()
+        expires_at = now + max(job.interval, timedelta(seconds=JOB_LEASE_SECONDS))
+        with self.bind.begin() as conn:
+            taken = conn.execute(
+                update(JobLease)
+                .where(JobLease.name == name, or_(JobLease.expires_at < now, JobLease.owner == self.owner))
+                .values(owner=self.owner, expires_at=expires_at)
+            ).rowcount
+        if taken:
+            return True
+        try:
+            with self.bind.begin() as conn:
+                conn.execute(insert(JobLease).values(name=name, owner=self.owner, expires_at=expires_at))
+            return True
+        except IntegrityError:
+            # Another worker holds a live lease
+            return False
+
+    def _release(self, job: ScheduledJob, started_at: datetime):
+        # Hold the slot until the next run is due, or free it now if the run overran
+        expires_at = max(started_at + job.interval, datetime.utcnow())
+        with self.bind.begin() as conn:
+            conn.execute(
+                update(JobLease)
+                .where(JobLease.name == job.name, JobLease.owner == self.owner)
+                .values(expires_at=expires_at)
+            )
+
+    def run(self, name: str):
+        """Run one job now if this process can take its lease. Returns the JobRun values or None."""
+        job = self.jobs[name]
+        if not self._acquire(job):
+            return None
+
+        started_at = datetime.utcnow()
+        started = time.perf_counter()
+        rows, status, error = None, "ok", None
+        try:
+            rows = job.func()
+        except Exception as e:
+            status, error = "error", str(e) or type(e).__name__
+            print(f"Scheduled job {name} failed: {error}")
+        finally:
+            record = {
+                "job_name": name,
+                "owner": self.owner,
+                "started_at": started_at,
+                "duration_ms": int((time.perf_counter() - started) * 1000),
+                "rows": rows if isinstance(rows, int) else None,
+                "status": status,
+                "error": error,
+            }
+            try:
+                with self.bind.begin() as conn:
+                    conn.execute(insert(JobRun).values(**record))
+            finally:
+                self._release(job, started_at)
+        return record
+
+    def recent_runs(self, limit: int = 50):
+        with self.bind.connect() as conn:
+            rows = conn.execute(select(JobRun).order_by(JobRun.id.desc()).limit(limit)).mappings().all()
+        return [dict(row) for row in rows]
+
+    def status(self):
+        scheduled = {}
+        if self._scheduler is not None:
+            for job in self._scheduler.get_jobs():
+                scheduled[job.id] = job.next_run_time
+        return {
+            name: {"interval": job.trigger_args, "next_run_time": scheduled.get(name)}
+            for name, job in self.jobs.items()
+        }
+
+
+scheduler = JobScheduler()
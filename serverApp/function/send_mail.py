@@ -1,10 +1,14 @@
 from fastapi import HTTPException
 import smtplib
+import queue
+import threading
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.utils import formataddr
 from dotenv import load_dotenv
 import os
+import time
+from function.metrics import smtp_sends, smtp_latency
 
 # Load environment variables from .env file
 load_dotenv()
@@ -13,20 +17,104 @@ NEX_USERNAME = os.getenv("NEX_USERNAME")
 NEX_PASSWORD = os.getenv("NEX_PASSWORD")  # Replace with App Password
 NEX_SENDER_EMAIL = os.getenv("NEX_SENDER_EMAIL")
 
-def send_new_email(Email_to, Email_sub, Email_msg):
+# Point these at a local sink (python -m function.smtp_sink) for tests and benchmarks
+SMTP_HOST = os.getenv("SMTP_HOST", "webhost.dynadot.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() in ("1", "true", "yes")
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", 30))
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", 2))
+
+
+def build_message(Email_to, Email_sub, Email_msg):
     msg = MIMEMultipart("alternative")
     msg['From'] = formataddr(("Nexventures Ltd", NEX_SENDER_EMAIL))
     msg['To'] = Email_to
     msg['Subject'] = Email_sub
-    full_message = Email_msg
-    msg.attach(MIMEText(full_message, 'html', 'utf-8'))  # Specify UTF-8 encoding
+    msg.attach(MIMEText(Email_msg, 'html', 'utf-8'))  # Specify UTF-8 encoding
+    return msg
 
-    try:
-        with smtplib.SMTP('webhost.dynadot.com', 587) as server:
+
+class SMTPConnectionPool:
+    """Keeps authenticated SMTP sessions open so each message skips connect, STARTTLS and login."""
+
+    def __init__(self, size: int = SMTP_POOL_SIZE):
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        if SMTP_STARTTLS:
             server.starttls()
+        if NEX_USERNAME:
             server.login(NEX_USERNAME, NEX_PASSWORD)
+        return server
+
+    def acquire(self):
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    server = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                # Drop sessions the relay closed while they sat idle
+                try:
+                    if server.noop()[0] == 250:
+                        return server
+                except (smtplib.SMTPException, OSError):
+                    pass
+                self._close(server)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, server, broken: bool = False):
+        if broken:
+            self._close(server)
+        else:
+            self._idle.put(server)
+        self._slots.release()
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+    def send(self, server, Email_to, Email_sub, Email_msg):
+        msg = build_message(Email_to, Email_sub, Email_msg)
+        start = time.perf_counter()
+        try:
             server.sendmail(NEX_SENDER_EMAIL, Email_to, msg.as_string())
+        except Exception:
+            smtp_sends.inc("error")
+            raise
+        finally:
+            smtp_latency.observe(time.perf_counter() - start)
+        smtp_sends.inc("ok")
+
+    def close_all(self):
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+smtp_pool = SMTPConnectionPool()
+
+
+def send_new_email(Email_to, Email_sub, Email_msg):
+    # Synchronous send, kept for callers that need the result inline; prefer function.outbox
+    server = None
+    try:
+        server = smtp_pool.acquire()
+        smtp_pool.send(server, Email_to, Email_sub, Email_msg)
     except Exception as e:
+        if server is not None:
+            smtp_pool.release(server, broken=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+    smtp_pool.release(server)
     return True
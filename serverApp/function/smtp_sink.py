@@ -0,0 +1,111 @@
+"""
+Local SMTP sink for tests and benchmarks. Accepts every message and either keeps it in
+memory or writes it to a directory as .eml files.
+
+    python -m function.smtp_sink --port 1025 --dir /tmp/mails
+    SMTP_HOST=127.0.0.1 SMTP_PORT=1025 SMTP_STARTTLS=false uvicorn main:app
+"""
+import argparse
+import asyncio
+import os
+import time
+
+
+class SMTPSink:
+    def __init__(self, directory: str = None):
+        self.directory = directory
+        self.messages = []  # (mail_from, rcpt_to, data) when no directory is set
+        self.count = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def store(self, mail_from, rcpt_to, data: bytes):
+        self.count += 1
+        if self.directory:
+            name = os.path.join(self.directory, f"{time.time_ns()}-{self.count}.eml")
+            with open(name, "wb") as f:
+                f.write(data)
+        else:
+            self.messages.append((mail_from, rcpt_to, data))
+
+    async def _session(self, reader, writer):
+        def reply(line: str):
+            writer.write(line.encode() + b"\r\n")
+
+        reply("220 centerpiece-sink ESMTP")
+        mail_from, rcpt_to = None, []
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode(errors="replace").strip()
+                verb = command[:4].upper()
+                if verb == "EHLO":
+                    reply("250-centerpiece-sink")
+                    reply("250-AUTH PLAIN LOGIN")
+                    reply("250 8BITMIME")
+                elif verb == "HELO":
+                    reply("250 centerpiece-sink")
+                elif verb == "AUTH":
+                    # Accept any credentials; LOGIN needs the two extra prompts
+                    if command.upper().startswith("AUTH LOGIN") and len(command.split()) == 2:
+                        reply("334 VXNlcm5hbWU6")
+                        await reader.readline()
+                        reply("334 UGFzc3dvcmQ6")
+                        await reader.readline()
+                    elif command.upper().startswith("AUTH LOGIN"):
+                        reply("334 UGFzc3dvcmQ6")
+                        await reader.readline()
+                    reply("235 Authentication successful")
+                elif verb == "MAIL":
+                    mail_from, rcpt_to = command[10:].strip(), []
+                    reply("250 OK")
+                elif verb == "RCPT":
+                    rcpt_to.append(command[8:].strip())
+                    reply("250 OK")
+                elif verb == "DATA":
+                    reply("354 End data with <CR><LF>.<CR><LF>")
+                    await writer.drain()
+                    lines = []
+                    while True:
+                        data_line = await reader.readline()
+                        if data_line in (b".\r\n", b".\n", b""):
+                            break
+                        lines.append(data_line[1:] if data_line.startswith(b"..") else data_line)
+                    self.store(mail_from, rcpt_to, b"".join(lines))
+                    reply("250 OK queued")
+                elif verb in ("RSET", "NOOP"):
+                    if verb == "RSET":
+                        mail_from, rcpt_to = None, []
+                    reply("250 OK")
+                elif verb == "QUIT":
+                    reply("221 Bye")
+                    await writer.drain()
+                    break
+                else:
+                    reply("502 Command not implemented")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 1025):
+        return await asyncio.start_server(self._session, host, port)
+
+
+async def _serve(args):
+    sink = SMTPSink(args.dir)
+    server = await sink.start(args.host, args.port)
+    print(f"SMTP sink listening on {args.host}:{args.port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local SMTP sink")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1025)
+    parser.add_argument("--dir", default=None)
+    asyncio.run(_serve(parser.parse_args()))
@@ -0,0 +1,76 @@
+import gzip
+import hashlib
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # optional; without it pages are served gzip or identity
+    brotli = None
+
+
+class StaticPage:
+    """One page rendered at startup and kept in identity, gzip and (if available) brotli form."""
+
+    def __init__(self, content: str, media_type: str, max_age: int):
+        self.media_type = media_type
+        self.cache_control = f"public, max-age={max_age}"
+        raw = content.encode("utf-8")
+        etag = hashlib.sha256(raw).hexdigest()[:32]
+        # Strong ETags must differ per encoding, so each representation gets a suffix
+        self.variants = {"identity": (raw, f'"{etag}"')}
+        self.variants["gzip"] = (gzip.compress(raw, compresslevel=9, mtime=0), f'"{etag}-gz"')
+        if brotli is not None:
+            self.variants["br"] = (brotli.compress(raw, quality=11), f'"{etag}-br"')
+        self.etags = {tag for _, tag in self.variants.values()}
+
+
+def _accepted_encodings(header: str) -> dict:
+    accepted = {}
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if token:
+            accepted[token.strip().lower()] = q
+    return accepted
+
+
+class StaticPageRegistry:
+    def __init__(self):
+        self._pages = {}
+
+    def register(self, name: str, content: str, media_type: str = "text/html; charset=utf-8", max_age: int = 300):
+        self._pages[name] = StaticPage(content, media_type, max_age)
+        return self._pages[name]
+
+    def response(self, request: Request, name: str) -> Response:
+        page = self._pages[name]
+
+        accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+        encoding = "identity"
+        for candidate in ("br", "gzip"):
+            if candidate in page.variants and accepted.get(candidate, accepted.get("*", 0)) > 0:
+                encoding = candidate
+                break
+        body, etag = page.variants[encoding]
+
+        headers = {"ETag": etag, "Cache-Control": page.cache_control, "Vary": "Accept-Encoding"}
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match:
+            tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+            if "*" in tags or tags & page.etags:
+                return Response(status_code=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=body, media_type=page.media_type, headers=headers)
+
+
+static_pages = StaticPageRegistry()
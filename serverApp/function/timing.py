@@ -0,0 +1,82 @@
+"""
+Per-request time accounting, read by the profiling middleware for Server-Timing.
+
+A RequestTiming is bound to a context variable at the start of a request; code that
+does measurable work adds to it with `timed("hash")` or `add("db", seconds)`. The
+context is inherited by tasks, threadpool calls and SQLAlchemy's async greenlets,
+so the same object collects time from all of them.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class RequestTiming:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spent = {}  # kind -> seconds
+        self.counts = {}  # kind -> number of operations
+
+    def add(self, kind: str, seconds: float):
+        self.spent[kind] = self.spent.get(kind, 0.0) + seconds
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+
+_current = ContextVar("request_timing", default=None)
+
+# Called as observer(statement, seconds) after every SQL statement (function.metrics adds one)
+statement_observers = []
+
+
+def begin() -> RequestTiming:
+    timing = RequestTiming()
+    _current.set(timing)
+    return timing
+
+
+def current():
+    return _current.get()
+
+
+def add(kind: str, seconds: float):
+    timing = _current.get()
+    if timing is not None:
+        timing.add(kind, seconds)
+
+
+@contextmanager
+def timed(kind: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(kind, time.perf_counter() - start)
+
+
+# Every statement on every engine (sync, and the async engines' sync cores)
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started")
+    if started:
+        seconds = time.perf_counter() - started.pop()
+        add("db", seconds)
+        for observer in statement_observers:
+            observer(statement, seconds)
+
+
+@event.listens_for(Engine, "handle_error")
+def _query_failed(exception_context):
+    conn = exception_context.connection
+    started = conn.info.get("query_started") if conn is not None else None
+    if started:
+        add("db", time.perf_counter() - started.pop())
@@ -0,0 +1,158 @@
+"""
+Cache of verified JWT claims, plus per-user revocation (password change, deletion).
+
+Revocations are recorded in this worker at once and, with TOKEN_REVOCATION_URL (or
+a shared STATE_STORE_URL, as serve.py sets up), in the shared store. Other workers
+look a user's revocation up there at most every TOKEN_REVOCATION_SYNC seconds, which
+bounds how long they keep accepting that user's old tokens.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+from function.kv_store import KVStoreError, STATE_STORE_URL, create_store
+
+load_dotenv()
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+# Upper bound on how long a cached entry lives, even if the token's exp is later
+TOKEN_CACHE_MAX_TTL = int(os.getenv("TOKEN_CACHE_MAX_TTL", 3600))
+# Revocations are remembered for the lifetime of the longest token we issue (refresh, 60 days)
+TOKEN_REVOCATION_TTL = int(os.getenv("TOKEN_REVOCATION_TTL", 60 * 24 * 3600))
+TOKEN_REVOCATION_MAX = int(os.getenv("TOKEN_REVOCATION_MAX", 10000))
+TOKEN_REVOCATION_URL = os.getenv("TOKEN_REVOCATION_URL") or STATE_STORE_URL
+TOKEN_REVOCATION_SYNC = float(os.getenv("TOKEN_REVOCATION_SYNC", 5))
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenCache:
+    """Bounded LRU of verified JWT claims keyed by token digest, with per-user revocation."""
+
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE, max_ttl: int = TOKEN_CACHE_MAX_TTL, shared=None):
+        self.maxsize = maxsize
+        self.max_ttl = max_ttl
+        self.shared = shared
+        self.hits = 0
+        self.misses = 0
+        self.revoked_hits = 0
+        self._entries = OrderedDict()  # digest -> (expires_at, claims)
+        self._revoked_users = OrderedDict()  # user_id -> revoked_at (epoch seconds)
+        self._synced = OrderedDict()  # user_id -> when to look at the shared store again (monotonic)
+        self._lock = threading.Lock()
+
+    def get(self, token: str):
+        digest = token_digest(token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, claims = entry
+            if expires_at <= now:
+                del self._entries[digest]
+                self.misses += 1
+                return None
+            if self._is_revoked(claims):
+                del self._entries[digest]
+                self.revoked_hits += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return claims
+
+    def put(self, token: str, claims: dict):
+        exp = claims.get("exp")
+        now = time.time()
+        expires_at = now + self.max_ttl
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+        if expires_at <= now:
+            return
+        digest = token_digest(token)
+        with self._lock:
+            self._entries[digest] = (expires_at, claims)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    async def is_revoked(self, claims: dict) -> bool:
+        if self.shared is not None and claims.get("id") is not None:
+            await self._sync(claims["id"])
+        with self._lock:
+            return self._is_revoked(claims)
+
+    async def _sync(self, user_id):
+        """Pick up a revocation made by another worker."""
+        now = time.monotonic()
+        with self._lock:
+            if self._synced.get(user_id, 0) > now:
+                return
+        try:
+            raw = await self.shared.get(f"revoked:{user_id}")
+        except (KVStoreError, OSError) as e:
+            print(f"Token revocation store unavailable: {e}")
+            return
+        with self._lock:
+            self._synced[user_id] = now + TOKEN_REVOCATION_SYNC
+            self._synced.move_to_end(user_id)
+            while len(self._synced) > self.maxsize:
+                self._synced.popitem(last=False)
+            if raw is not None and int(raw) > self._revoked_users.get(user_id, 0):
+                self._record_revocation(user_id, int(raw))
+
+    def _is_revoked(self, claims: dict) -> bool:
+        revoked_at = self._revoked_users.get(claims.get("id"))
+        if revoked_at is None:
+            return False
+        if time.time() - revoked_at > TOKEN_REVOCATION_TTL:
+            self._revoked_users.pop(claims.get("id"), None)
+            return False
+        # iat is whole seconds, so a token issued in the second of the revocation is kept.
+        # Tokens issued before iat existed can't be told apart, so they are revoked too
+        return claims.get("iat", 0) < revoked_at
+
+    async def revoke_user(self, user_id):
+        """Invalidate every token issued to user_id up to now (e.g. after a password change)."""
+        revoked_at = int(time.time())
+        with self._lock:
+            self._record_revocation(user_id, revoked_at)
+        if self.shared is not None:
+            try:
+                await self.shared.set(f"revoked:{user_id}", str(revoked_at).encode(), ttl=TOKEN_REVOCATION_TTL)
+            except (KVStoreError, OSError) as e:
+                print(f"Token revocation store unavailable, other workers still accept user {user_id}'s tokens: {e}")
+
+    def _record_revocation(self, user_id, revoked_at: int):
+        self._revoked_users[user_id] = revoked_at
+        self._revoked_users.move_to_end(user_id)
+        while len(self._revoked_users) > TOKEN_REVOCATION_MAX:
+            self._revoked_users.popitem(last=False)
+        for digest in [d for d, (_, c) in self._entries.items() if c.get("id") == user_id]:
+            del self._entries[digest]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "revoked_hits": self.revoked_hits,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "revoked_users": len(self._revoked_users),
+                "shared": self.shared is not None,
+            }
+
+
+token_cache = TokenCache(shared=None if TOKEN_REVOCATION_URL.startswith("memory://") else create_store(TOKEN_REVOCATION_URL))
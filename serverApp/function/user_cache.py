@@ -0,0 +1,177 @@
+"""
+Read-through cache of Users rows (profile columns only, never the password hash),
+looked up by id or by email.
+
+Each worker keeps a bounded LRU. With USER_CACHE_URL (redis://... or unix://...)
+misses fall through to a shared store before the database, and the local copies only
+live USER_CACHE_LOCAL_TTL seconds, which bounds how long another worker can serve a
+record after it was invalidated elsewhere.
+
+Shared entries are stored under a version that `invalidate` replaces, so a worker that
+loaded a row before an invalidation writes it under a key nobody reads any more
+instead of putting the old row back for USER_CACHE_TTL seconds.
+
+Anything that changes or deletes a user must call `await user_cache.invalidate(...)`
+after committing.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.userModels import Users
+from function.kv_store import KVStoreError, create_store
+
+load_dotenv()
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 2000))
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", 300))
+USER_CACHE_URL = os.getenv("USER_CACHE_URL")
+USER_CACHE_LOCAL_TTL = int(os.getenv("USER_CACHE_LOCAL_TTL", 30))
+
+USER_CACHE_COLUMNS = (Users.id, Users.first_name, Users.last_name, Users.email, Users.userType, Users.phone)
+
+
+def user_query(where):
+    return select(*USER_CACHE_COLUMNS).where(where).limit(1)
+
+
+class UserCache:
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: int = USER_CACHE_TTL, shared=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.shared = shared
+        self.local_ttl = min(ttl, USER_CACHE_LOCAL_TTL) if shared is not None else ttl
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, record)
+        self._invalidations = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _id_key(user_id) -> str:
+        return f"user:id:{int(user_id)}"
+
+    @staticmethod
+    def _email_key(email: str) -> str:
+        return f"user:email:{email}"
+
+    @staticmethod
+    def _version_key(key: str) -> str:
+        return f"{key}:version"
+
+    def _get_local(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def _put_local(self, record: dict, generation: int):
+        expires_at = time.monotonic() + self.local_ttl
+        with self._lock:
+            # An invalidation ran while this record was being loaded; it may be stale
+            if generation != self._invalidations:
+                return
+            for key in (self._id_key(record["id"]), self._email_key(record["email"])):
+                self._entries[key] = (expires_at, record)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    async def _lookup(self, db: AsyncSession, key: str, where):
+        record = self._get_local(key)
+        if record is not None:
+            return record
+        generation = self._invalidations
+
+        shared_key = None
+        if self.shared is not None:
+            try:
+                # Read the version before the database, so a load that races an invalidation is written under the old one
+                version = await self.shared.get(self._version_key(key))
+                shared_key = f"{key}@{version.decode() if version else 0}"
+                raw = await self.shared.get(shared_key)
+            except (KVStoreError, OSError) as e:
+                print(f"User cache store unavailable: {e}")
+                shared_key = raw = None
+            if raw is not None:
+                record = json.loads(raw)
+                self.shared_hits += 1
+                self._put_local(record, generation)
+                return record
+
+        self.misses += 1
+        row = (await db.execute(user_query(where))).first()
+        if row is None:
+            return None
+        record = dict(row._mapping)
+        self._put_local(record, generation)
+        # Only the key that was looked up: the version of the other one wasn't read before the load
+        if shared_key is not None:
+            try:
+                await self.shared.set(shared_key, json.dumps(record).encode(), ttl=self.ttl)
+            except (KVStoreError, OSError) as e:
+                print(f"User cache store unavailable: {e}")
+        return record
+
+    async def get_by_id(self, db: AsyncSession, user_id):
+        """The user's profile columns as a dict, or None."""
+        return await self._lookup(db, self._id_key(user_id), Users.id == user_id)
+
+    async def get_by_email(self, db: AsyncSession, email: str):
+        return await self._lookup(db, self._email_key(email), Users.email == email)
+
+    async def invalidate(self, user_id, *emails):
+        """Drop a user; pass every email it was cached under (old and new after an email change)."""
+        keys = [self._id_key(user_id)]
+        with self._lock:
+            self._invalidations += 1
+            cached = self._entries.pop(keys[0], None)
+            if cached is not None:
+                emails += (cached[1]["email"],)
+            for email in set(emails):
+                if email is not None:
+                    keys.append(self._email_key(email))
+                    self._entries.pop(keys[-1], None)
+        if self.shared is not None:
+            # A fresh version rather than a counter, so it can expire without ever being reused.
+            # It outlives every entry written under the previous version (USER_CACHE_TTL plus a load).
+            version = uuid.uuid4().hex.encode()
+            try:
+                for key in keys:
+                    await self.shared.set(self._version_key(key), version, ttl=2 * self.ttl)
+            except (KVStoreError, OSError) as e:
+                print(f"User cache store unavailable, {keys} may be served until they expire: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._invalidations += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.shared_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "shared": self.shared is not None,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_ratio": round((self.hits + self.shared_hits) / total, 4) if total else 0.0,
+            }
+
+
+user_cache = UserCache(shared=create_store(USER_CACHE_URL) if USER_CACHE_URL else None)
@@ -1,21 +1,61 @@
+from contextlib import asynccontextmanager
 from enum import Enum
 from fastapi import FastAPI, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from Endpoints import auth, users, customer , events_category, events_venue,eventsPlanning,otp,incomes, expense, Report , team_lead, planning,investors,BanksManagement
+from Endpoints import auth, users, customer , events_category, events_venue,eventsPlanning,otp,incomes, expense, Report , team_lead, planning,investors,BanksManagement,admin,exports,metrics
 from fastapi.responses import HTMLResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
-from starlette.middleware.base import BaseHTTPMiddleware
-import time
-import hashlib
-from fastapi.responses import JSONResponse
-import asyncio
 # ✅ Add these 2 lines here
 from db.connection import SessionLocal
 from Endpoints.BanksManagement import initialize_balance_calculator
+from function.hashing import password_hasher
+from db.bootstrap import bootstrap_schema
+from db.event_counters import rebuild_event_counters
+from middleware.idempotency import IdempotencyMiddleware
+from middleware.profiling import ProfilingMiddleware
+from middleware.metrics import MetricsMiddleware
+from middleware.query_budget import QueryBudgetMiddleware
+from function.outbox import outbox_worker
+from function.static_pages import static_pages
+from function.jobs import scheduler
+from function.metrics import metrics as app_metrics
+import os
 
 
 bearer_scheme = HTTPBearer()
+
+
+def one_time_startup():
+    """Schema bootstrap and balance init. serve.py runs this once in the parent, before forking workers."""
+    # Creates missing tables once; skipped when the stored schema fingerprint is current
+    if os.getenv("SCHEMA_BOOTSTRAP", "auto") != "off" and bootstrap_schema():
+        # New or changed tables: make sure derived counters start out consistent
+        rebuild_event_counters()
+    db = SessionLocal()
+    try:
+        initialize_balance_calculator(db)
+    finally:
+        db.close()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Workers forked by serve.py inherit the parent's startup instead of repeating it
+    if os.getenv("SERVE_PRELOADED") != "1":
+        one_time_startup()
+    outbox_worker.start()
+    # Maintenance jobs (function.jobs); each runs in only one worker per interval
+    scheduler.start()
+    # Under serve.py, share this worker's metrics with the others (METRICS_MULTIPROC_DIR)
+    app_metrics.start_export()
+    yield
+    app_metrics.stop_export()
+    scheduler.shutdown()
+    await outbox_worker.stop()
+    password_hasher.shutdown()
+
+
 app = FastAPI(
     title="CENTER PIECE - Financial Management API",
     description="""
@@ -34,43 +74,11 @@ app = FastAPI(
     # docs_url=None,          # disables Swagger UI
     # redoc_url=None,         # disables ReDoc
     # openapi_url=None  
+    lifespan=lifespan,
 )
 
-# In-memory store (for demo, use Redis in production)
-pending_requests = {}
-
-class PreventDuplicateRequestsMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Read body safely
-        body = await request.body()
-        # Re-insert the body so downstream endpoints can read it
-        async def receive():
-            return {"type": "http.request", "body": body}
-
-        # Build unique request key
-        key_raw = f"{request.method}:{request.url.path}:{body.decode()}"
-        key = hashlib.sha256(key_raw.encode()).hexdigest()
-
-        if key in pending_requests:
-            return JSONResponse({"detail": "Duplicate request in progress"}, status_code=429)
-
-        pending_requests[key] = True
-
-        try:
-            response = await call_next(Request(request.scope, receive))
-            return response
-        finally:
-            await asyncio.sleep(0.1)
-            pending_requests.pop(key, None)
-
-# ✅ Add the startup event RIGHT HERE
-@app.on_event("startup")
-async def startup_event():
-    db = SessionLocal()
-    try:
-        initialize_balance_calculator(db)
-    finally:
-        db.close()
+# Replays completed duplicates of POST/PUT/PATCH/DELETE (Idempotency-Key header or identical body)
+app.add_middleware(IdempotencyMiddleware)
 # Configure CORS 
 app.add_middleware(
     CORSMiddleware,
@@ -79,7 +87,12 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-# app.add_middleware(PreventDuplicateRequestsMiddleware)
+# Warns (QUERY_BUDGET_MODE=raise: fails) when a route exceeds its @query_budget or repeats a query N+1-style
+app.add_middleware(QueryBudgetMiddleware)
+# Request count, latency and SQL statements per route template, served at /metrics
+app.add_middleware(MetricsMiddleware)
+# Outermost: profiles requests sent with X-Profile: $PROFILE_TOKEN (or PROFILE_SAMPLE_RATE) and adds Server-Timing
+app.add_middleware(ProfilingMiddleware)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
@@ -98,15 +111,17 @@ app.include_router(users.router)  # Add this line
 app.include_router(customer.router)  # Add this line
 app.include_router(events_category.router)  # Add this line
 app.include_router(events_venue.router)     # Add this line
+app.include_router(admin.router)
+app.include_router(exports.router)
+app.include_router(metrics.router)
 @app.get("/secure-data")
 def secure_data(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
     token = credentials.credentials
     # Here you can verify token however you want
     return {"message": "Access granted", "token_used": token}
 
-@app.get("/", response_class=HTMLResponse)
-async def read_root():
-    html_content = f"""
+# Landing page; rendered and compressed once at startup, served with ETag/304 support
+LANDING_PAGE_HTML = """
 <!DOCTYPE html>
 <html lang="en">
 
@@ -117,30 +132,30 @@ async def read_root():
     <!-- Tailwind CSS -->
     <link href="https://cdn.jsdelivr.net/npm/tailwindcss@2.2.19/dist/tailwind.min.css" rel="stylesheet">
     <style>
-        .bg-dark-blue {{
+        .bg-dark-blue {
             background-color: #1e3a8a;
-        }}
-        .text-dark-yellow {{
+        }
+        .text-dark-yellow {
             color: #b45309;
-        }}
-        .bg-dark-yellow {{
+        }
+        .bg-dark-yellow {
             background-color: #b45309;
-        }}
-        .border-dark-yellow {{
+        }
+        .border-dark-yellow {
             border-color: #b45309;
-        }}
-        .border-dark-blue {{
+        }
+        .border-dark-blue {
             border-color: #1e3a8a;
-        }}
-        .gradient-text {{
+        }
+        .gradient-text {
             background: linear-gradient(90deg, #b45309, #1e3a8a);
             -webkit-background-clip: text;
             background-clip: text;
             color: transparent;
-        }}
-        .financial-gradient {{
+        }
+        .financial-gradient {
             background: linear-gradient(135deg, #ffffff 0%, #f8fafc 50%, #f1f5f9 100%);
-        }}
+        }
     </style>
 </head>
 
@@ -247,5 +262,11 @@ async def read_root():
 </body>
 
 </html>
-    """
-    return HTMLResponse(content=html_content)
\ No newline at end of file
+"""
+
+static_pages.register("landing", LANDING_PAGE_HTML)
+
+
+@app.get("/", response_class=HTMLResponse)
+async def read_root(request: Request):
+    return static_pages.response(request, "landing")
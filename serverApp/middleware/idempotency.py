@@ -0,0 +1,205 @@
+import base64
+import hashlib
+import json
+import os
+from dotenv import load_dotenv
+from starlette.requests import Request
+from function.kv_store import KVStoreError, create_store
+from function.rate_limit import client_ip
+
+load_dotenv()
+
+IDEMPOTENCY_STORE_URL = os.getenv("IDEMPOTENCY_STORE_URL")  # falls back to STATE_STORE_URL
+# How long a completed response is replayed for an explicit Idempotency-Key
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", 24 * 3600))
+# Requests without a key are only deduplicated on identical bodies within this short window
+IDEMPOTENCY_BODY_TTL = int(os.getenv("IDEMPOTENCY_BODY_TTL", 5))
+# A request that never finishes (crashed worker) releases its key after this long
+IDEMPOTENCY_LOCK_TTL = int(os.getenv("IDEMPOTENCY_LOCK_TTL", 60))
+IDEMPOTENCY_MAX_BODY = int(os.getenv("IDEMPOTENCY_MAX_BODY", 1024 * 1024))
+IDEMPOTENCY_MAX_RESPONSE = int(os.getenv("IDEMPOTENCY_MAX_RESPONSE", 1024 * 1024))
+
+PENDING = b"pending"
+UNSAFE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+
+def _header(scope, name: bytes):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+
+async def _send_json(send, status: int, detail: str, extra_headers=()):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), *extra_headers],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class IdempotencyMiddleware:
+    """
+    Deduplicates unsafe requests by Idempotency-Key header, or by a digest of the
+    streamed body when no key is sent. A duplicate of a request that succeeded (2xx)
+    gets the stored response replayed; a duplicate of one still running gets 409.
+    """
+
+    def __init__(self, app, store=None):
+        self.app = app
+        self.store = store or create_store(IDEMPOTENCY_STORE_URL)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in UNSAFE_METHODS:
+            return await self.app(scope, receive, send)
+
+        # Keys are scoped per caller so two users can't collide on the same key or body.
+        # Anonymous callers are told apart by address; without one there is nothing to scope by.
+        authorization = _header(scope, b"authorization")
+        if authorization:
+            caller = hashlib.sha256(authorization).hexdigest()[:16]
+        else:
+            address = client_ip(Request(scope))
+            if address is None:
+                return await self.app(scope, receive, send)
+            caller = "ip-" + hashlib.sha256(address.encode()).hexdigest()[:16]
+        target = f"{scope['method']}:{scope['path']}?{scope.get('query_string', b'').decode('latin-1')}"
+
+        buffered = []
+        # For an explicit key the body is fingerprinted as the app reads it, and stored with the
+        # response so a reuse of the key with another body can be refused
+        body_digest = hashlib.sha256()
+        body_read = {"complete": False}
+        idempotency_key = _header(scope, b"idempotency-key")
+        if idempotency_key:
+            key = f"idem:key:{caller}:{target}:{idempotency_key.decode('latin-1')}"
+            ttl = IDEMPOTENCY_KEY_TTL
+        else:
+            digest = hashlib.sha256()
+            size = 0
+            more_body = True
+            while more_body:
+                message = await receive()
+                buffered.append(message)
+                if message["type"] != "http.request":
+                    break
+                chunk = message.get("body", b"")
+                digest.update(chunk)
+                size += len(chunk)
+                more_body = message.get("more_body", False)
+                if size > IDEMPOTENCY_MAX_BODY:
+                    # Too large to be worth fingerprinting; hand it through untouched
+                    return await self.app(scope, self._replay(buffered, receive), send)
+            key = f"idem:body:{caller}:{target}:{digest.hexdigest()}"
+            ttl = IDEMPOTENCY_BODY_TTL
+
+        if buffered:
+            downstream_receive = self._replay(buffered, receive)
+        else:
+            async def downstream_receive():
+                message = await receive()
+                if message["type"] == "http.request":
+                    body_digest.update(message.get("body", b""))
+                    body_read["complete"] = not message.get("more_body", False)
+                return message
+        try:
+            acquired = await self.store.set(key, PENDING, ttl=IDEMPOTENCY_LOCK_TTL, nx=True)
+            record = None if acquired else await self.store.get(key)
+        except KVStoreError as e:
+            # The store being down must not take the API down with it
+            print(f"Idempotency store unavailable: {e}")
+            return await self.app(scope, downstream_receive, send)
+
+        if not acquired:
+            if record == PENDING:
+                return await _send_json(
+                    send, 409, "A request with the same idempotency key is already in progress",
+                    [(b"retry-after", b"1")],
+                )
+            if record is not None:
+                data = json.loads(record)
+                if idempotency_key and data.get("digest") and data["digest"] != await self._read_digest(receive):
+                    return await _send_json(
+                        send, 422, "This idempotency key was already used with a different request body"
+                    )
+                return await self._replay_response(send, data)
+            # Expired between SET and GET; treat as a fresh request without dedup
+            return await self.app(scope, downstream_receive, send)
+
+        response = {"status": None, "headers": [], "body": [], "size": 0, "cacheable": True}
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = message.get("headers", [])
+            elif message["type"] == "http.response.body" and response["cacheable"]:
+                chunk = message.get("body", b"")
+                response["size"] += len(chunk)
+                if response["size"] > IDEMPOTENCY_MAX_RESPONSE:
+                    response["cacheable"] = False
+                    response["body"] = []
+                else:
+                    response["body"].append(chunk)
+            await send(message)
+
+        try:
+            await self.app(scope, downstream_receive, capture_send)
+        except BaseException:
+            await self._release(key)
+            raise
+
+        # Only successes are remembered: an error (401, 409, 429, 5xx) may not hold on a retry
+        # once the client fixed its auth or waited out a rate limit
+        if response["status"] is None or not 200 <= response["status"] < 300 or not response["cacheable"]:
+            await self._release(key)
+            return
+        record = json.dumps({
+            "status": response["status"],
+            "headers": [[k.decode("latin-1"), v.decode("latin-1")] for k, v in response["headers"]],
+            "body": base64.b64encode(b"".join(response["body"])).decode(),
+            # None when the app didn't read the whole body; the key is then replayed unchecked
+            "digest": body_digest.hexdigest() if idempotency_key and body_read["complete"] else None,
+        }).encode()
+        try:
+            await self.store.set(key, record, ttl=ttl)
+        except KVStoreError as e:
+            print(f"Idempotency store unavailable: {e}")
+
+    @staticmethod
+    def _replay(buffered, receive):
+        pending = list(buffered)
+
+        async def replay_receive():
+            if pending:
+                return pending.pop(0)
+            return await receive()
+
+        return replay_receive
+
+    @staticmethod
+    async def _read_digest(receive) -> str:
+        # Hashed as it streams in; the duplicate is never forwarded, so nothing is kept
+        digest = hashlib.sha256()
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                break
+            digest.update(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        return digest.hexdigest()
+
+    @staticmethod
+    async def _replay_response(send, data: dict):
+        headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in data["headers"]]
+        headers.append((b"idempotent-replayed", b"true"))
+        await send({"type": "http.response.start", "status": data["status"], "headers": headers})
+        await send({"type": "http.response.body", "body": base64.b64decode(data["body"])})
+
+    async def _release(self, key: str):
+        try:
+            await self.store.delete(key)
+        except KVStoreError as e:
+            print(f"Idempotency store unavailable: {e}")
@@ -0,0 +1,38 @@
+import time
+from function import timing
+from function.metrics import http_requests, http_latency, http_in_flight, http_db_statements, http_db_time
+
+
+class MetricsMiddleware:
+    """Records latency, status and SQL work per route template (e.g. /users/{user_id})."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        # Reuse the profiler's accumulator when it already started one for this request
+        request_timing = timing.current() or timing.begin()
+        status = {"code": 500}
+
+        async def record_send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, record_send)
+        finally:
+            http_in_flight.dec()
+            # The router puts the matched route in the scope; unmatched paths share one label
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            http_latency.observe(time.perf_counter() - start, method, template)
+            http_requests.inc(method, template, str(status["code"]))
+            http_db_statements.observe(request_timing.counts.get("db", 0), method, template)
+            http_db_time.observe(request_timing.spent.get("db", 0.0), method, template)
@@ -0,0 +1,165 @@
+import asyncio
+import cProfile
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from dotenv import load_dotenv
+from function import timing
+
+load_dotenv()
+
+# A request is profiled when it sends X-Profile: <PROFILE_TOKEN>, or at random at this rate
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+# "cprofile" writes a pstats file; "sample" writes collapsed stacks (flamegraph.pl / speedscope)
+PROFILE_MODE = os.getenv("PROFILE_MODE", "cprofile")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/centerpiece-profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 200))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", 0.005))
+# Server-Timing on profiled requests only ("profiled"), on every request ("all"), or never ("off")
+SERVER_TIMING = os.getenv("SERVER_TIMING", "profiled")
+
+SERVER_TIMING_KINDS = ("db", "hash", "serialize")
+
+
+class StackSampler:
+    """Samples the event loop thread's stack from a helper thread."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path: str):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _prune(directory: str, keep: int):
+    files = sorted(
+        (os.path.join(directory, name) for name in os.listdir(directory)),
+        key=os.path.getmtime,
+    )
+    for path in files[:-keep] if keep > 0 else files:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def _write_profile(profiler, path: str):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    if isinstance(profiler, StackSampler):
+        profiler.dump(path)
+    else:
+        profiler.dump_stats(path)
+    _prune(PROFILE_DIR, PROFILE_MAX_FILES)
+
+
+def server_timing(request_timing) -> bytes:
+    total = request_timing.elapsed()
+    parts = []
+    accounted = 0.0
+    for kind in SERVER_TIMING_KINDS:
+        seconds = request_timing.spent.get(kind)
+        if seconds is None:
+            continue
+        accounted += seconds
+        count = request_timing.counts.get(kind, 0)
+        parts.append(f'{kind};dur={seconds * 1000:.1f};desc="{count} calls"')
+    parts.append(f"handler;dur={max(total - accounted, 0) * 1000:.1f}")
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts).encode()
+
+
+class ProfilingMiddleware:
+    """
+    Profiles selected requests and reports where their time went in a Server-Timing
+    header (db, hash, serialize, handler = the rest).
+
+    cProfile sees the whole event loop thread, so concurrent requests show up in the
+    same trace; only one request is profiled at a time.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._busy = False
+
+    def _should_profile(self, scope) -> bool:
+        if PROFILE_TOKEN:
+            for key, value in scope["headers"]:
+                if key == b"x-profile":
+                    return hmac.compare_digest(value, PROFILE_TOKEN.encode())
+        return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        profile = self._should_profile(scope) and not self._busy
+        if not profile and SERVER_TIMING != "all":
+            return await self.app(scope, receive, send)
+
+        request_timing = timing.begin()
+        profiler = None
+        if profile:
+            self._busy = True
+            if PROFILE_MODE == "sample":
+                profiler = StackSampler(threading.get_ident(), PROFILE_SAMPLE_INTERVAL)
+                profiler.start()
+            else:
+                profiler = cProfile.Profile()
+                profiler.enable()
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start" and SERVER_TIMING != "off":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(request_timing)))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            if profiler is not None:
+                if isinstance(profiler, StackSampler):
+                    profiler.stop()
+                else:
+                    profiler.disable()
+                self._busy = False
+                elapsed_ms = round(request_timing.elapsed() * 1000)
+                slug = re.sub(r"[^A-Za-z0-9]+", "-", scope["path"]).strip("-") or "root"
+                extension = "collapsed" if isinstance(profiler, StackSampler) else "prof"
+                path = os.path.join(
+                    PROFILE_DIR, f"{time.strftime('%Y%m%dT%H%M%S')}-{scope['method']}-{slug}-{elapsed_ms}ms.{extension}"
+                )
+                try:
+                    await asyncio.to_thread(_write_profile, profiler, path)
+                except OSError as e:
+                    print(f"Could not write profile {path}: {e}")
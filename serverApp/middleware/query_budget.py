@@ -0,0 +1,32 @@
+from function import query_budget
+from function.query_budget import QUERY_BUDGET_MODE
+
+
+class QueryBudgetMiddleware:
+    """Checks each request's SQL statements against its route's budget (see function.query_budget)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or QUERY_BUDGET_MODE == "off":
+            return await self.app(scope, receive, send)
+
+        shapes = query_budget.begin()
+        status = {"code": 500}
+
+        async def record_send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        await self.app(scope, receive, record_send)
+
+        # Only matched routes have a budget; error responses (validation, 404s) are not checked.
+        # The response is already sent, so raise mode can't change it (see function.query_budget)
+        route = scope.get("route")
+        if route is None or not shapes or status["code"] >= 400:
+            return
+        problems = query_budget.check(getattr(route, "endpoint", None), shapes)
+        if problems:
+            query_budget.report(scope["method"], route.path, problems)
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Index
+from db.database import Base
+from datetime import datetime
+
+
+class JobRun(Base):
+    # One row per scheduled job execution (see function.scheduler)
+    __tablename__ = "job_runs"
+    id = Column(Integer, primary_key=True)
+    job_name = Column(String(100), nullable=False)
+    owner = Column(String(255), nullable=False)  # host:pid of the worker that ran it
+    started_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    duration_ms = Column(Integer, nullable=False, default=0)
+    rows = Column(Integer, nullable=True)  # rows the job touched, if it reports them
+    status = Column(String(20), nullable=False)  # ok, error
+    error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        Index("ix_job_runs_job_name_started_at", "job_name", "started_at"),
+    )
+
+
+class JobLease(Base):
+    # Held by the one worker allowed to run a job right now
+    __tablename__ = "job_leases"
+    name = Column(String(100), primary_key=True)
+    owner = Column(String(255), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
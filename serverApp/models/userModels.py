@@ -8,11 +8,18 @@ class Users(Base):
     id = Column(Integer, primary_key=True, index=True)
     first_name = Column(String(255),  nullable=True, default="")  # Non-nullable for uniqueness
     last_name = Column(String(255),  nullable=True, default="")  # Non-nullable for uniqueness
-    email = Column(String(255),  nullable=True, default="")  # Non-nullable for uniqueness
-    userType = Column(String(255),  nullable=True, default="admin")  # Non-nullable for uniqueness
-    phone = Column(String(255),  nullable=True, default="0987654321")  # Non-nullable for uniqueness
+    email = Column(String(255),  nullable=True, default="", index=True)  # login, register and OTP lookups
+    userType = Column(String(255),  nullable=True, default="admin", index=True)  # type listing
+    phone = Column(String(255),  nullable=True, default="0987654321", index=True)  # update-phone and team-lead checks
     password = Column(String(255),  nullable=True, default="")  # Non-nullable for uniqueness
 
+class UserEventCounts(Base):
+    # Maintained by db.event_counters on every Event write; rebuild with `python -m db.event_counters rebuild`
+    __tablename__ = "user_event_counts"
+    user_id = Column(Integer, primary_key=True)
+    team_event_count = Column(Integer, nullable=False, default=0)
+    sales_event_count = Column(Integer, nullable=False, default=0)
+
 class Customers(Base):
     __tablename__ = "customers"
     id = Column(Integer, primary_key=True, index=True)
@@ -24,7 +31,7 @@ class Customers(Base):
     country = Column(String(255),  nullable=True, default="")  # Non-nullable for uniqueness
     company = Column(String(255),  nullable=True, default="")  # Non-nullable for uniqueness
     notes = Column(Text,  nullable=True, default="")  # Non-nullable for uniqueness
-    user_id = Column(Integer, nullable=True,default=15)
+    user_id = Column(Integer, nullable=True,default=15, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -50,9 +57,10 @@ class EventsVenue(Base):
     
 class OTP(Base):
     __tablename__ = "sent_otps"
-    id = Column(Integer, primary_key=True, index=True)
+    # Looked up by account only (see function.otp_store); date is indexed for expiry purges
+    id = Column(Integer, primary_key=True)
     account_id = Column(Integer, index=True)
-    otp_code = Column(String, index=True)
-    verification_code = Column(String, index=True)
-    purpose = Column(String, index=True)
+    otp_code = Column(String)
+    verification_code = Column(String)
+    purpose = Column(String)
     date = Column(DateTime, default=datetime.utcnow, index=True)
\ No newline at end of file
@@ -0,0 +1,265 @@
+"""
+Multi-process launcher: one preloaded app, forked uvicorn workers on a shared socket.
+
+    python serve.py                          # one worker per core on 0.0.0.0:8000
+    python serve.py --workers 4 --port 8080
+    kill -HUP <launcher pid>                 # rolling restart, one worker at a time
+    kill -TERM <launcher pid>                # graceful shutdown
+
+The parent imports main once, runs its one-time startup (schema bootstrap, balance
+init) and only then forks the workers, which skip it. State that has to be shared
+between workers (idempotency keys, rate limits, token revocations, the user cache's
+shared tier) goes to a Redis-protocol stand-in on a unix socket, run in its own
+process, unless STATE_STORE_URL already points at a real Redis. Anything else kept
+in module globals is per worker.
+
+Metrics (function.metrics) are per worker too, and a scrape of GET /metrics reaches
+whichever worker accepts it, so the launcher gives the workers a directory
+(--metrics-dir, exported as METRICS_MULTIPROC_DIR) where each one writes its values
+every few seconds. The worker answering a scrape adds the others' files to its own
+values, so one scrape target reports the whole launcher. The directory is emptied at
+launch: counters start again from zero when the launcher restarts, as they would for
+a single process.
+
+Workers are forked from the preloaded parent, so a rolling restart renews the
+workers (connections, memory) but not the code: deploy new code by restarting
+the launcher.
+"""
+import argparse
+import asyncio
+import importlib
+import os
+import select
+import signal
+import socket
+import sys
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HANDLED = (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD)
+
+
+def log(message: str):
+    print(f"[serve {os.getpid()}] {message}", flush=True)
+
+
+def reset_signals():
+    for sig in HANDLED:
+        signal.signal(sig, signal.SIG_DFL)
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def clear_metrics_dir(path: str):
+    os.makedirs(path, exist_ok=True)
+    for name in os.listdir(path):
+        if name.endswith((".json", ".json.tmp")):
+            os.unlink(os.path.join(path, name))
+
+
+def start_state_store(path: str) -> int:
+    """Fork the shared state process and wait until its socket accepts connections."""
+    pid = os.fork()
+    if pid == 0:
+        reset_signals()
+        from function.kv_store import StandInServer
+
+        async def serve():
+            server = await StandInServer().start(unix_path=path)
+            async with server:
+                await server.serve_forever()
+
+        try:
+            asyncio.run(serve())
+        finally:
+            os._exit(0)
+
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            with socket.socket(socket.AF_UNIX) as probe:
+                probe.connect(path)
+            return pid
+        except OSError:
+            time.sleep(0.05)
+    raise SystemExit(f"State store did not start on {path}")
+
+
+class Launcher:
+    def __init__(self, app, sock: socket.socket, args):
+        self.app = app
+        self.sock = sock
+        self.args = args
+        self.workers = {}  # pid -> started_at
+        self.signals = []
+
+    def spawn(self) -> int:
+        """Fork a worker; returns its pid once it is serving (or has died trying)."""
+        import uvicorn
+
+        ready_read, ready_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_read)
+            reset_signals()
+
+            class Worker(uvicorn.Server):
+                async def startup(self, sockets=None):
+                    await super().startup(sockets=sockets)
+                    if self.started:
+                        os.write(ready_write, b"1")
+
+            config = uvicorn.Config(
+                self.app,
+                log_level=self.args.log_level,
+                timeout_graceful_shutdown=self.args.graceful_timeout,
+            )
+            try:
+                Worker(config).run(sockets=[self.sock])
+            finally:
+                os._exit(0)
+
+        os.close(ready_write)
+        ready, _, _ = select.select([ready_read], [], [], self.args.startup_timeout)
+        if not ready or not os.read(ready_read, 1):
+            log(f"worker {pid} did not become ready")
+        os.close(ready_read)
+        self.workers[pid] = time.monotonic()
+        return pid
+
+    def stop(self, pid: int, timeout: float):
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            self.workers.pop(pid, None)
+            return
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if os.waitpid(pid, os.WNOHANG)[0] == pid:
+                break
+            time.sleep(0.1)
+        else:
+            log(f"worker {pid} did not stop in {timeout:.0f}s, killing it")
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.workers.pop(pid, None)
+
+    def rolling_restart(self):
+        # Start the replacement before stopping the old worker, so capacity never drops
+        for old in list(self.workers):
+            new = self.spawn()
+            log(f"replaced worker {old} with {new}")
+            self.stop(old, self.args.graceful_timeout + 5)
+
+    def reap(self):
+        """Respawn workers that exited on their own."""
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            started = self.workers.pop(pid, None)
+            if started is None:
+                log(f"process {pid} exited with status {status}")
+                continue
+            log(f"worker {pid} exited with status {status}, restarting it")
+            # Don't spin if workers die during startup
+            if time.monotonic() - started < 1:
+                time.sleep(1)
+            self.spawn()
+
+    def run(self):
+        for sig in HANDLED:
+            signal.signal(sig, lambda number, frame: self.signals.append(number))
+        for _ in range(self.args.workers):
+            self.spawn()
+        log(f"{len(self.workers)} workers serving on {self.args.host}:{self.args.port}")
+
+        while True:
+            while not self.signals:
+                time.sleep(0.2)
+            number = self.signals.pop(0)
+            if number == signal.SIGCHLD:
+                self.reap()
+            elif number == signal.SIGHUP:
+                log("rolling restart")
+                self.rolling_restart()
+            else:
+                log("shutting down")
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                for pid in list(self.workers):
+                    os.kill(pid, signal.SIGTERM)
+                for pid in list(self.workers):
+                    self.stop(pid, self.args.graceful_timeout + 5)
+                return
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-process launcher for main:app")
+    parser.add_argument("--app", default="main:app", help="module:attribute; the module's one_time_startup() runs first")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--state-socket", default="/tmp/centerpiece-state.sock")
+    parser.add_argument("--metrics-dir", default="/tmp/centerpiece-metrics")
+    parser.add_argument("--graceful-timeout", type=int, default=30)
+    parser.add_argument("--startup-timeout", type=int, default=60)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    # Fail before anything else if the port is taken
+    sock = bind_socket(args.host, args.port)
+
+    state_pid = None
+    if os.getenv("STATE_STORE_URL", "memory://").startswith("memory://"):
+        state_pid = start_state_store(args.state_socket)
+        os.environ["STATE_STORE_URL"] = f"unix://{args.state_socket}"
+    os.environ.setdefault("USER_CACHE_URL", os.environ["STATE_STORE_URL"])
+    # Each worker gets a share of the cores for bcrypt instead of a thread per core
+    os.environ.setdefault("PASSWORD_HASH_WORKERS", str(max(1, (os.cpu_count() or 1) // args.workers)))
+
+    # One scrape target for all workers, see function.metrics
+    os.environ.setdefault("METRICS_MULTIPROC_DIR", args.metrics_dir)
+    clear_metrics_dir(os.environ["METRICS_MULTIPROC_DIR"])
+
+    # Preload: settings are read at import, so the environment above must be final here.
+    # Run from serverApp like `uvicorn main:app` would, for imports and static/
+    here = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(here)
+    sys.path.insert(0, here)
+    module_name, _, attribute = args.app.partition(":")
+    module = importlib.import_module(module_name)
+    app = getattr(module, attribute or "app")
+    from db.database import engine
+
+    startup = getattr(module, "one_time_startup", None)
+    if startup is not None:
+        startup()
+    # Workers must not share the parent's pooled connections
+    engine.dispose()
+    os.environ["SERVE_PRELOADED"] = "1"
+
+    try:
+        Launcher(app, sock, args).run()
+    finally:
+        if state_pid is not None:
+            os.kill(state_pid, signal.SIGTERM)
+            os.waitpid(state_pid, 0)
+            if os.path.exists(args.state_socket):
+                os.unlink(args.state_socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Shared test setup. Run from serverApp:
+
+    python -m pytest tests
+
+Settings are read when the application modules are imported, so the test database,
+secrets and in-process state stores are fixed here, before any of them is loaded.
+"""
+import os
+import socket
+import tempfile
+import pytest
+
+_workdir = tempfile.mkdtemp(prefix="serverapp-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'test.db')}"
+os.environ["ASYNC_DATABASE_URL"] = ""
+os.environ["DATABASE_REPLICA_URLS"] = ""
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ["STATE_STORE_URL"] = "memory://"
+for name in ("USER_CACHE_URL", "TOKEN_REVOCATION_URL", "RATE_LIMIT_STORE_URL", "IDEMPOTENCY_STORE_URL"):
+    os.environ[name] = ""
+os.environ["SCHEDULER_ENABLED"] = "false"
+# Individual tests switch it back on; the endpoint tests log in more often than the limits allow
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["QUERY_BUDGET_MODE"] = "warn"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# Mail goes to a function.smtp_sink the outbox tests start on this port
+os.environ["SMTP_HOST"] = "127.0.0.1"
+os.environ["SMTP_PORT"] = str(_free_port())
+os.environ["SMTP_STARTTLS"] = "false"
+os.environ["SMTP_TIMEOUT"] = "5"
+os.environ["NEX_USERNAME"] = ""
+os.environ.setdefault("NEX_SENDER_EMAIL", "noreply@example.com")
+
+
+@pytest.fixture(scope="session")
+def schema():
+    from db.bootstrap import bootstrap_schema
+    bootstrap_schema(force=True)
+
+
+@pytest.fixture
+def database(schema):
+    """An empty schema, emptied again and with the caches cleared after the test."""
+    from db.database import Base, async_engine, engine
+    from function.token_cache import token_cache
+    from function.user_cache import user_cache
+
+    yield engine
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    user_cache.clear()
+    token_cache.clear()
+    # Ids are reused once the tables are emptied, so revocations must not carry over
+    token_cache._revoked_users.clear()
+    token_cache._synced.clear()
+    # Each test runs its own event loop; pooled aiosqlite connections belong to the last one
+    async_engine.sync_engine.dispose(close=False)
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import pytest
+from function.kv_store import ShardedTTLStore
+from middleware import idempotency
+from middleware.idempotency import IdempotencyMiddleware
+
+
+class Handler:
+    """Downstream ASGI app: reads the body, answers with `status` and the call count."""
+
+    def __init__(self, status=201):
+        self.status = status
+        self.calls = 0
+        self.gate = None  # an asyncio.Event to hold requests in flight
+
+    async def __call__(self, scope, receive, send):
+        more_body = True
+        while more_body:
+            more_body = (await receive()).get("more_body", False)
+        self.calls += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        body = json.dumps({"call": self.calls}).encode()
+        await send({"type": "http.response.start", "status": self.status, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+
+async def call(app, body=b"{}", key=None, authorization=None, client=("10.0.0.1", 5000)):
+    headers = [(b"content-type", b"application/json")]
+    if key:
+        headers.append((b"idempotency-key", key.encode()))
+    if authorization:
+        headers.append((b"authorization", authorization.encode()))
+    scope = {"type": "http", "method": "POST", "path": "/items", "query_string": b"", "headers": headers, "client": client}
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    start = sent[0]
+    return start["status"], dict(start["headers"]), json.loads(b"".join(m.get("body", b"") for m in sent[1:]))
+
+
+@pytest.fixture
+def handler():
+    return Handler()
+
+
+@pytest.fixture
+def app(handler):
+    return IdempotencyMiddleware(handler, store=ShardedTTLStore())
+
+
+def test_replays_completed_request(app, handler):
+    async def scenario():
+        first = await call(app, key="k1")
+        second = await call(app, key="k1")
+        return first, second
+
+    (status1, _, body1), (status2, headers2, body2) = asyncio.run(scenario())
+    assert (status1, status2) == (201, 201)
+    assert body1 == body2 == {"call": 1}
+    assert headers2[b"idempotent-replayed"] == b"true"
+    assert handler.calls == 1
+
+
+def test_conflict_while_in_flight(app, handler):
+    async def scenario():
+        handler.gate = asyncio.Event()
+        first = asyncio.create_task(call(app, key="k1"))
+        while handler.calls == 0:
+            await asyncio.sleep(0)
+        second = await call(app, key="k1")
+        handler.gate.set()
+        return await first, second
+
+    (status1, _, _), (status2, headers2, _) = asyncio.run(scenario())
+    assert status1 == 201
+    assert status2 == 409
+    assert headers2[b"retry-after"] == b"1"
+    assert handler.calls == 1
+
+
+@pytest.mark.parametrize("status", [500, 503, 401, 409, 429])
+def test_errors_are_not_stored(app, handler, status):
+    handler.status = status
+
+    async def scenario():
+        await call(app, key="k1")
+        handler.status = 201
+        return await call(app, key="k1")
+
+    status2, headers2, body2 = asyncio.run(scenario())
+    assert status2 == 201
+    assert body2 == {"call": 2}
+    assert b"idempotent-replayed" not in headers2
+
+
+def test_key_reused_with_other_body_is_refused(app, handler):
+    async def scenario():
+        await call(app, body=b'{"a": 1}', key="k1")
+        return await call(app, body=b'{"a": 2}', key="k1")
+
+    status, _, body = asyncio.run(scenario())
+    assert status == 422
+    assert "different request body" in body["detail"]
+    assert handler.calls == 1
+
+
+def test_identical_bodies_deduplicated_until_expiry(app, handler, monkeypatch):
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_BODY_TTL", 0.2)
+
+    async def scenario():
+        first = await call(app)
+        duplicate = await call(app)
+        other = await call(app, body=b'{"other": true}')
+        await asyncio.sleep(0.3)
+        expired = await call(app)
+        return first, duplicate, other, expired
+
+    first, duplicate, other, expired = asyncio.run(scenario())
+    assert duplicate[2] == first[2] == {"call": 1}
+    assert other[2] == {"call": 2}
+    assert expired[2] == {"call": 3}
+
+
+def test_anonymous_callers_scoped_by_address(app, handler):
+    async def scenario():
+        first = await call(app, key="k1", client=("10.0.0.1", 5000))
+        other_client = await call(app, key="k1", client=("10.0.0.2", 5000))
+        same_client = await call(app, key="k1", client=("10.0.0.1", 6000))
+        return first, other_client, same_client
+
+    first, other_client, same_client = asyncio.run(scenario())
+    assert first[2] == {"call": 1}
+    assert other_client[2] == {"call": 2}
+    assert same_client[2] == {"call": 1}
+
+
+def test_authenticated_callers_scoped_by_token(app, handler):
+    async def scenario():
+        alice = await call(app, key="k1", authorization="Bearer a", client=("10.0.0.1", 1))
+        bob = await call(app, key="k1", authorization="Bearer b", client=("10.0.0.1", 1))
+        return alice, bob
+
+    alice, bob = asyncio.run(scenario())
+    assert (alice[2], bob[2]) == ({"call": 1}, {"call": 2})
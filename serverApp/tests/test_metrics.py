@@ -0,0 +1,80 @@
+import json
+import os
+from function.metrics import MetricsRegistry
+
+DEAD_PID = 2 ** 22 + 1  # above pid_max, so never a live process
+
+
+def registry(directory) -> MetricsRegistry:
+    metrics = MetricsRegistry(multiproc_dir=str(directory))
+    metrics.requests = metrics.counter("app_requests_total", "Requests", ("route",))
+    metrics.in_flight = metrics.gauge("app_in_flight", "In flight")
+    metrics.latency = metrics.histogram("app_latency_seconds", "Latency", buckets=(0.1, 1.0))
+    return metrics
+
+
+def other_worker(directory, pid, build):
+    # Another worker's export, as its own process would have written it
+    metrics = registry(directory)
+    build(metrics)
+    with open(os.path.join(directory, f"{pid}.json"), "w") as f:
+        json.dump(metrics.snapshot(), f)
+
+
+def sample(text: str, line_start: str) -> float:
+    [line] = [line for line in text.splitlines() if line.startswith(line_start + " ")]
+    return float(line.rsplit(" ", 1)[1])
+
+
+def test_render_adds_other_workers(tmp_path):
+    def busy(metrics):
+        metrics.requests.inc("/a", amount=3)
+        metrics.requests.inc("/b")
+        metrics.in_flight.set(value=2)
+        metrics.latency.observe(0.5)
+
+    other_worker(tmp_path, os.getppid(), busy)
+    metrics = registry(tmp_path)
+    metrics.requests.inc("/a")
+    metrics.in_flight.set(value=1)
+    metrics.latency.observe(0.05)
+
+    text = metrics.render()
+    assert sample(text, 'app_requests_total{route="/a"}') == 4
+    assert sample(text, 'app_requests_total{route="/b"}') == 1
+    assert sample(text, "app_in_flight") == 3
+    assert sample(text, 'app_latency_seconds_bucket{le="0.1"}') == 1
+    assert sample(text, 'app_latency_seconds_bucket{le="1.0"}') == 2
+    assert sample(text, "app_latency_seconds_count") == 2
+    assert text.count("# TYPE app_requests_total counter") == 1
+
+
+def test_replaced_worker_keeps_counts_but_not_gauges(tmp_path):
+    def finished(metrics):
+        metrics.requests.inc("/a", amount=5)
+        metrics.in_flight.set(value=4)
+
+    other_worker(tmp_path, DEAD_PID, finished)
+    metrics = registry(tmp_path)
+    metrics.in_flight.set(value=1)
+    text = metrics.render()
+    assert sample(text, 'app_requests_total{route="/a"}') == 5
+    assert sample(text, "app_in_flight") == 1
+
+
+def test_export_round_trip_skips_own_file(tmp_path):
+    metrics = registry(tmp_path)
+    metrics.requests.inc("/a", amount=2)
+    metrics.export()
+    assert os.listdir(tmp_path) == [f"{os.getpid()}.json"]
+    # The worker's own export isn't counted on top of its live values
+    assert sample(metrics.render(), 'app_requests_total{route="/a"}') == 2
+    (tmp_path / f"{os.getppid()}.json").write_text(json.dumps(metrics.snapshot()))
+    assert sample(metrics.render(), 'app_requests_total{route="/a"}') == 4
+
+
+def test_unreadable_file_is_skipped(tmp_path):
+    (tmp_path / f"{os.getppid()}.json").write_text("{")
+    metrics = registry(tmp_path)
+    metrics.requests.inc("/a")
+    assert sample(metrics.render(), 'app_requests_total{route="/a"}') == 1
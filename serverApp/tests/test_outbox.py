@@ -0,0 +1,186 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from db.database import AsyncSessionLocal
+from models.emailModels import EmailOutbox
+from function import outbox, send_mail
+from function.outbox import OutboxWorker, _deliver, delivery_token, enqueue_email, get_delivery_status
+from function.smtp_sink import SMTPSink
+
+
+@asynccontextmanager
+async def smtp_sink():
+    sink = SMTPSink()
+    server = await sink.start(send_mail.SMTP_HOST, send_mail.SMTP_PORT)
+    try:
+        yield sink
+    finally:
+        # Pooled sessions point at this server; don't let the next test reuse them
+        await asyncio.to_thread(send_mail.smtp_pool.close_all)
+        server.close()
+        await server.wait_closed()
+
+
+def new_worker() -> OutboxWorker:
+    worker = OutboxWorker(workers=1)
+    worker._claim_lock = asyncio.Lock()
+    return worker
+
+
+async def enqueue(to_email: str = "someone@example.com") -> int:
+    async with AsyncSessionLocal() as db:
+        message = enqueue_email(db, to_email, "Subject", "<p>Body</p>")
+        await db.commit()
+        return message.id
+
+
+async def load(message_id: int) -> EmailOutbox:
+    async with AsyncSessionLocal() as db:
+        return await db.get(EmailOutbox, message_id)
+
+
+async def drain(worker: OutboxWorker):
+    lease, batch = await worker._claim()
+    results = await asyncio.to_thread(_deliver, batch)
+    await worker._settle(results, lease)
+    return batch
+
+
+def test_enqueue_claim_deliver_settle(database):
+    async def scenario():
+        async with smtp_sink() as sink:
+            message_id = await enqueue("alice@example.com")
+            assert (await load(message_id)).status == "pending"
+
+            worker = new_worker()
+            lease, batch = await worker._claim()
+            claimed = await load(message_id)
+            assert [m[0] for m in batch] == [message_id]
+            assert (claimed.status, claimed.attempts, claimed.next_attempt_at) == ("sending", 1, lease)
+            # A second claim doesn't pick up a message under a live lease
+            assert (await worker._claim())[1] == []
+
+            results = await asyncio.to_thread(_deliver, batch)
+            await worker._settle(results, lease)
+            return sink, await load(message_id)
+
+    sink, message = asyncio.run(scenario())
+    assert message.status == "sent"
+    assert message.sent_at is not None
+    assert message.last_error is None
+    assert len(sink.messages) == 1
+    assert "alice@example.com" in sink.messages[0][1][0]
+    assert b"Subject: Subject" in sink.messages[0][2]
+
+
+def test_failed_delivery_is_retried_later(database):
+    # Nothing listens on the SMTP port in this test
+    async def scenario():
+        message_id = await enqueue()
+        await drain(new_worker())
+        return await load(message_id)
+
+    before = datetime.utcnow()
+    message = asyncio.run(scenario())
+    assert message.status == "pending"
+    assert message.attempts == 1
+    assert message.last_error
+    assert message.next_attempt_at >= before + timedelta(seconds=outbox.OUTBOX_RETRY_BASE)
+
+
+def test_last_failed_attempt_marks_message_failed(database, monkeypatch):
+    monkeypatch.setattr(outbox, "OUTBOX_MAX_ATTEMPTS", 2)
+
+    async def scenario():
+        message_id = await enqueue()
+        worker = new_worker()
+        await drain(worker)
+        async with AsyncSessionLocal() as db:
+            (await db.get(EmailOutbox, message_id)).next_attempt_at = datetime.utcnow()
+            await db.commit()
+        await drain(worker)
+        return await load(message_id)
+
+    message = asyncio.run(scenario())
+    assert (message.status, message.attempts) == ("failed", 2)
+
+
+async def expire_lease(message_id: int, attempts: int):
+    # As if the worker holding the message died mid-send
+    async with AsyncSessionLocal() as db:
+        message = await db.get(EmailOutbox, message_id)
+        message.status = "sending"
+        message.attempts = attempts
+        message.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        await db.commit()
+
+
+def test_expired_lease_is_reclaimed(database):
+    async def scenario():
+        message_id = await enqueue()
+        await expire_lease(message_id, attempts=1)
+        lease, batch = await new_worker()._claim()
+        return message_id, batch, await load(message_id)
+
+    message_id, batch, message = asyncio.run(scenario())
+    assert [m[0] for m in batch] == [message_id]
+    assert (message.status, message.attempts) == ("sending", 2)
+
+
+def test_expired_lease_at_attempt_cap_is_failed(database):
+    async def scenario():
+        message_id = await enqueue()
+        await expire_lease(message_id, attempts=outbox.OUTBOX_MAX_ATTEMPTS)
+        lease, batch = await new_worker()._claim()
+        return batch, await load(message_id)
+
+    batch, message = asyncio.run(scenario())
+    assert batch == []
+    assert message.status == "failed"
+    assert message.attempts == outbox.OUTBOX_MAX_ATTEMPTS
+    assert message.last_error
+
+
+def test_settle_after_lost_lease_is_ignored(database):
+    async def scenario():
+        message_id = await enqueue()
+        worker = new_worker()
+        lease, _ = await worker._claim()
+        # The lease ran out and another worker claimed the message
+        await expire_lease(message_id, attempts=1)
+        other_lease, _ = await new_worker()._claim()
+        await worker._settle([(message_id, "550 mailbox unavailable")], lease)
+        stale = await load(message_id)
+        await worker._settle([(message_id, None)], other_lease)
+        return stale, await load(message_id)
+
+    stale, settled = asyncio.run(scenario())
+    assert (stale.status, stale.last_error) == ("sending", None)
+    assert settled.status == "sent"
+
+
+def test_delivery_status_needs_a_valid_token(database):
+    from Endpoints import otp
+
+    message_id = asyncio.run(enqueue())
+    token = delivery_token(message_id)
+    other_id = asyncio.run(enqueue())
+
+    async def status(value):
+        async with AsyncSessionLocal() as db:
+            return await get_delivery_status(db, value)
+
+    assert asyncio.run(status(token))["status"] == "pending"
+    assert asyncio.run(status(str(message_id))) is None
+    # A valid signature for one message doesn't open another
+    assert asyncio.run(status(f"{other_id}.{token.partition('.')[2]}")) is None
+    assert asyncio.run(status("not-a-token")) is None
+
+    app = FastAPI()
+    app.include_router(otp.router)
+    client = TestClient(app)
+    assert client.get(f"/auth/email-status/{token}").json()["status"] == "pending"
+    assert client.get(f"/auth/email-status/{message_id}").status_code == 404
+    assert client.get(f"/auth/email-status/{message_id}.{'0' * 32}").status_code == 404
@@ -0,0 +1,98 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import delete, insert
+from models.userModels import Users
+from function.pagination import MAX_PAGE_SIZE, decode_cursor, encode_cursor
+
+
+@pytest.fixture
+def client(database):
+    from Endpoints import users
+
+    rows = [
+        {"first_name": f"U{n}", "last_name": "Test", "email": f"u{n}@example.com", "phone": f"07880{n:05d}",
+         "userType": "sales" if n % 2 else "team_lead", "password": "x"}
+        for n in range(11)
+    ]
+    with database.begin() as conn:
+        conn.execute(insert(Users), rows)
+    app = FastAPI()
+    app.include_router(users.router)
+    return TestClient(app)
+
+
+def walk(client, path, limit):
+    ids, cursor, pages = [], None, 0
+    while True:
+        params = {"paginate": "cursor", "limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(path, params=params)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        assert len(page["items"]) <= limit
+        ids += [item["id"] for item in page["items"]]
+        pages += 1
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids, pages
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(42)) == 42
+
+
+def test_cursor_walk_has_no_gaps_or_duplicates(client, database):
+    with database.connect() as conn:
+        all_ids = sorted(row.id for row in conn.execute(Users.__table__.select()))
+    ids, pages = walk(client, "/users/", limit=4)
+    assert ids == all_ids
+    assert pages == 3
+
+
+def test_cursor_walk_by_type(client):
+    ids, _ = walk(client, "/users/type/sales", limit=2)
+    assert len(ids) == len(set(ids)) == 5
+    assert ids == sorted(ids)
+
+
+def test_cursor_survives_deleting_the_last_row_seen(client, database):
+    first = client.get("/users/", params={"paginate": "cursor", "limit": 3}).json()
+    last_seen = first["items"][-1]["id"]
+    with database.begin() as conn:
+        conn.execute(delete(Users).where(Users.id == last_seen))
+    second = client.get("/users/", params={"paginate": "cursor", "limit": 3, "cursor": first["next_cursor"]}).json()
+    assert second["items"][0]["id"] > last_seen
+
+
+def test_exact_multiple_of_limit_ends_without_cursor(client):
+    ids, pages = walk(client, "/users/", limit=11)
+    assert len(ids) == 11
+    assert pages == 1
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "e30", encode_cursor(1)[:-2] + "xx", "eyJ2IjoyLCJpZCI6MX0"])
+def test_malformed_cursor_is_rejected(client, cursor):
+    response = client.get("/users/", params={"paginate": "cursor", "cursor": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid pagination cursor"
+
+
+@pytest.mark.parametrize("path", ["/users/", "/users/type/sales"])
+@pytest.mark.parametrize("params", [
+    {"limit": 0},
+    {"limit": -1},
+    {"limit": MAX_PAGE_SIZE + 1},
+    {"skip": -1},
+    {"limit": 0, "paginate": "cursor"},
+])
+def test_skip_and_limit_bounds(client, path, params):
+    assert client.get(path, params=params).status_code == 422
+
+
+def test_offset_mode_keeps_plain_list(client):
+    response = client.get("/users/", params={"skip": 9, "limit": MAX_PAGE_SIZE})
+    assert response.status_code == 200
+    assert isinstance(response.json(), list)
+    assert len(response.json()) == 2
@@ -0,0 +1,22 @@
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, text
+from db.pool_stats import InstrumentedQueuePool, instrument_pool, pool_stats
+
+
+def test_counters_from_many_threads(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=InstrumentedQueuePool, pool_size=4)
+    stats = instrument_pool("test_threads", engine)
+
+    def query(_):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    try:
+        with ThreadPoolExecutor(8) as executor:
+            list(executor.map(query, range(400)))
+        snapshot = stats.snapshot()
+        assert snapshot["checkouts"] == snapshot["checkins"] == snapshot["wait_ms"]["count"] == 400
+        assert 1 <= snapshot["connects"] <= 4 + 10
+    finally:
+        engine.dispose()
+        pool_stats.pop("test_threads", None)
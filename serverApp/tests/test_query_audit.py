@@ -0,0 +1,17 @@
+from db import query_audit
+
+
+def test_check_passes_on_seeded_database(database, capsys):
+    # Enough rows that SQLite plans as it would for a real table, and scans get flagged
+    assert query_audit.main(["--seed", "3000", "--min-rows", "1000", "--check"]) == 0, capsys.readouterr().out
+
+
+def test_check_fails_on_a_missing_index(database, capsys):
+    with database.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX ix_sent_otps_account_id")
+    try:
+        assert query_audit.main(["--seed", "3000", "--min-rows", "1000", "--check"]) == 1
+        assert "[FAIL] sent_otps(account_id)" in capsys.readouterr().out
+    finally:
+        with database.begin() as conn:
+            conn.exec_driver_sql("CREATE INDEX ix_sent_otps_account_id ON sent_otps (account_id)")
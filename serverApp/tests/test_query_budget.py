@@ -0,0 +1,81 @@
+"""
+Query budget middleware. Run from serverApp:
+
+    python -m pytest tests
+"""
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from function import query_budget
+from middleware.query_budget import QueryBudgetMiddleware
+
+engine = create_engine("sqlite://")
+
+
+def run(statements: int):
+    with engine.connect() as conn:
+        for _ in range(statements):
+            conn.execute(text("SELECT 1"))
+
+
+app = FastAPI()
+app.add_middleware(QueryBudgetMiddleware)
+
+
+@app.get("/within")
+@query_budget.query_budget(2)
+async def within():
+    run(2)
+    return {}
+
+
+@app.get("/over")
+@query_budget.query_budget(2)
+async def over():
+    run(3)
+    return {}
+
+
+@app.get("/over-then-404")
+@query_budget.query_budget(2)
+async def over_then_404():
+    run(3)
+    raise HTTPException(status_code=404, detail="Not found")
+
+
+@app.get("/loop")
+@query_budget.query_budget(repeats=3)
+async def loop():
+    run(4)
+    return {}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(query_budget, "QUERY_BUDGET_MODE", "raise")
+    return TestClient(app)
+
+
+def test_within_budget(client):
+    assert client.get("/within").status_code == 200
+
+
+def test_over_budget_raises(client):
+    with pytest.raises(query_budget.QueryBudgetExceeded, match="ran 3 statements, budget is 2"):
+        client.get("/over")
+
+
+def test_repeated_statement_raises(client):
+    with pytest.raises(query_budget.QueryBudgetExceeded, match="possible N\\+1"):
+        client.get("/loop")
+
+
+def test_error_responses_are_not_checked(client):
+    assert client.get("/over-then-404").status_code == 404
+
+
+def test_warn_mode_logs(monkeypatch, capsys):
+    monkeypatch.setattr(query_budget, "QUERY_BUDGET_MODE", "warn")
+    assert TestClient(app).get("/over").status_code == 200
+    assert "Query budget exceeded by GET /over" in capsys.readouterr().out
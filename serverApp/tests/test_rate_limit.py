@@ -0,0 +1,94 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+from function import rate_limit
+from function.rate_limit import LOGIN_ACCOUNT, ShardedBuckets, client_ip
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+def test_bucket_allows_burst_then_refills(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit, "time", SimpleNamespace(monotonic=clock.monotonic, time=clock.time))
+    buckets = ShardedBuckets()
+
+    def take():
+        return asyncio.run(buckets.take("login_ip:1.2.3.4", rate=0.5, burst=2))
+
+    assert take() == 0
+    assert take() == 0
+    assert take() == pytest.approx(2.0)  # one token every 2 seconds
+    clock.now += 1
+    assert take() == pytest.approx(1.0)
+    clock.now += 1
+    assert take() == 0
+    # Never refills past the burst
+    clock.now += 60
+    assert [take() for _ in range(3)][-1] > 0
+
+
+def test_buckets_are_per_key(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit, "time", SimpleNamespace(monotonic=clock.monotonic, time=clock.time))
+    buckets = ShardedBuckets()
+    assert asyncio.run(buckets.take("a", rate=1, burst=1)) == 0
+    assert asyncio.run(buckets.take("a", rate=1, burst=1)) > 0
+    assert asyncio.run(buckets.take("b", rate=1, burst=1)) == 0
+
+
+def request_from(peer, forwarded=None):
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded is not None else []
+    return Request({"type": "http", "headers": headers, "client": (peer, 5000)})
+
+
+@pytest.mark.parametrize("proxies, forwarded, expected", [
+    (0, "6.6.6.6", "10.0.0.9"),  # header ignored without trusted proxies
+    (1, "6.6.6.6, 1.2.3.4", "1.2.3.4"),  # the client's own entry is not trusted
+    (2, "6.6.6.6, 1.2.3.4, 10.0.0.1", "1.2.3.4"),
+    (2, "1.2.3.4", "1.2.3.4"),  # shorter than the proxy chain: outermost entry
+    (1, " , ", "10.0.0.9"),
+    (1, None, "10.0.0.9"),
+])
+def test_client_ip_counts_trusted_hops_from_the_right(monkeypatch, proxies, forwarded, expected):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUSTED_PROXIES", proxies)
+    assert client_ip(request_from("10.0.0.9", forwarded)) == expected
+
+
+def test_login_limited_per_account_across_ips(database, monkeypatch):
+    from Endpoints import auth
+
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUSTED_PROXIES", 1)
+    monkeypatch.setattr(rate_limit, "rate_limiter", rate_limit.create_rate_limiter("memory://"))
+    monkeypatch.setattr(auth, "rate_limiter", rate_limit.rate_limiter)
+    app = FastAPI()
+    app.include_router(auth.router)
+    client = TestClient(app)
+
+    statuses = []
+    for attempt in range(LOGIN_ACCOUNT.burst + 1):
+        response = client.post(
+            "/auth/login",
+            json={"email": "Victim@example.com", "password": "guess"},
+            headers={"X-Forwarded-For": f"198.51.100.{attempt}"},
+        )
+        statuses.append(response.status_code)
+    assert statuses == [401] * LOGIN_ACCOUNT.burst + [429]
+    assert int(response.headers["Retry-After"]) >= 1
+
+    # Other accounts are unaffected
+    other = client.post("/auth/login", json={"email": "other@example.com", "password": "x"},
+                        headers={"X-Forwarded-For": "198.51.100.1"})
+    assert other.status_code == 401
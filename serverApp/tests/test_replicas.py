@@ -0,0 +1,79 @@
+import asyncio
+import pytest
+from sqlalchemy import select, text, update
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette.requests import Request
+from db import replicas
+from db.connection import get_read_db
+from db.database import async_engine
+from models.userModels import Users
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    # Never connected to: the tests only look at which engine a statement would use
+    engine = create_async_engine("sqlite+aiosqlite://")
+    monkeypatch.setattr(replicas, "replica_engines", [engine])
+    return engine.sync_engine
+
+
+async def read_session(method: str):
+    request = Request({"type": "http", "method": method, "headers": [], "path": "/"})
+    dependency = get_read_db(request)
+    return dependency, await dependency.__anext__()
+
+
+def bind_for(method: str, *clauses):
+    async def scenario():
+        dependency, db = await read_session(method)
+        try:
+            return [db.sync_session.get_bind(clause=clause) for clause in clauses]
+        finally:
+            await dependency.aclose()
+
+    return asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("method", ["GET", "HEAD"])
+def test_reads_go_to_replica(replica, method):
+    assert bind_for(method, select(Users), select(Users.id).where(Users.id == 1)) == [replica, replica]
+
+
+@pytest.mark.parametrize("method", ["POST", "PUT", "PATCH", "DELETE"])
+def test_unsafe_methods_use_primary_sessions(replica, method):
+    assert bind_for(method, select(Users)) == [async_engine.sync_engine]
+
+
+def test_write_makes_session_sticky(replica):
+    primary = async_engine.sync_engine
+    binds = bind_for("GET", select(Users), update(Users).values(phone=None), select(Users))
+    assert binds == [replica, primary, primary]
+
+
+def test_text_and_bare_connections_are_treated_as_writes(replica):
+    primary = async_engine.sync_engine
+    assert bind_for("GET", text("SELECT 1"), select(Users)) == [primary, primary]
+    assert bind_for("GET", None, select(Users)) == [primary, primary]
+
+
+def test_session_after_flush_uses_primary(replica, database):
+    async def scenario():
+        dependency, db = await read_session("GET")
+        try:
+            before = db.sync_session.get_bind(clause=select(Users))
+            db.add(Users(first_name="A", last_name="B", email="a@example.com", userType="sales", password="x"))
+            await db.flush()
+            after = db.sync_session.get_bind(clause=select(Users))
+            await db.rollback()
+            return before, after
+        finally:
+            await dependency.aclose()
+
+    before, after = asyncio.run(scenario())
+    assert before is replica
+    assert after is async_engine.sync_engine
+
+
+def test_without_replicas_everything_uses_primary(monkeypatch):
+    monkeypatch.setattr(replicas, "replica_engines", [])
+    assert bind_for("GET", select(Users)) == [async_engine.sync_engine]
@@ -0,0 +1,96 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from function import token_cache as token_cache_module
+from function.kv_store import ShardedTTLStore
+from function.token_cache import TokenCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_700_000_000.25
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(token_cache_module, "time", SimpleNamespace(time=clock.time, monotonic=clock.monotonic))
+    return clock
+
+
+def claims(user_id, iat, lifetime=3600):
+    return {"id": user_id, "email": f"user{user_id}@example.com", "iat": iat, "exp": iat + lifetime}
+
+
+def test_cached_token_is_dropped_on_revocation(clock):
+    cache = TokenCache()
+    token = claims(1, int(clock.now) - 60)
+    cache.put("token-1", token)
+    cache.put("token-2", claims(2, int(clock.now) - 60))
+    assert cache.get("token-1") == token
+
+    asyncio.run(cache.revoke_user(1))
+    assert cache.get("token-1") is None
+    assert asyncio.run(cache.is_revoked(token))
+    assert cache.get("token-2") is not None
+
+
+def test_revocation_boundary_is_whole_seconds(clock):
+    cache = TokenCache()
+    asyncio.run(cache.revoke_user(1))
+    revoked_second = int(clock.now)
+
+    # jose writes iat in whole seconds: a token issued in the same second (the login
+    # right after a password change) stays valid, anything earlier is revoked
+    assert asyncio.run(cache.is_revoked(claims(1, revoked_second - 1)))
+    assert not asyncio.run(cache.is_revoked(claims(1, revoked_second)))
+    assert not asyncio.run(cache.is_revoked(claims(1, revoked_second + 1)))
+    # Tokens from before iat was added can't be dated, so they are revoked
+    assert asyncio.run(cache.is_revoked({"id": 1}))
+    assert not asyncio.run(cache.is_revoked(claims(2, revoked_second - 1)))
+
+
+def test_revocation_expires(clock):
+    cache = TokenCache()
+    asyncio.run(cache.revoke_user(1))
+    old = claims(1, int(clock.now) - 1)
+    clock.now += token_cache_module.TOKEN_REVOCATION_TTL + 1
+    assert not asyncio.run(cache.is_revoked(old))
+
+
+def test_revocation_reaches_other_workers_through_shared_store(clock, monkeypatch):
+    monkeypatch.setattr(token_cache_module, "TOKEN_REVOCATION_SYNC", 5)
+    store = ShardedTTLStore()
+    worker_a, worker_b = TokenCache(shared=store), TokenCache(shared=store)
+    token = claims(7, int(clock.now) - 60)
+    worker_b.put("token", token)
+    assert not asyncio.run(worker_b.is_revoked(token))
+
+    asyncio.run(worker_a.revoke_user(7))
+    # worker_b looked the user up just now, so it trusts that answer for TOKEN_REVOCATION_SYNC
+    assert not asyncio.run(worker_b.is_revoked(token))
+    clock.now += 5.5
+    assert asyncio.run(worker_b.is_revoked(token))
+    # The cached claims went with it
+    assert worker_b.get("token") is None
+    assert not asyncio.run(worker_b.is_revoked(claims(7, int(clock.now))))
+
+
+def test_unreachable_shared_store_falls_back_to_local(clock):
+    class Down:
+        async def get(self, key):
+            raise OSError("connection refused")
+
+        async def set(self, *args, **kwargs):
+            raise OSError("connection refused")
+
+    cache = TokenCache(shared=Down())
+    asyncio.run(cache.revoke_user(1))
+    assert asyncio.run(cache.is_revoked(claims(1, int(clock.now) - 1)))
+    assert not asyncio.run(cache.is_revoked(claims(2, int(clock.now) - 1)))
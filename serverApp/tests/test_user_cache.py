@@ -0,0 +1,141 @@
+import asyncio
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import update
+from db.database import AsyncSessionLocal
+from models.userModels import Users
+from function.kv_store import ShardedTTLStore
+from function.user_cache import UserCache, user_cache
+
+PASSWORD = "Passw0rd!"
+
+
+async def add_user(email="ann@example.com", phone="0788000001") -> int:
+    async with AsyncSessionLocal() as db:
+        user = Users(first_name="Ann", last_name="Lee", email=email, phone=phone, userType="sales", password="x")
+        db.add(user)
+        await db.commit()
+        return user.id
+
+
+async def lookup(cache: UserCache, user_id=None, email=None):
+    async with AsyncSessionLocal() as db:
+        if email is not None:
+            return await cache.get_by_email(db, email)
+        return await cache.get_by_id(db, user_id)
+
+
+def test_second_worker_served_from_shared_tier(database):
+    store = ShardedTTLStore()
+    worker_a, worker_b = UserCache(shared=store), UserCache(shared=store)
+
+    async def scenario():
+        user_id = await add_user()
+        await lookup(worker_a, user_id)
+        return user_id, await lookup(worker_b, user_id)
+
+    user_id, record = asyncio.run(scenario())
+    assert record["id"] == user_id
+    assert "password" not in record
+    assert (worker_b.shared_hits, worker_b.misses) == (1, 0)
+
+
+def test_load_racing_an_invalidation_does_not_repopulate_shared_tier(database):
+    store = ShardedTTLStore()
+    slow_worker, writer = UserCache(shared=store), UserCache(shared=store)
+
+    async def scenario():
+        user_id = await add_user()
+        async with AsyncSessionLocal() as db:
+            execute = db.execute
+
+            async def execute_then_update(*args, **kwargs):
+                # slow_worker has read the old row; another worker updates it and invalidates
+                # before slow_worker gets to write it to the shared tier
+                result = await execute(*args, **kwargs)
+                async with AsyncSessionLocal() as other:
+                    await other.execute(update(Users).where(Users.id == user_id).values(phone="0799000009"))
+                    await other.commit()
+                await writer.invalidate(user_id, "ann@example.com")
+                return result
+
+            db.execute = execute_then_update
+            stale = await slow_worker.get_by_id(db, user_id)
+
+        fresh_worker = UserCache(shared=store)
+        return stale, await lookup(fresh_worker, user_id), fresh_worker
+
+    stale, fresh, fresh_worker = asyncio.run(scenario())
+    assert stale["phone"] == "0788000001"
+    assert fresh["phone"] == "0799000009"
+    # The stale row went under the superseded version, so the fresh worker read the database
+    assert (fresh_worker.shared_hits, fresh_worker.misses) == (0, 1)
+
+
+def test_invalidate_without_shared_tier_drops_local_entries(database):
+    cache = UserCache()
+
+    async def scenario():
+        user_id = await add_user()
+        await lookup(cache, user_id)
+        await cache.invalidate(user_id)
+        return await lookup(cache, email="ann@example.com")
+
+    asyncio.run(scenario())
+    assert cache.misses == 2
+
+
+@pytest.fixture
+def client(database, monkeypatch):
+    from Endpoints import auth, users
+
+    # The app's cache, with a shared tier, so both tiers are checked
+    monkeypatch.setattr(user_cache, "shared", ShardedTTLStore())
+    app = FastAPI()
+    app.include_router(users.router)
+    app.include_router(auth.router)
+    return TestClient(app)
+
+
+def sign_up(client) -> tuple:
+    response = client.post("/users/team-lead", json={
+        "first_name": "Ann", "last_name": "Lee", "email": "ann@example.com", "phone": "0788000001", "password": PASSWORD,
+    })
+    assert response.status_code == 200, response.text
+    token = client.post("/auth/login", json={"email": "ann@example.com", "password": PASSWORD}).json()["access_token"]
+    return response.json()["id"], {"Authorization": f"Bearer {token}"}
+
+
+MUTATIONS = {
+    "update_user": ("put", "/users/{id}", {"first_name": "Anna"}, lambda r: r["first_name"] == "Anna"),
+    "update_user_type": ("patch", "/users/{id}/user-type", {"userType": "sales"}, lambda r: r["userType"] == "sales"),
+    "update_phone": ("put", "/auth/update-phone", {"phone": "0799000009"}, lambda r: r["phone"] == "0799000009"),
+    "update_password": ("put", "/auth/update-password", {
+        "current_password": PASSWORD, "new_password": "N3w-passw0rd", "confirm_password": "N3w-passw0rd",
+    }, lambda r: r is not None),
+    "delete_user": ("delete", "/users/{id}", None, lambda r: r is None),
+}
+
+
+@pytest.mark.parametrize("name", MUTATIONS)
+def test_endpoint_invalidates_cache(client, name):
+    method, path, body, is_current = MUTATIONS[name]
+    user_id, headers = sign_up(client)
+    assert client.get(f"/users/{user_id}").status_code == 200
+    asyncio.run(lookup(user_cache, email="ann@example.com"))
+    assert user_cache._id_key(user_id) in user_cache._entries
+
+    kwargs = {"headers": headers} if body is None else {"headers": headers, "json": body}
+    response = getattr(client, method)(path.format(id=user_id), **kwargs)
+    assert response.status_code == 200, response.text
+
+    assert user_cache._id_key(user_id) not in user_cache._entries
+    assert user_cache._email_key("ann@example.com") not in user_cache._entries
+    # Another worker finds nothing current in the shared tier and reads the new row
+    other_worker = UserCache(shared=user_cache.shared)
+    by_id = asyncio.run(lookup(other_worker, user_id))
+    by_email = asyncio.run(lookup(other_worker, email="ann@example.com"))
+    assert other_worker.shared_hits == 0
+    assert is_current(by_id)
+    assert is_current(by_email)